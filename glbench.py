@@ -0,0 +1,263 @@
+#! python3
+# -*- coding: utf8 -*-
+"""Rendering benchmark
+
+Renders reproducible scenes offscreen along fixed camera paths,
+and writes the results in JSON to compare them across commits.
+
+    $ python -m wxpyGL.glbench -o before.json
+    $ python -m wxpyGL.glbench -o after.json --compare before.json
+"""
+from . import offglstream as ogs
+ogs.select_platform() # <-- before importing GL (platform)
+
+from OpenGL.GL import *
+
+import argparse
+import json
+import platform
+import subprocess
+import time
+import os
+import numpy as np
+
+from . import globject as glo
+from .glcamera import Camera
+from .glprofile import FrameStats
+
+
+materials = [
+    glo.gold, glo.silver, glo.copper, glo.chrome, glo.bronze, glo.brass,
+    glo.emerald, glo.jade, glo.obsidian, glo.turk, glo.pearl, glo.ruby,
+]
+
+## model -> classes of the objects
+models = {
+    'sphere' : (glo.Sphere,),
+    'teapot' : (glo.Teapot,),
+    'mixed'  : (glo.Sphere, glo.Teapot),
+}
+
+frame_styles = {
+    'dot'   : glo.Object.MDOT,
+    'wire'  : glo.Object.MWIRE,
+    'solid' : glo.Object.MSOLID,
+}
+
+
+def make_scene(n=100, model='sphere', styles='solid', alpha=0.0,
+               spread=5.0, sizes=None, seed=0):
+    """Make a list of objects.
+    
+    Args:
+        n       : number of objects
+        model   : 'sphere', 'teapot', or 'mixed'
+        styles  : frame styles of objects, e.g. 'solid', 'wire+solid',
+                  or 'dot,wire,solid' (each object takes one of them)
+        alpha   : fraction of transparent (MALPHA) objects
+        spread  : half width of the cube the objects are placed in
+        sizes   : values the sizes are taken from (None: uniform random
+                  in [0.2, 0.8), i.e., all different)
+        seed    : random seed
+    """
+    rs = np.random.RandomState(seed)
+    pos = rs.uniform(-spread, spread, (n, 3))
+    if sizes is None:
+        size = rs.uniform(0.2, 0.8, n)
+    else:
+        size = np.take(sizes, rs.randint(len(sizes), size=n))
+    mat = rs.randint(len(materials), size=n)
+    transparent = rs.random_sample(n) < alpha
+    
+    combos = []
+    for s in styles.split(','):
+        style = 0
+        for k in s.split('+'):
+            style |= frame_styles[k.strip()]
+        combos.append(style)
+    style = rs.randint(len(combos), size=n)
+    
+    classes = models[model]
+    objects = []
+    for i in range(n):
+        s = combos[style[i]] | glo.Object.MSHADE
+        m = materials[mat[i]]
+        if transparent[i]:
+            s |= glo.Object.MALPHA
+            m = m.set_alpha(0.5)
+        cls = classes[i % len(classes)]
+        objects.append(cls(pos=pos[i], size=size[i], shade=m, style=s))
+    return objects
+
+
+def drawable(view, cls):
+    """True if an object of the class draws any pixel in the view."""
+    view.camera = Camera(view)
+    view.objects = [cls(shade=glo.silver, style=glo.Object.MSOLID | glo.Object.MSHADE)]
+    view.stats = None
+    return bool(view.render()[..., :3].any())
+
+
+def camera_path(camera, name, frames):
+    """Generate the camera moves of each frame.
+    
+    Args:
+        name : 'orbit' - rotate around the center in one turn
+               'zoom'  - zoom in and out
+               'pan'   - shift the view back and forth
+               'tour'  - all of the above
+    """
+    a = 2 * np.pi / frames
+    for i in range(frames):
+        t = i / frames
+        if name in ('orbit', 'tour'):
+            camera.rotate(camera.e2c_ * np.tan(a), 0)
+        if name in ('zoom', 'tour'):
+            camera.zoom(1.02 if t < 0.5 else 1/1.02)
+        if name in ('pan', 'tour'):
+            camera.shift(0.1 if (i // (frames // 4 or 1)) % 2 else -0.1, 0)
+        yield i
+
+
+## name : (scene kwargs, camera path)
+suite = {
+    'spheres-100'         : (dict(n=100), 'orbit'),
+    'spheres-1000'        : (dict(n=1000), 'orbit'),
+    'spheres-1000-3sizes' : (dict(n=1000, sizes=(0.25, 0.5, 0.75)), 'orbit'),
+    'spheres-wire'        : (dict(n=300, styles='wire+solid'), 'orbit'),
+    'spheres-styles'      : (dict(n=300, styles='dot,wire,solid,wire+solid'), 'tour'),
+    'spheres-alpha'       : (dict(n=300, alpha=0.3), 'orbit'),
+    'spheres-alpha-oit'   : (dict(n=300, alpha=0.3, transparency='oit'), 'orbit'),
+    'spheres-phong'       : (dict(n=300, alpha=0.1, pipeline='phong'), 'orbit'),
+    'spheres-zoom'        : (dict(n=300), 'zoom'),
+    'spheres-pan'         : (dict(n=1000, spread=20), 'pan'),
+    'teapots-100'         : (dict(n=100, model='teapot'), 'orbit'),
+    'mixed-300'           : (dict(n=300, model='mixed', alpha=0.1), 'tour'),
+}
+
+
+def run(view, objects, path='orbit', frames=120, warmup=10,
+        transparency='sorted', pipeline='fixed'):
+    """Render the objects along the camera path and return the results."""
+    view.camera = Camera(view)
+    view.objects = objects
+    view.queue.transparency = transparency
+    view.queue.pipeline = pipeline
+    view.stats = stats = FrameStats(capacity=frames, timing=False)
+    
+    for i in range(warmup):
+        view.render()
+    stats.clear()
+    
+    t = time.perf_counter()
+    for i in camera_path(view.camera, path, frames):
+        view.render()
+    glFinish()
+    elapsed = time.perf_counter() - t
+    
+    ms = stats['frame'] * 1e3
+    gpu = stats['gpu']
+    gpu = gpu[~np.isnan(gpu)] * 1e3
+    def mean(k):
+        return float(np.mean(stats[k]))
+    return {
+        'frames'  : frames,
+        'fps'     : frames / elapsed,
+        'ms'      : {
+            'mean'  : float(ms.mean()),
+            'p50'   : float(np.percentile(ms, 50)),
+            'p90'   : float(np.percentile(ms, 90)),
+            'p99'   : float(np.percentile(ms, 99)),
+            'max'   : float(ms.max()),
+        },
+        'gpu_ms'  : float(gpu.mean()) if gpu.size else None,
+        'objects' : len(objects),
+        'drawn'   : mean('drawn'),
+        'culled'  : mean('culled'),
+        'draws'   : mean('draws'),
+        'changes' : mean('changes'),
+    }
+
+
+def environment():
+    """Information of the environment to identify the results."""
+    def gl_string(name):
+        s = glGetString(name)
+        return s.decode() if s else None
+    try:
+        commit = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(__file__), stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        commit = None
+    return {
+        'commit'   : commit,
+        'time'     : time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python'   : platform.python_version(),
+        'numpy'    : np.__version__,
+        'renderer' : gl_string(GL_RENDERER),
+        'version'  : gl_string(GL_VERSION),
+    }
+
+
+def compare(results, base):
+    """Print the ratios of fps and ms/frame (p50) to the base results."""
+    print("{:<20} {:>10} {:>10} {:>8}".format('scene', 'fps', 'p50 [ms]', 'ratio'))
+    for name, r in results['scenes'].items():
+        b = base['scenes'].get(name)
+        ratio = "{:.2f}x".format(r['fps'] / b['fps']) if b else '-'
+        print("{:<20} {:>10.1f} {:>10.2f} {:>8}".format(
+            name, r['fps'], r['ms']['p50'], ratio))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Rendering benchmark")
+    parser.add_argument('scenes', nargs='*', help="names of the scenes (default: all)")
+    parser.add_argument('-o', '--output', help="JSON file to write the results")
+    parser.add_argument('-c', '--compare', help="JSON file of the base results")
+    parser.add_argument('-n', '--frames', type=int, default=120)
+    parser.add_argument('--size', type=int, nargs=2, default=(640, 480))
+    args = parser.parse_args(argv)
+    
+    view = ogs.offscreen_stream(args.size)
+    try:
+        results = {
+            'environment' : environment(),
+            'size'        : list(args.size),
+            'scenes'      : {},
+            'skipped'     : {},
+        }
+        for name in args.scenes or suite:
+            kwargs, path = suite[name]
+            kwargs = dict(kwargs)
+            
+            ## Skip the scene of models not drawn (the fps would be bogus).
+            missing = [cls.__name__ for cls in models[kwargs.get('model', 'sphere')]
+                                    if not drawable(view, cls)]
+            if missing:
+                results['skipped'][name] = "not drawable: {}".format(', '.join(missing))
+                print("{:<20} skipped ({})".format(name, results['skipped'][name]))
+                continue
+            transparency = kwargs.pop('transparency', 'sorted')
+            pipeline = kwargs.pop('pipeline', 'fixed')
+            r = run(view, make_scene(**kwargs), path, args.frames,
+                    transparency=transparency, pipeline=pipeline)
+            results['scenes'][name] = r
+            print("{:<20} {:8.1f} fps  p50 {:6.2f} ms  p99 {:6.2f} ms  "
+                  "draws {:6.0f}  changes {:6.0f}".format(
+                  name, r['fps'], r['ms']['p50'], r['ms']['p99'],
+                  r['draws'], r['changes']))
+    finally:
+        view.close()
+    
+    if args.output:
+        with open(args.output, 'w') as o:
+            json.dump(results, o, indent=2)
+    if args.compare:
+        with open(args.compare) as i:
+            compare(results, json.load(i))
+    return results
+
+
+if __name__ == "__main__":
+    main()
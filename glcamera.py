@@ -28,6 +28,10 @@ class Camera:
         depth[2]  : logical focus (near, far)
         screen[2] : screen size of viewport (w, h)
         fovy_range: fov-y angle range
+    
+    The view and projection matrices are cached and computed again
+    only when the camera is changed. Call invalidate() after modifying
+    the array attributes in place (e.g., camera.depth[1] = 1000).
     """
     ## fov = property(lambda self: self.__parent.size)
     ## fovr = property(lambda self: self.fov[0] / self.fov[1])
@@ -39,7 +43,11 @@ class Camera:
     
     dpu = property(lambda self: self.screen[1] / 2 / self.h2_)
     
+    ## Attributes the matrices depend on
+    _matrix_attrs = {'mode', 'fovy_', 'e2c_', 'lpc', 'eye', 'axes', 'depth', 'screen'}
+    
     def __init__(self, parent):
+        self._dirty = True
         self.__parent = parent
         self.mode = True
         self.fovy_ = 0.1 * pi
@@ -51,35 +59,115 @@ class Camera:
         self.screen = [200, 200]
         self.fovy_range = (0.1*pi, 0.9*pi)
     
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name in self._matrix_attrs:
+            object.__setattr__(self, '_dirty', True)
+    
+    def invalidate(self):
+        """Mark the matrices to be computed again."""
+        self._dirty = True
+    
     def set_axes(self, z=Z, y=Y, center=O):
         self.lpc = center
         self.eye = self.lpc + z * self.e2c_
         self.axes[2] = z
         self.axes[1] = y
         self.axes[0] = np.cross(y, z)
+        self.invalidate()
     
     def set_view(self, w, h):
+        if self.screen != [w, h]:
+            self.screen = [w, h]
+        
         glMatrixMode(GL_PROJECTION)
-        glLoadIdentity()
+        glLoadMatrixd(self.projection.T) # column-major
         
-        self.screen = [w, h]
-        d = self.depth
+        glMatrixMode(GL_MODELVIEW)
+        glLoadMatrixd(self.view.T)
+    
+    ## --------------------------------
+    ## Matrices
+    ## --------------------------------
+    
+    @property
+    def view(self):
+        """View matrix [4,4] (gluLookAt) in the column-vector convention."""
+        self._update()
+        return self._view
+    
+    @property
+    def projection(self):
+        """Projection matrix [4,4] (gluPerspective or glOrtho)."""
+        self._update()
+        return self._proj
+    
+    @property
+    def matrix(self):
+        """Projection * view matrix [4,4]."""
+        self._update()
+        return self._matrix
+    
+    def _update(self):
+        if not self._dirty:
+            return
+        w, h = self.screen
+        n, f = self.depth
         r = w / h
+        P = np.zeros((4, 4))
         if self.mode:
-            f = self.fovy_ * 180 / pi
-            gluPerspective(f, r, d[0], d[1]) # range z[+,++]
+            t = 1 / tan(self.fovy_/2)
+            P[0,0] = t / r
+            P[1,1] = t
+            P[2,2] = (f + n) / (n - f)
+            P[2,3] = 2 * f * n / (n - f)
+            P[3,2] = -1
         else:
             h = self.h2_
-            w = h * r
-            glOrtho(-w, w, -h, h, -d[1], d[1]) # range z[-,+]
+            P[0,0] = 1 / (h * r)
+            P[1,1] = 1 / h
+            P[2,2] = -1 / f # z range [-f, f]
+            P[3,3] = 1
         
-        glMatrixMode(GL_MODELVIEW)
-        glLoadIdentity()
+        e = np.asarray(self.eye, dtype=float)
+        z = e - self.lpc
+        z /= linalg.norm(z)
+        x = np.cross(self.axes[1], z)
+        x /= linalg.norm(x)
+        y = np.cross(z, x)
+        V = np.identity(4)
+        V[:3,:3] = x, y, z
+        V[:3,3] = -V[:3,:3] @ e
         
-        y = self.axes[1]
-        e = self.eye
-        c = self.lpc
-        gluLookAt(e[0], e[1], e[2], c[0], c[1], c[2], y[0], y[1], y[2])
+        self._proj = P
+        self._view = V
+        self._matrix = M = P @ V
+        self._inverse = linalg.inv(M)
+        object.__setattr__(self, '_dirty', False)
+    
+    def project(self, points):
+        """Project points [N,3] to the window coordinates [N,3].
+        
+        Returns (x, y, depth) as gluProject with the viewport (0, 0, w, h),
+        i.e., y from the bottom, and depth in the range [0, 1].
+        """
+        self._update()
+        p = np.asarray(points, dtype=float)
+        q = p @ self._matrix[:,:3].T + self._matrix[:,3]
+        q = q[...,:3] / q[...,3:]
+        return (q + 1) / 2 * [self.screen[0], self.screen[1], 1]
+    
+    def unproject(self, pixels, depth=0):
+        """Unproject window coordinates [N,2] at depth [N] to points [N,3].
+        
+        The inverse of project: (x, y) from the bottom, depth in [0, 1].
+        """
+        self._update()
+        xy = np.asarray(pixels, dtype=float)
+        z = np.broadcast_to(np.asarray(depth, dtype=float), xy.shape[:-1])
+        q = np.concatenate([xy / self.screen, z[...,None]], axis=-1) * 2 - 1
+        p = q @ self._inverse[:,:3].T + self._inverse[:,3]
+        return p[...,:3] / p[...,3:]
     
     def rotate(self, dx, dy):
         """Rotate camera pupil point."""
@@ -90,6 +178,7 @@ class Camera:
         self.axes[0] = x = np.cross(y, z)
         self.axes[1] = y = np.cross(z, x)
         self.axes[2] = z
+        self.invalidate()
         return True
     
     def shift(self, dx, dy):
@@ -101,6 +190,7 @@ class Camera:
         self.axes[0] = x = np.cross(y, z)
         self.axes[1] = y = np.cross(z, x)
         self.axes[2] = z
+        self.invalidate()
         return True
     
     def tilt(self, dt):
@@ -108,6 +198,7 @@ class Camera:
         x, y = self.axes[0:2]
         self.axes[0] =  x * cos(dt) + y * sin(dt)
         self.axes[1] = -x * sin(dt) + y * cos(dt)
+        self.invalidate()
         return True
     
     def zoom(self, rate):
@@ -127,3 +218,74 @@ class Camera:
             if self.zoom(f / self.fovy_): # adjust camera length
                 self.fovy_ = f
                 return True
+    
+    def pixels(self, centers, radii):
+        """Projected radii [pixel] of spheres at centers [N,3]."""
+        r = np.asarray(radii, dtype=float) * self.dpu
+        if self.mode:
+            d = (self.eye - np.asarray(centers, dtype=float)) @ self.axes[2]
+            r *= self.e2c_ / np.maximum(d, self.depth[0])
+        return r
+    
+    def frustum(self):
+        """Frustum planes [6,4] in the logical coordinates.
+        
+        Each plane (n, d) has the normal n pointing inward,
+        i.e., n.p + d >= 0 for a point p inside the view.
+        Order: near, far, left, right, bottom, top
+        """
+        x, y, z = self.view[:3,:3] # orthonormal axes (rotate does not normalize)
+        e = self.eye
+        w, h = self.screen
+        d = self.depth
+        r = w / h
+        if self.mode:
+            t = tan(self.fovy_/2)
+            n = np.array([-z, z,
+                          x - z * t * r, -x - z * t * r,
+                          y - z * t,     -y - z * t])
+            n /= linalg.norm(n, axis=1)[:,None]
+            p = np.array([e - z * d[0], e - z * d[1], e, e, e, e])
+        else:
+            h = self.h2_
+            w = h * r
+            n = np.array([-z, z, x, -x, y, -y])
+            p = np.array([e + z * d[1], e - z * d[1],
+                          e - x * w, e + x * w,
+                          e - y * h, e + y * h])
+        return np.hstack([n, -(n * p).sum(1)[:,None]])
+
+
+class Viewport:
+    """Viewport of a camera in the window.
+    
+    Args:
+        camera : <Camera> of the view
+        rect   : (x, y, w, h) relative to the window size [0-1]
+                 x, y from the top-left of the window
+    
+    The viewports share the render queue and compiled geometry of the stream;
+    only the camera and the viewport region are changed between them.
+    """
+    def __init__(self, camera, rect=(0, 0, 1, 1)):
+        self.camera = camera
+        self.rect = tuple(rect)
+    
+    def region(self, size):
+        """Region (x, y, w, h) [pixel] of glViewport (y from the bottom)."""
+        W, H = size
+        x, y, w, h = self.rect
+        x0, x1 = round(x * W), round((x + w) * W)
+        y0, y1 = round(y * H), round((y + h) * H)
+        return x0, H - y1, x1 - x0, y1 - y0
+    
+    def contains(self, size, x, y):
+        """True if the window position (x, y) from the top-left is inside."""
+        x0, y0, w, h = self.region(size)
+        y0 = size[1] - y0 - h
+        return x0 <= x < x0 + w and y0 <= y < y0 + h
+    
+    def local(self, size, x, y):
+        """Position (x, y) from the top-left of the viewport."""
+        x0, y0, w, h = self.region(size)
+        return x - x0, y - (size[1] - y0 - h)
@@ -0,0 +1,305 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+from OpenGL.raw.GL.VERSION.GL_1_1 import glTexSubImage2D as _glTexSubImage2D
+
+import ctypes
+import threading
+import numpy as np
+
+from .globject import Object
+from .glshader import Program, use_program, image_program
+from .glvolume import upload_lut
+
+
+## (dtype, channels) -> (internal format, format, type, scale to the data value)
+texture_formats = {
+    (np.dtype(np.uint8), 1)   : (GL_R8,     GL_RED,  GL_UNSIGNED_BYTE,  0xff),
+    (np.dtype(np.uint8), 3)   : (GL_RGB8,   GL_RGB,  GL_UNSIGNED_BYTE,  0xff),
+    (np.dtype(np.uint8), 4)   : (GL_RGBA8,  GL_RGBA, GL_UNSIGNED_BYTE,  0xff),
+    (np.dtype(np.uint16), 1)  : (GL_R16,    GL_RED,  GL_UNSIGNED_SHORT, 0xffff),
+    (np.dtype(np.float32), 1) : (GL_R32F,   GL_RED,  GL_FLOAT,          1),
+}
+
+
+def frame_format(frame):
+    """Convert the frame [h,w] or [h,w,c] to a format of the texture.
+    Returns the contiguous array and the key of texture_formats.
+    """
+    a = np.asarray(frame)
+    c = a.shape[2] if a.ndim == 3 else 1
+    if (a.dtype, c) not in texture_formats:
+        if c != 1:
+            raise TypeError("color frames must be uint8: {}".format(a.dtype))
+        a = a.astype(np.float32)
+    return np.ascontiguousarray(a), (a.dtype, c)
+
+
+def image_lut(lut=None, n=256):
+    """Colormap [n,4] of gray frames; opaque gray ramp (None),
+    or rgba [n,4], or rgb [n,3] with alpha 1 (not see-through).
+    """
+    if lut is None:
+        lut = np.repeat(np.linspace(0, 1, n, dtype=np.float32)[:,None], 3, axis=1)
+    lut = np.asarray(lut, dtype=np.float32)
+    if lut.shape[1] == 3:
+        lut = np.hstack([lut, np.ones((len(lut), 1), np.float32)])
+    return np.ascontiguousarray(lut)
+
+
+class TexturePool:
+    """Pool of 2D textures reused by the size and format.
+    
+    The storage of a texture is allocated once (glTexImage2D), and
+    the texture returned to the pool is reused instead of reallocated.
+    
+    Attributes:
+        limit : maximum number of textures kept in the pool;
+                the textures returned to the full pool are deleted
+    """
+    def __init__(self, limit=8):
+        self.textures = {} # (w, h, fmt) -> [tex, ...]
+        self.limit = limit
+    
+    def __len__(self):
+        return sum(len(v) for v in self.textures.values())
+    
+    def acquire(self, w, h, fmt, pix, typ):
+        texs = self.textures.get((w, h, fmt))
+        if texs:
+            return texs.pop()
+        tex = glGenTextures(1)
+        glBindTexture(GL_TEXTURE_2D, tex)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_WRAP_T, GL_CLAMP_TO_EDGE)
+        glTexImage2D(GL_TEXTURE_2D, 0, fmt, w, h, 0, pix, typ, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        return tex
+    
+    def release(self, tex, w, h, fmt):
+        """Return the texture to the pool (GL context required)."""
+        if len(self) >= self.limit:
+            glDeleteTextures([tex])
+        else:
+            self.textures.setdefault((w, h, fmt), []).append(tex)
+    
+    def clear(self):
+        """Delete the textures in the pool (GL context required)."""
+        for texs in self.textures.values():
+            glDeleteTextures(texs)
+        self.textures.clear()
+
+
+texture_pool = TexturePool()
+
+
+class ImagePlane(Object):
+    """Plane of live image frames.
+    
+    Frames are fed from any thread, e.g. the acquisition thread, and
+    only the latest one is uploaded when the plane is drawn; a frame not
+    drawn yet is replaced by the newer one (counted as dropped).
+    The pixels are copied to a ring of pixel buffer objects and sent to
+    the texture with glTexSubImage2D from the PBO, so that the copy is
+    done by the driver without reallocating the texture.
+    The contrast (window/level) and colormap (lut) are applied in the
+    fragment shader.
+    
+    >>> plane = ImagePlane(size=2, lut=lut)
+    >>> plane.feed(frame) # in the acquisition thread
+    
+    Args:
+        size    : height of the plane in the logical units
+                  (the width follows the aspect of the frame)
+        lut     : colormap [n,4] rgba (or [n,3] rgb) of gray frames
+                  (None: opaque gray)
+        window  : width of the values mapped to the lut
+        level   : center of the values mapped to the lut
+                  (None: auto contrast)
+        nbuf    : number of PBOs in the ring
+    
+    Attributes:
+        frames  : number of frames uploaded
+        dropped : number of frames replaced before they were uploaded
+        opacity : alpha of the plane (with the MALPHA style)
+        auto    : fit the window/level to the range of the frame
+                  when the format of the frames changes
+                  (set True to fit the next frame)
+    
+    Note:
+        The frame fed is displayed when the stream is redrawn; to display
+        frames as they come, set view.scheduler.ondemand = False (or call
+        view.draw() in the GUI thread). The fed array is not copied if
+        contiguous; feed a copy if the acquisition reuses the buffer.
+    """
+    own_program = True
+    
+    def __init__(self, size=1, lut=None, window=None, level=None, nbuf=3, **kwargs):
+        kwargs.setdefault('style', self.MSOLID)
+        super().__init__(**kwargs)
+        self.size = size
+        self.window = window
+        self.level = level
+        self.auto = window is None or level is None
+        self.opacity = 1.0
+        self.nbuf = nbuf
+        self.frames = 0
+        self.dropped = 0
+        self.shape = None # (h, w) of the texture
+        self.format = None
+        self.texture = None
+        self.pbos = None
+        self._index = 0
+        self._nbytes = [0] * nbuf
+        self._lock = threading.Lock()
+        self._pending = None
+        self._lut_texture = None
+        self.set_lut(lut)
+    
+    auto = property(lambda self: self._auto,
+                    lambda self, v: self._set_auto(v))
+    
+    def _set_auto(self, v):
+        self._auto = v
+        self._fitted = None # the format fitted to
+    
+    @property
+    def aspect(self):
+        if self.shape is None:
+            return 1
+        h, w = self.shape
+        return w / h
+    
+    @property
+    def radius(self):
+        return np.hypot(self.size * self.aspect, self.size) / 2
+    
+    def feed(self, frame):
+        """Set the frame [h,w] (uint8, uint16, float) or [h,w,3|4] (uint8)
+        to be displayed; replaces the frame pending (thread-safe).
+        """
+        frame = frame_format(frame)
+        with self._lock:
+            if self._pending is not None:
+                self.dropped += 1
+            self._pending = frame
+    
+    def set_lut(self, lut):
+        """Replace the colormap [n,4] (or [n,3] opaque; None: gray)."""
+        self.lut = image_lut(lut)
+        self._lut_dirty = True
+    
+    def release(self):
+        """Return the texture to the pool and delete the PBOs (GL context required)."""
+        if self.texture is not None:
+            h, w = self.shape
+            texture_pool.release(self.texture, w, h, self.format[0])
+            self.texture = None
+            self.shape = None
+        if self.pbos is not None:
+            glDeleteBuffers(self.nbuf, self.pbos)
+            self.pbos = None
+            self._nbytes = [0] * self.nbuf
+        if self._lut_texture is not None:
+            glDeleteTextures([self._lut_texture])
+            self._lut_texture = None
+            self._lut_dirty = True
+    
+    def upload(self):
+        """Upload the frame pending to the texture (GL thread)."""
+        if self._lut_dirty:
+            self._lut_texture = upload_lut(self.lut, self._lut_texture)
+            self._lut_dirty = False
+        
+        with self._lock:
+            pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        a, key = pending
+        fmt, pix, typ, scale = texture_formats[key]
+        h, w = a.shape[:2]
+        if self.shape != (h, w) or self.format != texture_formats[key]:
+            if self.texture is not None:
+                texture_pool.release(self.texture, *self.shape[::-1], self.format[0])
+            self.texture = texture_pool.acquire(w, h, fmt, pix, typ)
+            self.shape = (h, w)
+            self.format = texture_formats[key]
+        if (self.auto and self._fitted != key) or self.window is None or self.level is None:
+            lo, hi = (0, 0xff) if a.dtype == np.uint8 else (float(a.min()), float(a.max()))
+            self.window = (hi - lo) or 1.0
+            self.level = (hi + lo) / 2
+            self._fitted = key
+        if self.pbos is None:
+            self.pbos = glGenBuffers(self.nbuf)
+        
+        ## Write the pixels to the next PBO of the ring; the invalidation
+        ## orphans the storage still read by the previous transfer.
+        i = self._index
+        self._index = (i + 1) % self.nbuf
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, self.pbos[i])
+        if self._nbytes[i] != a.nbytes:
+            glBufferData(GL_PIXEL_UNPACK_BUFFER, a.nbytes, None, GL_STREAM_DRAW)
+            self._nbytes[i] = a.nbytes
+        ptr = glMapBufferRange(GL_PIXEL_UNPACK_BUFFER, 0, a.nbytes,
+                               GL_MAP_WRITE_BIT | GL_MAP_INVALIDATE_BUFFER_BIT)
+        if ptr:
+            ctypes.memmove(ptr, a.ctypes.data, a.nbytes)
+            glUnmapBuffer(GL_PIXEL_UNPACK_BUFFER)
+            glPushClientAttrib(GL_CLIENT_PIXEL_STORE_BIT)
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            glBindTexture(GL_TEXTURE_2D, self.texture)
+            _glTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, w, h, pix, typ, ctypes.c_void_p(0)) # offset in PBO
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glPopClientAttrib()
+            self.frames += 1
+        glBindBuffer(GL_PIXEL_UNPACK_BUFFER, 0)
+    
+    def _corners(self):
+        h = self.size / 2
+        w = h * self.aspect
+        return [(-w, h), (w, h), (w, -h), (-w, -h)] # from the top-left
+    
+    def draw_line(self):
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_LIGHTING)
+        glBegin(GL_LINE_LOOP)
+        for x, y in self._corners():
+            glVertex2d(x, y)
+        glEnd()
+        glPopAttrib()
+    
+    def draw_face(self):
+        self.upload()
+        if self.texture is None:
+            return
+        current = Program.current
+        glPushAttrib(GL_ENABLE_BIT | GL_TEXTURE_BIT)
+        glDisable(GL_CULL_FACE)
+        prog = image_program
+        prog.use()
+        glUniform1i(prog.uniform('image'), 0)
+        glUniform1i(prog.uniform('lut'), 1)
+        glUniform1f(prog.uniform('scale'), self.format[3])
+        glUniform1f(prog.uniform('window'), self.window)
+        glUniform1f(prog.uniform('level'), self.level)
+        glUniform1f(prog.uniform('opacity'), self.opacity)
+        glUniform1i(prog.uniform('gray'), self.format[1] == GL_RED)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_1D, self._lut_texture)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        try:
+            glBegin(GL_QUADS)
+            for (x, y), (s, t) in zip(self._corners(), [(0, 0), (1, 0), (1, 1), (0, 1)]):
+                glTexCoord2d(s, t) # row 0 at the top
+                glVertex2d(x, y)
+            glEnd()
+        finally:
+            glBindTexture(GL_TEXTURE_2D, 0)
+            glActiveTexture(GL_TEXTURE1)
+            glBindTexture(GL_TEXTURE_1D, 0)
+            glActiveTexture(GL_TEXTURE0)
+            use_program(current)
+            glPopAttrib()
@@ -0,0 +1,236 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from time import perf_counter
+import queue
+import numpy as np
+
+from .globject import Object, MeshObject
+
+
+class WireBox(Object):
+    """Wire-frame cube of the size (half width) shown while loading."""
+    def __init__(self, size=1, **kwargs):
+        kwargs.setdefault('shade', (0.5, 0.5, 0.5, 1))
+        kwargs.setdefault('style', self.MWIRE | self.MRGBA)
+        super().__init__(**kwargs)
+        self.size = size
+    
+    key = ()
+    scale = property(lambda self: self.size)
+    radius = property(lambda self: self.size * np.sqrt(3))
+    
+    def draw_line(self):
+        c = np.array([[x, y, z] for x in (-1, 1) for y in (-1, 1) for z in (-1, 1)])
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_LIGHTING)
+        glBegin(GL_LINES)
+        for i in range(8):
+            for b in (1, 2, 4):
+                if not i & b:
+                    glVertex3dv(c[i])
+                    glVertex3dv(c[i | b])
+        glEnd()
+        glPopAttrib()
+
+
+def make_object(result):
+    """Make an object of the result of the loader function.
+    
+    The result can be an <Object>, a dict of MeshObject arguments
+    (vertices, normals, faces, colors), or a tuple of them.
+    """
+    if isinstance(result, Object):
+        return result
+    if isinstance(result, dict):
+        return MeshObject(**result)
+    return MeshObject(*result)
+
+
+def upload(obj):
+    """Send the buffers of the object to GL (GL context required)."""
+    for buf in getattr(obj, 'buffers', {}).values():
+        buf.bind()
+        buf.unbind()
+
+
+class Proxy(Object):
+    """Placeholder of an object being loaded.
+    
+    The proxy is drawn as the placeholder until the object is ready,
+    then as the object at the position of the proxy.
+    
+    Attributes:
+        target      : the object loaded (None until ready)
+        placeholder : <Object> drawn while loading (None: nothing)
+        status      : {'pending', 'ready', 'cancelled', 'failed'}
+        error       : exception raised by the loader function
+    """
+    def __init__(self, placeholder=None, pos=None, make=None):
+        super().__init__(pos=pos)
+        self.placeholder = placeholder
+        self.target = None
+        self.status = 'pending'
+        self.error = None
+        self.future = None
+        self.make = make or make_object
+        if placeholder is not None:
+            self.style = placeholder.style
+            self.shade = placeholder.shade
+    
+    @property
+    def loading(self):
+        if self.status == 'ready':
+            return self.target.loading # e.g. PointCloud
+        return self.status == 'pending'
+    
+    @property
+    def ready(self):
+        return self.status == 'ready' and self.target.ready
+    
+    @property
+    def radius(self):
+        obj = self.target or self.placeholder
+        return obj.radius if obj is not None else np.inf
+    
+    @property
+    def lod(self):
+        return getattr(self.target, 'lod', None)
+    
+    @property
+    def own_program(self):
+        obj = self.target if self.status == 'ready' else self.placeholder
+        return obj is not None and obj.own_program
+    
+    level = property(lambda self: getattr(self.target, 'level', None),
+                     lambda self, v: setattr(self.target, 'level', v))
+    
+    def cancel(self):
+        """Cancel loading; the placeholder is no longer drawn."""
+        if self.status == 'pending':
+            self.status = 'cancelled'
+            if self.future is not None:
+                self.future.cancel() # if not started yet
+            return True
+        return False
+    
+    def _ready(self, obj):
+        self.target = obj
+        self.style = obj.style
+        self.shade = obj.shade
+        self.status = 'ready'
+    
+    def __call__(self, state=None):
+        if not self.visible:
+            return
+        obj = self.target if self.status == 'ready' else None
+        if obj is None and self.status == 'pending':
+            obj = self.placeholder
+        if obj is not None:
+            obj.pos = self.pos
+            obj.modelview = self.modelview
+            obj.scaling = self.scaling
+            obj(state)
+
+
+class Loader:
+    """Background loader of objects.
+    
+    Functions making the geometry (e.g. reading files, tessellation)
+    run in a thread or process pool, and their results come back through
+    a queue. The stream drains the queue in the GL thread with a time
+    budget per frame, makes the objects and uploads their buffers.
+    
+    >>> proxy = view.load(read_mesh, 'bunny.ply')
+    >>> proxy.cancel()
+    
+    Args:
+        workers   : number of workers (None: default of the pool)
+        processes : use a process pool (the function, arguments, and
+                    result must be picklable, e.g. dict of arrays)
+        budget    : time [s] to spend in poll per frame
+    
+    Note:
+        A running function is not interrupted by cancel;
+        its result is discarded when it comes back.
+    """
+    def __init__(self, workers=None, processes=False, budget=0.004):
+        self.workers = workers
+        self.processes = processes
+        self.budget = budget
+        self._pool = None
+        self._done = queue.Queue()
+        self._pending = set()
+    
+    @property
+    def pending(self):
+        """Number of objects not delivered yet."""
+        return len(self._pending)
+    
+    def submit(self, func, *args, placeholder=None, pos=None, make=None):
+        """Run func(*args) in the pool; returns the <Proxy> of the object.
+        
+        Args:
+            placeholder : <Object> drawn while loading (default: WireBox)
+            pos         : position of the object
+            make        : function to make the object of the result
+                          in the GL thread (default: make_object)
+        """
+        if placeholder is None:
+            placeholder = WireBox()
+        proxy = Proxy(placeholder, pos, make)
+        if self._pool is None:
+            if self.processes:
+                self._pool = ProcessPoolExecutor(self.workers)
+            else:
+                self._pool = ThreadPoolExecutor(self.workers)
+        proxy.future = f = self._pool.submit(func, *args)
+        self._pending.add(proxy)
+        f.add_done_callback(lambda f: self._done.put(proxy))
+        return proxy
+    
+    def poll(self, budget=None):
+        """Make the objects loaded within the budget [s] (GL thread).
+        At least one object is made per call. Returns the number made.
+        """
+        if budget is None:
+            budget = self.budget
+        t = perf_counter() + budget
+        n = 0
+        for proxy in list(self._pending):
+            if proxy.status != 'pending':
+                self._pending.discard(proxy) # cancelled
+        while 1:
+            try:
+                proxy = self._done.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.discard(proxy)
+            if proxy.status != 'pending':
+                continue
+            try:
+                obj = proxy.make(proxy.future.result())
+                upload(obj)
+                proxy._ready(obj)
+            except Exception as e:
+                proxy.status = 'failed'
+                proxy.error = e
+            proxy.future = None
+            n += 1
+            if perf_counter() > t:
+                break
+        return n
+    
+    def cancel(self):
+        """Cancel all the pending objects."""
+        for proxy in list(self._pending):
+            proxy.cancel()
+        self._pending.clear()
+    
+    def shutdown(self, wait=False):
+        self.cancel()
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait)
+            self._pool = None
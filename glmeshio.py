@@ -0,0 +1,477 @@
+#! python3
+# -*- coding: utf8 -*-
+"""Mesh file readers
+
+OBJ, PLY (ascii/binary) and STL (ascii/binary) files are parsed
+with NumPy into the arrays of <MeshObject>, i.e., float32 vertices,
+normals and colors, and uint32 faces ready to be uploaded.
+
+The arrays are cached beside the source file (e.g. bunny.ply.cache/)
+as .npy files, and memory-mapped by the later loads.
+
+>>> view.objects += [load_mesh('bunny.ply', shade=glo.silver)]
+>>> view.load(read_mesh, 'bunny.ply') # in the background
+"""
+import os
+import re
+import shutil
+import struct
+import warnings
+import numpy as np
+
+from .globject import MeshObject
+
+
+def vertex_normals(vertices, faces):
+    """Area-weighted normals [N,3] of the vertices."""
+    v = np.asarray(vertices, dtype=np.float64)
+    f = np.asarray(faces, dtype=np.int64)
+    fn = np.cross(v[f[:,1]] - v[f[:,0]], v[f[:,2]] - v[f[:,0]])
+    idx = f.ravel()
+    n = np.empty((len(v), 3))
+    for k in range(3):
+        n[:,k] = np.bincount(idx, np.repeat(fn[:,k], 3), minlength=len(v))
+    norm = np.sqrt((n * n).sum(1))
+    norm[norm == 0] = 1
+    return (n / norm[:,None]).astype(np.float32)
+
+
+def fan_triangles(first, count):
+    """Triangulate polygons [first, first + count) of an index array
+    into fans. Returns the positions [M,3] in the array.
+    """
+    first = np.asarray(first, dtype=np.int64)
+    ntri = np.maximum(np.asarray(count, dtype=np.int64) - 2, 0)
+    base = np.repeat(first, ntri)
+    k = np.arange(ntri.sum()) - np.repeat(np.cumsum(ntri) - ntri, ntri)
+    return np.stack([base, base + k + 1, base + k + 2], axis=1)
+
+
+def _mesh(vertices, faces, normals=None, colors=None):
+    vertices = np.ascontiguousarray(vertices, np.float32)
+    faces = np.ascontiguousarray(faces, np.uint32).reshape(-1, 3)
+    if normals is None:
+        normals = vertex_normals(vertices, faces)
+    mesh = {
+        'vertices' : vertices,
+        'normals'  : np.ascontiguousarray(normals, np.float32),
+        'faces'    : faces,
+    }
+    if colors is not None:
+        mesh['colors'] = np.ascontiguousarray(colors, np.float32)
+    return mesh
+
+
+def _tokens(lines, dtype):
+    ## All the tokens of the lines as one array (no per-line loop).
+    return np.array(b' '.join(lines).split(), dtype=dtype)
+
+
+## --------------------------------
+## OBJ
+## --------------------------------
+
+def read_obj(path):
+    """Read a Wavefront OBJ file (v and f records).
+    
+    Polygons are triangulated into fans. The normals are computed
+    from the faces (vn and vt are not used). Vertex colors of the
+    form `v x y z r g b` are read as colors.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    
+    v = re.findall(rb'^v[ \t]+([^\r\n#]*)', data, re.M)
+    if not v:
+        raise ValueError("No vertices in {!r}".format(path))
+    k = len(v[0].split())
+    values = _tokens(v, np.float64)
+    if values.size != k * len(v):
+        ## Mixed records: only x y z of each line.
+        values = _tokens([b' '.join(s.split()[:3]) for s in v], np.float64)
+        k = 3
+    values = values.reshape(-1, k)
+    vertices = values[:,:3]
+    colors = values[:,3:6] if k >= 6 else None
+    
+    ## The indices of each face followed by 0 (invalid in OBJ) as a mark.
+    fl = re.findall(rb'^f[ \t]+([^\r\n#]*)', data, re.M)
+    block = re.sub(rb'/\S*', b'', b' 0 '.join(fl) + b' 0')
+    idx = np.array(block.split(), dtype=np.int64)
+    ends = np.flatnonzero(idx == 0)
+    first = np.concatenate([[0], ends[:-1] + 1])
+    count = ends - first
+    if (idx < 0).any():
+        ## Relative indices count back from the vertices read so far,
+        ## i.e., the v records before each f record in the file.
+        vpos = [m.start() for m in re.finditer(rb'^v[ \t]', data, re.M)]
+        fpos = [m.start() for m in re.finditer(rb'^f[ \t]', data, re.M)]
+        nv = np.searchsorted(vpos, fpos)
+        idx += np.where(idx < 0, np.repeat(nv, count + 1) + 1, 0)
+    idx -= 1 # 1-based
+    faces = idx[fan_triangles(first, count)]
+    return _mesh(vertices, faces, colors=colors)
+
+
+## --------------------------------
+## PLY
+## --------------------------------
+
+ply_types = {
+    'char'   : 'i1', 'int8'    : 'i1',
+    'uchar'  : 'u1', 'uint8'   : 'u1',
+    'short'  : 'i2', 'int16'   : 'i2',
+    'ushort' : 'u2', 'uint16'  : 'u2',
+    'int'    : 'i4', 'int32'   : 'i4',
+    'uint'   : 'u4', 'uint32'  : 'u4',
+    'float'  : 'f4', 'float32' : 'f4',
+    'double' : 'f8', 'float64' : 'f8',
+}
+
+
+struct_codes = {
+    'i1' : 'b', 'u1' : 'B', 'i2' : 'h', 'u2' : 'H',
+    'i4' : 'i', 'u4' : 'I', 'f4' : 'f', 'f8' : 'd',
+}
+
+
+def _ply_header(f):
+    if f.readline().strip() != b'ply':
+        raise ValueError("Not a PLY file")
+    fmt = None
+    elements = [] # [(name, count, [(prop, type, list count type)])]
+    while 1:
+        line = f.readline()
+        if not line:
+            raise ValueError("Unexpected end of the PLY header")
+        w = line.decode('ascii', 'replace').split()
+        if not w or w[0] in ('comment', 'obj_info'):
+            continue
+        if w[0] == 'end_header':
+            break
+        if w[0] == 'format':
+            fmt = w[1]
+        elif w[0] == 'element':
+            elements.append((w[1], int(w[2]), []))
+        elif w[0] == 'property':
+            if w[1] == 'list':
+                elements[-1][2].append((w[4], ply_types[w[3]], ply_types[w[2]]))
+            else:
+                elements[-1][2].append((w[2], ply_types[w[1]], None))
+    return fmt, elements
+
+
+def _ply_list_offsets(buf, offset, count, ctype, vtype, pre=0, post=0,
+                      step=16, window=1<<18):
+    """Find the records of an element of one list property.
+    Returns the offsets of the items [count] and the sizes [count].
+    
+    The records can have other properties of `pre` bytes before the count
+    and of `post` bytes after the items.
+    
+    The offset of a record depends on the sizes of all the previous ones,
+    so the next record of every byte offset in a window of the data ahead
+    is computed at once. The chain from the first record is walked by every
+    `step` records (by pointer doubling), and the records between are filled
+    in at once. The window then moves on to the first record out of it.
+    """
+    cs = np.dtype(ctype).itemsize
+    vs = np.dtype(vtype).itemsize
+    head = pre + cs + post # the size of a record without items
+    starts = np.empty(count, np.int64)
+    sizes = np.empty(count, np.int64)
+    raw = np.frombuffer(buf, np.uint8, len(buf) - offset, offset)
+    n = 0
+    p = 0 # the next record in raw
+    while n < count:
+        m = min(window, len(raw) - p - pre - cs + 1) # the offsets a count can be read at
+        if m <= 0:
+            raise ValueError("Unexpected end of the PLY data")
+        c = np.lib.stride_tricks.sliding_window_view(raw[p+pre:p+pre+m+cs-1], cs)
+        c = np.ascontiguousarray(c).view(ctype)[:,0]
+        
+        ## jump[i] is the next record of the record at i (m: out of the window).
+        jump = np.empty(m + 1, np.int64)
+        np.multiply(c, vs, out=jump[:m], dtype=np.int64, casting='unsafe')
+        jump[:m] += np.arange(head, m + head)
+        np.minimum(jump, m, out=jump)
+        if c.dtype.kind == 'i':
+            jump[:m][c < 0] = m
+        jump[m] = m
+        far = jump
+        for k in range(step.bit_length() - 1):
+            far = far[far] # 2**(k+1) records ahead
+        
+        heads = []
+        q = 0
+        while q < m and len(heads) * step < count - n:
+            heads.append(q)
+            q = far[q]
+        at = np.empty((len(heads), step), np.int64)
+        at[:,0] = heads
+        for k in range(1, step):
+            at[:,k] = jump[at[:,k-1]]
+        at = at.ravel()[:count - n]
+        at = at[:np.searchsorted(at, m)] # the chain increases up to m
+        s = c[at].astype(np.int64)
+        if (s < 0).any():
+            raise ValueError("Negative list size in the PLY data")
+        starts[n:n + len(at)] = p + at + pre + cs
+        sizes[n:n + len(at)] = s
+        n += len(at)
+        p += int(at[-1] + head + s[-1] * vs)
+    if p > len(raw):
+        raise ValueError("Unexpected end of the PLY data")
+    return offset + starts, sizes
+
+
+def _ply_list_binary(buf, offset, count, props, endian):
+    """Read an element with a list property (e.g. vertex_indices).
+    Returns (the lists [count,n] or (first, sizes, values), next offset).
+    """
+    lists = [p for p in props if p[2]]
+    name, vtype, ctype = lists[0]
+    if count:
+        ## Lists of constant sizes (e.g. triangles only) are read at once
+        ## as records of all the properties, sized by the first record.
+        fields = []
+        for pname, ptype, pctype in props:
+            pos = offset + np.dtype(fields).itemsize
+            if pctype:
+                if pos + np.dtype(pctype).itemsize > len(buf):
+                    break
+                n = int(np.frombuffer(buf, endian + pctype, 1, pos)[0])
+                if n < 0:
+                    break
+                fields += [('#' + pname, endian + pctype), (pname, endian + ptype, (n,))]
+            else:
+                fields.append((pname, endian + ptype))
+        else:
+            dt = np.dtype(fields)
+            if offset + dt.itemsize * count <= len(buf):
+                rec = np.frombuffer(buf, dt, count, offset)
+                if all((rec['#' + p[0]] == dt[p[0]].shape[0]).all() for p in lists):
+                    return rec[name], offset + dt.itemsize * count
+    
+    if len(lists) == 1:
+        ## Variable-size lists (e.g. mixed polygons) are scanned at once,
+        ## with the other properties before and after the list.
+        k = props.index(lists[0])
+        pre = sum(np.dtype(p[1]).itemsize for p in props[:k])
+        post = sum(np.dtype(p[1]).itemsize for p in props[k+1:])
+        starts, sizes = _ply_list_offsets(buf, offset, count, endian + ctype, vtype, pre, post)
+        pos = int(starts[-1] + sizes[-1] * np.dtype(vtype).itemsize + post) if count else offset
+    else:
+        ## Several lists: only the counts are walked in Python,
+        ## and the items are gathered at once.
+        sizes = np.empty(count, np.int64)
+        starts = np.empty(count, np.int64)
+        items = [(struct.Struct(endian + struct_codes[p[2]]).unpack_from, p[2], p[1], p[0] == name)
+                 if p[2] else (None, None, p[1], False) for p in props]
+        pos = offset
+        for i in range(count):
+            for unpack, ctype, ptype, indices in items:
+                if unpack is None:
+                    pos += np.dtype(ptype).itemsize
+                    continue
+                n, = unpack(buf, pos)
+                pos += np.dtype(ctype).itemsize
+                if indices:
+                    sizes[i] = n
+                    starts[i] = pos
+                pos += np.dtype(ptype).itemsize * n
+    k = np.dtype(vtype).itemsize
+    first = np.cumsum(sizes) - sizes
+    at = np.repeat(starts - first * k, sizes) + np.arange(sizes.sum()) * k
+    raw = np.frombuffer(buf, np.uint8)[(at[:,None] + np.arange(k)).ravel()]
+    return (first, sizes, raw.view(endian + vtype).astype(np.int64)), pos
+
+
+def read_ply(path):
+    """Read a PLY file (ascii, binary_little_endian, binary_big_endian).
+    
+    The vertex element gives x, y, z, and optionally nx, ny, nz
+    and red, green, blue, alpha. The face element gives vertex_indices
+    (or vertex_index); polygons are triangulated into fans.
+    """
+    with open(path, 'rb') as f:
+        fmt, elements = _ply_header(f)
+        data = f.read()
+    
+    result = {}
+    if fmt == 'ascii':
+        lines = data.splitlines()
+        pos = 0
+        for name, count, props in elements:
+            block = lines[pos:pos + count]
+            pos += count
+            if not any(p[2] for p in props):
+                dt = np.dtype([(p[0], p[1]) for p in props])
+                values = _tokens(block, np.float64).reshape(count, len(props))
+                rec = np.empty(count, dt)
+                for k, p in enumerate(props):
+                    rec[p[0]] = values[:,k]
+                result[name] = rec
+            elif count:
+                ## The items of each line followed by -1 as a mark
+                ## (the indices are not negative).
+                idx = _tokens([b' -1 '.join(block) + b' -1'], np.float64).astype(np.int64)
+                ends = np.flatnonzero(idx == -1)
+                starts = np.concatenate([[0], ends[:-1] + 1])
+                k = [i for i, p in enumerate(props) if p[2]][0] # the list position
+                result[name] = (starts + k + 1, idx[starts + k], idx)
+    else:
+        endian = '<' if fmt == 'binary_little_endian' else '>'
+        offset = 0
+        for name, count, props in elements:
+            if not any(p[2] for p in props):
+                dt = np.dtype([(p[0], endian + p[1]) for p in props])
+                result[name] = np.frombuffer(data, dt, count, offset)
+                offset += dt.itemsize * count
+            else:
+                result[name], offset = _ply_list_binary(data, offset, count, props, endian)
+    
+    vertex = result.get('vertex')
+    if vertex is None:
+        raise ValueError("No vertex element in {!r}".format(path))
+    names = vertex.dtype.names
+    vertices = np.stack([vertex['x'], vertex['y'], vertex['z']], axis=1)
+    normals = None
+    if {'nx', 'ny', 'nz'} <= set(names):
+        normals = np.stack([vertex['nx'], vertex['ny'], vertex['nz']], axis=1)
+    colors = None
+    rgb = [c for c in ('red', 'green', 'blue', 'alpha') if c in names]
+    if len(rgb) >= 3:
+        colors = np.stack([vertex[c] for c in rgb], axis=1).astype(np.float32)
+        if vertex.dtype[rgb[0]].kind in 'iu':
+            colors /= 255
+    
+    face = result.get('face')
+    if face is None:
+        faces = np.empty((0, 3), np.uint32)
+    elif isinstance(face, tuple):
+        first, sizes, values = face
+        faces = values[fan_triangles(first, sizes)]
+    else:
+        tri = fan_triangles([0], [face.shape[1]])
+        faces = face[:,tri].reshape(-1, 3)
+    return _mesh(vertices, faces, normals, colors)
+
+
+## --------------------------------
+## STL
+## --------------------------------
+
+stl_dtype = np.dtype([
+    ('normal', '<f4', 3),
+    ('vertices', '<f4', (3, 3)),
+    ('attr', '<u2'),
+])
+
+
+def read_stl(path):
+    """Read an STL file (binary or ascii).
+    
+    The triangles are not welded; each has its own three vertices
+    with the facet normal (flat shading as in CAD models).
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    n = int(np.frombuffer(data, '<u4', 1, 80)[0]) if len(data) >= 84 else -1
+    if n >= 0 and len(data) == 84 + n * stl_dtype.itemsize:
+        rec = np.frombuffer(data, stl_dtype, n, 84)
+        vertices = rec['vertices'].reshape(-1, 3)
+        normals = rec['normal']
+    else:
+        v = re.findall(rb'vertex\s+(\S+)\s+(\S+)\s+(\S+)', data)
+        vertices = np.array(v, dtype=np.float64).reshape(-1, 3)
+        nl = re.findall(rb'facet\s+normal\s+(\S+)\s+(\S+)\s+(\S+)', data)
+        normals = np.array(nl, dtype=np.float64).reshape(-1, 3)
+    n = len(vertices) // 3
+    faces = np.arange(3 * n, dtype=np.uint32).reshape(-1, 3)
+    normals = np.repeat(normals, 3, axis=0)
+    if not np.any(normals):
+        normals = None # computed from the faces
+    return _mesh(vertices, faces, normals)
+
+
+## --------------------------------
+## Cache
+## --------------------------------
+
+readers = {
+    '.obj' : read_obj,
+    '.ply' : read_ply,
+    '.stl' : read_stl,
+}
+
+
+def cache_path(path):
+    return path + '.cache'
+
+
+def _stamp(path):
+    st = os.stat(path)
+    return np.array([st.st_size, st.st_mtime_ns], np.int64)
+
+
+def read_cache(path, mmap_mode='r'):
+    """Memory-map the cached arrays of the source file (None if stale)."""
+    cache = cache_path(path)
+    try:
+        stamp = np.load(os.path.join(cache, 'stamp.npy'))
+        if not np.array_equal(stamp, _stamp(path)):
+            return None
+        mesh = {}
+        for name in ('vertices', 'normals', 'faces', 'colors'):
+            fn = os.path.join(cache, name + '.npy')
+            if os.path.exists(fn):
+                mesh[name] = np.load(fn, mmap_mode=mmap_mode)
+        return mesh
+    except (OSError, ValueError):
+        return None
+
+
+def write_cache(path, mesh):
+    """Write the arrays beside the source file."""
+    cache = cache_path(path)
+    tmp = cache + '.tmp{}'.format(os.getpid())
+    try:
+        os.makedirs(tmp, exist_ok=True)
+        for name, a in mesh.items():
+            np.save(os.path.join(tmp, name + '.npy'), a)
+        np.save(os.path.join(tmp, 'stamp.npy'), _stamp(path))
+        if os.path.isdir(cache):
+            shutil.rmtree(cache)
+        os.replace(tmp, cache)
+    except OSError as e:
+        shutil.rmtree(tmp, ignore_errors=True)
+        warnings.warn("Failed to write the mesh cache: {}".format(e))
+
+
+def read_mesh(path, cache=True, mmap_mode='r'):
+    """Read the mesh file into a dict of arrays (MeshObject arguments).
+    
+    Args:
+        path      : file name (*.obj, *.ply, *.stl)
+        cache     : write the cache at the first load, and map it later
+        mmap_mode : mode of the mapped arrays ('r': read-only, 'c': copy-on-write)
+    """
+    if cache:
+        mesh = read_cache(path, mmap_mode)
+        if mesh is not None:
+            return mesh
+    ext = os.path.splitext(path)[1].lower()
+    try:
+        reader = readers[ext]
+    except KeyError:
+        raise ValueError("Unknown mesh format {!r}".format(ext))
+    mesh = reader(path)
+    if cache:
+        write_cache(path, mesh)
+    return mesh
+
+
+def load_mesh(path, cache=True, **kwargs):
+    """Make a <MeshObject> of the mesh file (kwargs: pos, shade, style)."""
+    return MeshObject(**read_mesh(path, cache), **kwargs)
@@ -4,8 +4,16 @@ from OpenGL.GL import *
 from OpenGL.GLU import *
 from OpenGL.GLUT import *
 
+from collections import OrderedDict
+import threading
+import operator
+import queue
 import copy
 import numpy as np
+from numpy import pi
+
+from .glshader import Program, PhongProgram, use_program
+from .glshader import instance_program, point_program
 
 
 N = np.zeros(4)
@@ -16,14 +24,33 @@ X,Y,Z = np.identity(3)
 
 
 class Material:
+    """Material parameters.
+    
+    The parameters are kept as float32 arrays to be sent to GL as is.
+    The version is incremented when a parameter is assigned, so that
+    the materials in the uniform buffer (phong pipeline) are packed again.
+    Call touch() after changing the arrays in place.
+    """
+    version = 0
+    
     def __init__(self, a, d, s, sh):
-        self.ambient = a
-        self.diffuse = d
-        self.specular = s
-        self.shininess = sh
+        self.ambient = np.array(a, np.float32)
+        self.diffuse = np.array(d, np.float32)
+        self.specular = np.array(s, np.float32)
+        self.shininess = np.float32(sh)
+    
+    def __setattr__(self, name, value):
+        object.__setattr__(self, name, value)
+        if name != 'version':
+            self.touch()
     
     def __str__(self):
-        return '\n'.join("  {:>12} : {}".format(k,v) for k,v in vars(self).items())
+        return '\n'.join("  {:>12} : {}".format(k,v) for k,v in vars(self).items()
+                                                    if k != 'version')
+    
+    def touch(self):
+        """Mark the parameters changed."""
+        self.version += 1
     
     def set_alpha(self, a):
         self = copy.deepcopy(self)
@@ -90,6 +117,231 @@ ruby    = Material([0.1745,   0.01175,  0.01175,  1.0 ],
                    [0.727811, 0.626959, 0.626959, 1.0 ],  76.8 )
 
 
+class DisplayListCache:
+    """Display-list cache of object geometry.
+    
+    Compiled lists are shared by all objects with the same key.
+    The least recently used list is deleted when maxsize is exceeded.
+    
+    Note:
+        Display lists belong to the GL context they are compiled in.
+        Call clear() (with the context current) when the context is renewed.
+    """
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self.lists = OrderedDict()
+    
+    def __len__(self):
+        return len(self.lists)
+    
+    def __call__(self, key, draw):
+        """Call the list of the key; compile draw function if not cached."""
+        n = self.lists.get(key)
+        if n is not None:
+            self.lists.move_to_end(key)
+            glCallList(n)
+            return
+        n = glGenLists(1)
+        glNewList(n, GL_COMPILE_AND_EXECUTE)
+        try:
+            draw()
+        except Exception:
+            glEndList()
+            glDeleteLists(n, 1)
+            raise
+        glEndList()
+        self.lists[key] = n
+        while len(self.lists) > self.maxsize:
+            _, n = self.lists.popitem(last=False)
+            glDeleteLists(n, 1)
+    
+    def clear(self):
+        while self.lists:
+            _, n = self.lists.popitem()
+            glDeleteLists(n, 1)
+
+
+geometry_cache = DisplayListCache()
+
+
+class Buffer:
+    """GL buffer object of NumPy array.
+    
+    The array is uploaded when first bound (GL context required).
+    Modified rows are sent with glBufferSubData on the next bind.
+    
+    Attributes:
+        data    : host array (not copied if already contiguous of dtype)
+        target  : buffer target (e.g. GL_ARRAY_BUFFER)
+        usage   : usage hint (e.g. GL_STATIC_DRAW)
+    """
+    def __init__(self, data, dtype=np.float32,
+                 target=GL_ARRAY_BUFFER, usage=GL_STATIC_DRAW):
+        self.data = np.ascontiguousarray(data, dtype)
+        self.target = target
+        self.usage = usage
+        self.id = None
+        self._nbytes = 0
+        self._range = None # modified rows [start, stop)
+    
+    def __len__(self):
+        return len(self.data)
+    
+    def set(self, data):
+        """Replace the data (reallocated if the size changes)."""
+        self.data = np.ascontiguousarray(data, self.data.dtype)
+        self._range = (0, len(self.data))
+    
+    def modify(self, values=None, index=None):
+        """Modify rows of the data and mark them to be sent.
+        The index is an int, slice, or array of rows (or bool mask);
+        the range of the rows from the first to the last is sent.
+        If values is None, the rows are marked as modified in place.
+        """
+        size = len(self.data)
+        if index is None:
+            index = slice(None)
+        elif not isinstance(index, slice):
+            rows = np.asarray(index)
+            if rows.ndim == 0:
+                i = operator.index(index)
+                if i < 0:
+                    i += size
+                n = 1 if values is None or np.ndim(values) < self.data.ndim else len(values)
+                index = slice(i, i + n)
+            else:
+                if rows.dtype == bool:
+                    rows = np.flatnonzero(rows)
+                if values is not None:
+                    self.data[index] = values
+                if not rows.size:
+                    return
+                rows = np.where(rows < 0, rows + size, rows)
+                index = slice(int(rows.min()), int(rows.max()) + 1)
+                values = None
+        if values is not None:
+            self.data[index] = values
+        start, stop, step = index.indices(size)
+        if step < 0:
+            start, stop = stop + 1, start + 1
+        if start >= stop:
+            return
+        if self._range:
+            start = min(start, self._range[0])
+            stop = max(stop, self._range[1])
+        self._range = (start, stop)
+    
+    def bind(self):
+        if self.id is None:
+            self.id = glGenBuffers(1)
+        glBindBuffer(self.target, self.id)
+        data = self.data
+        if self._nbytes != data.nbytes:
+            glBufferData(self.target, data.nbytes, data, self.usage)
+            self._nbytes = data.nbytes
+            self._range = None
+        elif self._range:
+            a, b = self._range
+            n = data.strides[0] if data.ndim else data.itemsize
+            glBufferSubData(self.target, a * n, (b - a) * n, data[a:b])
+            self._range = None
+    
+    def unbind(self):
+        glBindBuffer(self.target, 0)
+    
+    def release(self):
+        """Delete the buffer object (GL context required)."""
+        if self.id is not None:
+            glDeleteBuffers(1, [self.id])
+            self.id = None
+            self._nbytes = 0
+
+
+def send_material(m):
+    glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, m.ambient)
+    glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, m.diffuse)
+    glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, m.specular)
+    glMaterialf (GL_FRONT_AND_BACK, GL_SHININESS, m.shininess)
+
+
+class GLState:
+    """GL state tracker.
+    
+    Keeps the last state sent to GL and skips redundant state changes.
+    Call reset() when the GL state is unknown (e.g., at the beginning of frame).
+    
+    Attributes:
+        changes : number of state changes sent to GL
+        draws   : number of draw calls (object frame modes)
+        program : <PhongProgram> in use (None: fixed-function pipeline)
+                  The materials are sent to the program as indices.
+    """
+    def __init__(self):
+        self.changes = 0
+        self.draws = 0
+        self.program = None
+        self.reset()
+    
+    def reset(self):
+        self.caps = {}
+        self.shade = None
+        self.mask = None
+        self.blendfunc = None
+    
+    def use_program(self, program):
+        if self.program is not program:
+            use_program(program)
+            self.program = program
+            self.shade = None
+            self.caps.pop(GL_COLOR_MATERIAL, None)
+            self.changes += 1
+    
+    def enable(self, cap, flag=True):
+        flag = bool(flag)
+        if self.caps.get(cap) is not flag:
+            if cap == GL_COLOR_MATERIAL and self.program is not None:
+                self.program.color_material = flag
+            elif flag:
+                glEnable(cap)
+            else:
+                glDisable(cap)
+            self.caps[cap] = flag
+            self.changes += 1
+    
+    def depth_mask(self, flag):
+        if self.mask is not flag:
+            glDepthMask(flag)
+            self.mask = flag
+            self.changes += 1
+    
+    def blend(self, sfactor, dfactor):
+        if self.blendfunc != (sfactor, dfactor):
+            glBlendFunc(sfactor, dfactor)
+            self.blendfunc = (sfactor, dfactor)
+            self.changes += 1
+    
+    def color(self, rgba):
+        if self.shade is not rgba:
+            glColor4dv(rgba)
+            self.shade = rgba
+            self.changes += 1
+    
+    def invalidate_material(self):
+        """Forget the material (and color) sent to GL."""
+        self.shade = None
+    
+    def material(self, m):
+        if self.shade is not m:
+            if self.program is not None:
+                self.program.set_material(m)
+                self.shade = m
+                self.changes += 1
+                return
+            send_material(m)
+            self.shade = m
+            self.changes += 1
+
+
 class Object:
     """Object base class.
     
@@ -98,6 +350,17 @@ class Object:
         - draw_dots(self) <- MDOT
         - draw_line(self) <- MWIRE
         - draw_face(self) <- MSOLID
+        
+        If the geometry depends only on a few parameters, define `key`
+        to return them (e.g., (level,)). The draw functions are then compiled
+        into display lists once and shared by all objects of the same class
+        with the same key and frame style. Do not put continuous parameters
+        such as size in the key; draw the unit-size geometry, and return
+        the size as `scale` (applied when drawn).
+        
+        Tessellated models can define `lod` thresholds of the projected
+        radius [pixel]. The render queue sets `level` to the number of
+        thresholds below the radius, i.e., 0 for the coarsest level.
     """
     ## Mesh frame_style
     MDOT   = 0x0001
@@ -109,6 +372,48 @@ class Object:
     MSHADE = 0x0020
     MALPHA = 0x0040
     
+    ## Geometry key of the display-list cache (None: not cached)
+    key = None
+    
+    ## Bounding sphere (center, radius) used for culling
+    center = property(lambda self: self.pos)
+    radius = np.inf
+    
+    ## Level-of-detail thresholds [pixel] (None: no LOD)
+    lod = None
+    
+    ## Data is being loaded; while loading, the stream polls `ready`
+    ## and redraws when the next part of the data is ready to be drawn
+    loading = False
+    ready = False
+    
+    ## Model-view matrix [4,4] loaded instead of translating by pos
+    ## (set by SceneGraph; None: the current matrix is translated)
+    modelview = None
+    
+    ## Scale of the geometry applied by glScaled when drawn, so that
+    ## unit-size geometry is compiled once for all sizes (see `key`)
+    scale = 1
+    
+    ## Scaling of the model-view matrix {0:none, 1:uniform, 2:non-uniform}
+    ## (set by SceneGraph; the normals are rescaled or normalized)
+    scaling = 0
+    
+    ## Scale of the bounding radius in the world for culling and picking
+    ## (set by SceneGraph: the largest scale of the node)
+    extent = 1
+    
+    ## Colors are drawn per vertex under GL_COLOR_MATERIAL
+    vertex_colors = False
+    
+    ## Drawn with its own GLSL program (or none) instead of the current one;
+    ## the transparent objects are drawn in the sorted pass (not by OIT)
+    own_program = False
+    
+    ## Rows marked when pos or visible is assigned [(rows:set, row), ...]
+    ## (set by Picker to refit only the objects moved)
+    watchers = ()
+    
     def __init__(self, pos=None, shade=None, style=None, visible=True):
         if pos is None:
             pos = O
@@ -117,48 +422,94 @@ class Object:
         self.style = style or self.MWIRE | self.MSOLID | self.MSHADE
         self.visible = visible
     
-    def __call__(self):
+    pos = property(lambda self: self._pos,
+                   lambda self, v: self._set('_pos', v))
+    
+    visible = property(lambda self: self._visible,
+                       lambda self, v: self._set('_visible', v))
+    
+    def _set(self, name, value):
+        setattr(self, name, value)
+        for rows, i in self.watchers:
+            rows.add(i)
+    
+    def __call__(self, state=None):
+        """Draw the object.
+        
+        Args:
+            state : <GLState> shared by the render queue.
+                    If None, all the state is sent to GL.
+        """
         if not self.visible:
             return
         
+        local = state is None
+        if local:
+            state = GLState()
+        
         ## set palette type
         if self.style & self.MRGBA:
-            glEnable(GL_COLOR_MATERIAL)
-            glColor4dv(self.shade)
+            state.enable(GL_COLOR_MATERIAL)
+            state.color(self.shade)
         
         elif self.style & self.MSHADE:
-            glDisable(GL_COLOR_MATERIAL)
-            glMaterialfv(GL_FRONT_AND_BACK, GL_AMBIENT, self.shade.ambient)
-            glMaterialfv(GL_FRONT_AND_BACK, GL_DIFFUSE, self.shade.diffuse)
-            glMaterialfv(GL_FRONT_AND_BACK, GL_SPECULAR, self.shade.specular)
-            glMaterialf (GL_FRONT_AND_BACK, GL_SHININESS, self.shade.shininess)
+            state.enable(GL_COLOR_MATERIAL, False)
+            state.material(self.shade)
         
         ## begin blend
         if self.style & self.MALPHA:
-            glEnable(GL_BLEND)
-            glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+            state.enable(GL_BLEND)
+            state.blend(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        else:
+            state.enable(GL_BLEND, False)
         
         try:
             glPushMatrix()
-            glTranslated(*self.pos)
+            scaling = 0
+            if self.modelview is None:
+                glTranslated(*self.pos)
+            else:
+                glLoadTransposeMatrixd(self.modelview)
+                scaling = self.scaling
+            s = self.scale
+            if s != 1:
+                glScaled(s, s, s)
+                scaling = scaling or 1
+            state.enable(GL_RESCALE_NORMAL, scaling == 1)
+            state.enable(GL_NORMALIZE, scaling == 2)
             
             if self.style & self.MDOT:
-                glDepthMask(False)
-                self.draw_dots()
+                state.depth_mask(False)
+                self.render(self.MDOT, self.draw_dots)
+                state.draws += 1
             
             if self.style & self.MWIRE:
-                glDepthMask(False)
-                self.draw_line()
+                state.depth_mask(False)
+                self.render(self.MWIRE, self.draw_line)
+                state.draws += 1
             
             if self.style & self.MSOLID:
-                glDepthMask(True)
-                self.draw_face()
+                state.depth_mask(True)
+                self.render(self.MSOLID, self.draw_face)
+                state.draws += 1
         finally:
             glPopMatrix()
         
+        ## The colors drawn under GL_COLOR_MATERIAL overwrite the material.
+        if state.program is None and (self.vertex_colors or state.caps.get(GL_COLOR_MATERIAL)):
+            state.invalidate_material()
+        
         ## end blend
-        if self.style & self.MALPHA:
-            glDisable(GL_BLEND)
+        if local:
+            state.enable(GL_BLEND, False)
+    
+    def render(self, mode, draw):
+        """Draw geometry of the frame mode via the geometry cache."""
+        key = self.key
+        if key is None:
+            draw()
+        else:
+            geometry_cache((self.__class__, mode) + key, draw)
     
     def draw_dots(self):
         pass
@@ -169,33 +520,830 @@ class Object:
     def draw_face(self):
         pass
 
+
+class ObjectList(list):
+    """List of objects counting its changes.
+    
+    The streams keep the objects in this list, so that the list drawn
+    in the last frame is found unchanged by its identity and version.
+    """
+    version = 0
+
+
+def _counted(method):
+    def f(self, *args, **kwargs):
+        self.version += 1
+        return method(self, *args, **kwargs)
+    f.__name__ = method.__name__
+    return f
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort', 'reverse',
+              '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(ObjectList, _name, _counted(getattr(list, _name)))
+del _name
+
 ## --------------------------------
 ## Standard glut models
 ## --------------------------------
 
+def glut_ready():
+    """True if GLUT is initialized.
+    GLUT is not initialized in offscreen streams; the models are drawn
+    from NumPy meshes instead.
+    """
+    try:
+        return bool(glutGet(GLUT_INIT_STATE))
+    except Exception:
+        return False
+
+
+def draw_mesh(vertices, normals, faces):
+    """Draw triangles from client-side arrays."""
+    glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+    glEnableClientState(GL_VERTEX_ARRAY)
+    glEnableClientState(GL_NORMAL_ARRAY)
+    glVertexPointer(3, GL_FLOAT, 0, vertices)
+    glNormalPointer(GL_FLOAT, 0, normals)
+    glDrawElements(GL_TRIANGLES, faces.size, GL_UNSIGNED_INT, faces)
+    glPopClientAttrib()
+
+
 class Sphere(Object):
+    key = property(lambda self: (self.level,))
+    scale = property(lambda self: self.size)
+    radius = property(lambda self: self.size)
+    
+    ## (slices, stacks) of each level and the thresholds [pixel]
+    levels = ((8, 4), (12, 6), (18, 9), (36, 18))
+    lod = (4, 12, 32)
+    
     def __init__(self, size=1, **kwargs):
         super().__init__(**kwargs)
         self.size = size
+        self.level = len(self.levels) - 1
     
     def draw_line(self):
-        glutWireSphere(self.size, 36, 18)
+        if glut_ready():
+            glutWireSphere(1, *self.levels[self.level])
+        else:
+            glPushAttrib(GL_POLYGON_BIT)
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+            draw_mesh(*sphere_mesh(1, *self.levels[self.level]))
+            glPopAttrib()
     
     def draw_face(self):
-        glutSolidSphere(self.size, 36, 18)
+        if glut_ready():
+            glutSolidSphere(1, *self.levels[self.level])
+        else:
+            draw_mesh(*sphere_mesh(1, *self.levels[self.level]))
+
+
+## Bezier patches of the teapot (as glutSolidTeapot); the rim, body,
+## lid and bottom are quarters mirrored in x and y; the handle and spout
+## are halves mirrored in y.
+teapot_patches = np.array([
+    [102, 103, 104, 105,   4,   5,   6,   7,   8,   9,  10,  11,  12,  13,  14,  15], # rim
+    [ 12,  13,  14,  15,  16,  17,  18,  19,  20,  21,  22,  23,  24,  25,  26,  27], # body
+    [ 24,  25,  26,  27,  29,  30,  31,  32,  33,  34,  35,  36,  37,  38,  39,  40],
+    [ 96,  96,  96,  96,  97,  98,  99, 100, 101, 101, 101, 101,   0,   1,   2,   3], # lid
+    [  0,   1,   2,   3, 106, 107, 108, 109, 110, 111, 112, 113, 114, 115, 116, 117],
+    [118, 118, 118, 118, 124, 122, 119, 121, 123, 126, 125, 120,  40,  39,  38,  37], # bottom
+    [ 41,  42,  43,  44,  45,  46,  47,  48,  49,  50,  51,  52,  53,  54,  55,  56], # handle
+    [ 53,  54,  55,  56,  57,  58,  59,  60,  61,  62,  63,  64,  28,  65,  66,  67],
+    [ 68,  69,  70,  71,  72,  73,  74,  75,  76,  77,  78,  79,  80,  81,  82,  83], # spout
+    [ 80,  81,  82,  83,  84,  85,  86,  87,  88,  89,  90,  91,  92,  93,  94,  95],
+])
+teapot_points = np.array([
+    (0.2, 0, 2.7), (0.2, -0.112, 2.7), (0.112, -0.2, 2.7), (0, -0.2, 2.7),
+    (1.3375, 0, 2.53125), (1.3375, -0.749, 2.53125), (0.749, -1.3375, 2.53125), (0, -1.3375, 2.53125),
+    (1.4375, 0, 2.53125), (1.4375, -0.805, 2.53125), (0.805, -1.4375, 2.53125), (0, -1.4375, 2.53125),
+    (1.5, 0, 2.4), (1.5, -0.84, 2.4), (0.84, -1.5, 2.4), (0, -1.5, 2.4),
+    (1.75, 0, 1.875), (1.75, -0.98, 1.875), (0.98, -1.75, 1.875), (0, -1.75, 1.875),
+    (2, 0, 1.35), (2, -1.12, 1.35), (1.12, -2, 1.35), (0, -2, 1.35),
+    (2, 0, 0.9), (2, -1.12, 0.9), (1.12, -2, 0.9), (0, -2, 0.9), (-2, 0, 0.9),
+    (2, 0, 0.45), (2, -1.12, 0.45), (1.12, -2, 0.45), (0, -2, 0.45),
+    (1.5, 0, 0.225), (1.5, -0.84, 0.225), (0.84, -1.5, 0.225), (0, -1.5, 0.225),
+    (1.5, 0, 0.15), (1.5, -0.84, 0.15), (0.84, -1.5, 0.15), (0, -1.5, 0.15),
+    (-1.6, 0, 2.025), (-1.6, -0.3, 2.025), (-1.5, -0.3, 2.25), (-1.5, 0, 2.25),
+    (-2.3, 0, 2.025), (-2.3, -0.3, 2.025), (-2.5, -0.3, 2.25), (-2.5, 0, 2.25),
+    (-2.7, 0, 2.025), (-2.7, -0.3, 2.025), (-3, -0.3, 2.25), (-3, 0, 2.25),
+    (-2.7, 0, 1.8), (-2.7, -0.3, 1.8), (-3, -0.3, 1.8), (-3, 0, 1.8),
+    (-2.7, 0, 1.575), (-2.7, -0.3, 1.575), (-3, -0.3, 1.35), (-3, 0, 1.35),
+    (-2.5, 0, 1.125), (-2.5, -0.3, 1.125), (-2.65, -0.3, 0.9375), (-2.65, 0, 0.9375),
+    (-2, -0.3, 0.9), (-1.9, -0.3, 0.6), (-1.9, 0, 0.6),
+    (1.7, 0, 1.425), (1.7, -0.66, 1.425), (1.7, -0.66, 0.6), (1.7, 0, 0.6),
+    (2.6, 0, 1.425), (2.6, -0.66, 1.425), (3.1, -0.66, 0.825), (3.1, 0, 0.825),
+    (2.3, 0, 2.1), (2.3, -0.25, 2.1), (2.4, -0.25, 2.025), (2.4, 0, 2.025),
+    (2.7, 0, 2.4), (2.7, -0.25, 2.4), (3.3, -0.25, 2.4), (3.3, 0, 2.4),
+    (2.8, 0, 2.475), (2.8, -0.25, 2.475), (3.525, -0.25, 2.49375), (3.525, 0, 2.49375),
+    (2.9, 0, 2.475), (2.9, -0.15, 2.475), (3.45, -0.15, 2.5125), (3.45, 0, 2.5125),
+    (2.8, 0, 2.4), (2.8, -0.15, 2.4), (3.2, -0.15, 2.4), (3.2, 0, 2.4),
+    (0, 0, 3.15), (0.8, 0, 3.15), (0.8, -0.45, 3.15), (0.45, -0.8, 3.15), (0, -0.8, 3.15),
+    (0, 0, 2.85),
+    (1.4, 0, 2.4), (1.4, -0.784, 2.4), (0.784, -1.4, 2.4), (0, -1.4, 2.4),
+    (0.4, 0, 2.55), (0.4, -0.224, 2.55), (0.224, -0.4, 2.55), (0, -0.4, 2.55),
+    (1.3, 0, 2.55), (1.3, -0.728, 2.55), (0.728, -1.3, 2.55), (0, -1.3, 2.55),
+    (1.3, 0, 2.4), (1.3, -0.728, 2.4), (0.728, -1.3, 2.4), (0, -1.3, 2.4),
+    (0, 0, 0), (1.425, -0.798, 0), (1.5, 0, 0.075), (1.425, 0, 0),
+    (0.798, -1.425, 0), (0, -1.5, 0.075), (0, -1.425, 0), (1.5, -0.84, 0.075),
+    (0.84, -1.5, 0.075),
+])
+
+
+def bezier_basis(t):
+    """Cubic Bernstein polynomials [n,4] at t [n] and their derivatives."""
+    s = 1 - t
+    return (np.stack([s**3, 3*t*s**2, 3*t**2*s, t**3], axis=-1),
+            np.stack([-3*s**2, 3*s**2 - 6*t*s, 6*t*s - 3*t**2, 3*t**2], axis=-1))
+
+
+def teapot_mesh(size=1, grid=10):
+    """Make (vertices, normals, faces) of the teapot of glutSolidTeapot."""
+    P = teapot_points[teapot_patches].reshape(-1, 4, 4, 3)
+    ## mirrored copies with the columns reversed to keep the winding
+    P = np.concatenate([P, P[:,:,::-1] * (1, -1, 1),
+                        P[:6,:,::-1] * (-1, 1, 1), P[:6] * (-1, -1, 1)])
+    t = np.linspace(0, 1, grid + 1)
+    B, _ = bezier_basis(t)
+    Bc, Dc = bezier_basis(np.clip(t, 1e-3, 1 - 1e-3)) # not to degenerate at the poles
+    v = np.einsum('ui,pijc,vj->puvc', B, P, B).reshape(-1, 3)
+    du = np.einsum('ui,pijc,vj->puvc', Dc, P, Bc)
+    dv = np.einsum('ui,pijc,vj->puvc', Bc, P, Dc)
+    n = np.cross(dv, du).reshape(-1, 3) # outward
+    n /= np.maximum(np.linalg.norm(n, axis=1), 1e-12)[:,None]
+    
+    ## glutSolidTeapot: rotate 270 deg about x, scale by size/2, and translate by -1.5 in z
+    v = (v - (0, 0, 1.5)) * (size / 2)
+    v = v[:,[0, 2, 1]] * (1, 1, -1)
+    n = n[:,[0, 2, 1]] * (1, 1, -1)
+    
+    m = grid + 1
+    i = (np.arange(grid)[:,None] * m + np.arange(grid)).ravel()
+    i = (np.arange(len(P))[:,None] * m * m + i).ravel()
+    faces = np.concatenate([np.stack([i, i+1, i+m+1], axis=-1),
+                            np.stack([i, i+m+1, i+m], axis=-1)])
+    return (v.astype(np.float32),
+            n.astype(np.float32),
+            faces.astype(np.uint32))
 
 
 class Teapot(Object):
+    key = ()
+    scale = property(lambda self: self.size)
+    radius = property(lambda self: 2 * self.size)
+    
     def __init__(self, size=1, **kwargs):
         super().__init__(**kwargs)
         self.size = size
     
     def draw_line(self):
-        glFrontFace(GL_CW)
-        glutWireTeapot(self.size)
-        glFrontFace(GL_CCW)
+        if glut_ready():
+            glFrontFace(GL_CW)
+            glutWireTeapot(1)
+            glFrontFace(GL_CCW)
+        else:
+            glPushAttrib(GL_POLYGON_BIT)
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+            draw_mesh(*teapot_mesh())
+            glPopAttrib()
+    
+    def draw_face(self):
+        if glut_ready():
+            glFrontFace(GL_CW)
+            glutSolidTeapot(1)
+            glFrontFace(GL_CCW)
+        else:
+            draw_mesh(*teapot_mesh())
+
+
+## --------------------------------
+## Buffered models
+## --------------------------------
+
+def sphere_mesh(radius=1, slices=36, stacks=18):
+    """Make (vertices, normals, faces) of a UV sphere."""
+    t = np.linspace(0, pi, stacks + 1)
+    p = np.linspace(0, 2*pi, slices + 1)
+    t, p = np.meshgrid(t, p, indexing='ij')
+    n = np.stack([np.sin(t) * np.cos(p),
+                  np.sin(t) * np.sin(p),
+                  np.cos(t)], axis=-1).reshape(-1, 3)
+    i = (np.arange(stacks)[:,None] * (slices + 1) + np.arange(slices)).ravel()
+    j = i + slices + 1
+    faces = np.concatenate([np.stack([i, j, j+1], axis=-1),
+                            np.stack([i, j+1, i+1], axis=-1)])
+    return ((n * radius).astype(np.float32),
+            n.astype(np.float32),
+            faces.astype(np.uint32))
+
+
+class BufferObject(Object):
+    """Object base class drawn from buffers.
+    
+    Attributes:
+        buffers : dict of named <Buffer>
+    """
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.buffers = {}
+        self._radius = None
+    
+    def update(self, slice=None, **kwargs):
+        """Update buffers partially.
+        
+        >>> obj.update(vertices=v, slice=slice(100, 200))
+        
+        If the value is None, the rows are marked as modified in place.
+        """
+        for k, v in kwargs.items():
+            self.buffers[k].modify(v, slice)
+        if 'vertices' in kwargs:
+            self._radius = None
+    
+    def release(self):
+        """Delete the buffer objects (GL context required)."""
+        for buf in self.buffers.values():
+            buf.release()
+
+
+class MeshObject(BufferObject):
+    """Triangle mesh object drawn from vertex/index buffers.
+    
+    Args:
+        vertices : (N,3) vertex positions
+        normals  : (N,3) vertex normals
+        faces    : (M,3) vertex indices of triangles
+        colors   : (N,3) or (N,4) vertex colors (optional)
+    
+    Note:
+        Float32 (uint32 for faces) contiguous arrays are not copied;
+        the buffers refer to the given arrays.
+    """
+    vertices = property(lambda self: self.buffers['vertices'].data)
+    normals = property(lambda self: self.buffers['normals'].data)
+    faces = property(lambda self: self.buffers['faces'].data)
+    vertex_colors = property(lambda self: 'colors' in self.buffers)
+    
+    @property
+    def radius(self):
+        if self._radius is None:
+            v = self.vertices
+            self._radius = np.sqrt((v * v).sum(1).max()) if len(v) else 0
+        return self._radius
+    
+    def __init__(self, vertices, normals, faces, colors=None, **kwargs):
+        super().__init__(**kwargs)
+        self.buffers.update({
+            'vertices' : Buffer(vertices),
+            'normals'  : Buffer(normals),
+            'faces'    : Buffer(faces, np.uint32, GL_ELEMENT_ARRAY_BUFFER),
+        })
+        if colors is not None:
+            self.buffers['colors'] = Buffer(colors)
+    
+    def set_data(self, vertices, normals, faces):
+        """Replace the mesh (the buffers are reallocated if the sizes change)."""
+        b = self.buffers
+        b['vertices'].set(vertices)
+        b['normals'].set(normals)
+        b['faces'].set(faces)
+        self._radius = None
+    
+    def bind(self):
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glPushAttrib(GL_ENABLE_BIT | GL_POLYGON_BIT)
+        b = self.buffers
+        b['vertices'].bind()
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        b['normals'].bind()
+        glEnableClientState(GL_NORMAL_ARRAY)
+        glNormalPointer(GL_FLOAT, 0, None)
+        if 'colors' in b:
+            b['colors'].bind()
+            glEnableClientState(GL_COLOR_ARRAY)
+            glColorPointer(b['colors'].data.shape[1], GL_FLOAT, 0, None)
+            glColorMaterial(GL_FRONT_AND_BACK, GL_AMBIENT_AND_DIFFUSE)
+            glEnable(GL_COLOR_MATERIAL)
+            prog = Program.current
+            if isinstance(prog, PhongProgram):
+                self._color_material = prog.color_material
+                prog.color_material = True
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+    
+    def unbind(self):
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        if 'colors' in self.buffers:
+            prog = Program.current
+            if isinstance(prog, PhongProgram):
+                prog.color_material = self._color_material
+        glPopAttrib()
+        glPopClientAttrib()
+    
+    def draw_elements(self):
+        faces = self.buffers['faces']
+        faces.bind()
+        glDrawElements(GL_TRIANGLES, faces.data.size, GL_UNSIGNED_INT, None)
+    
+    def draw_dots(self):
+        self.bind()
+        try:
+            glDrawArrays(GL_POINTS, 0, len(self.buffers['vertices']))
+        finally:
+            self.unbind()
+    
+    def draw_line(self):
+        self.bind()
+        try:
+            glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+            self.draw_elements()
+        finally:
+            self.unbind()
     
     def draw_face(self):
-        glFrontFace(GL_CW)
-        glutSolidTeapot(self.size)
-        glFrontFace(GL_CCW)
+        self.bind()
+        try:
+            self.draw_elements()
+        finally:
+            self.unbind()
+
+
+class InstanceBatch(BufferObject):
+    """Instances of a prototype mesh drawn in one instanced call.
+    
+    Args:
+        prototype : <MeshObject> to be instanced
+        positions : (N,3) instance positions
+        sizes     : (N,) instance scales (optional)
+        colors    : (N,3) or (N,4) instance colors (optional)
+    
+    Note:
+        The positions can be modified in place every frame, e.g.,
+        
+        >>> batch.positions[:] = new_positions
+        >>> batch.update(positions=None)
+    """
+    own_program = True
+    
+    positions = property(lambda self: self.buffers['positions'].data)
+    sizes = property(lambda self: self.buffers['sizes'].data)
+    colors = property(lambda self: self.buffers['colors'].data)
+    
+    def __init__(self, prototype, positions, sizes=None, colors=None, **kwargs):
+        super().__init__(**kwargs)
+        self.prototype = prototype
+        self.buffers['positions'] = Buffer(positions, usage=GL_DYNAMIC_DRAW)
+        if sizes is not None:
+            self.buffers['sizes'] = Buffer(sizes, usage=GL_DYNAMIC_DRAW)
+        if colors is not None:
+            self.buffers['colors'] = Buffer(colors, usage=GL_DYNAMIC_DRAW)
+    
+    def __len__(self):
+        return len(self.buffers['positions'])
+    
+    @property
+    def radius(self):
+        p = self.positions
+        if not len(p):
+            return 0
+        r = self.prototype.radius
+        if 'sizes' in self.buffers:
+            r = r * self.sizes
+        return np.max(np.sqrt((p * p).sum(1)) + r)
+    
+    def draw_instances(self, mode):
+        current = Program.current
+        prog = instance_program
+        prog.use()
+        attribs = []
+        try:
+            if 'colors' in self.buffers:
+                glUniform1i(prog.uniform('color_mode'), 1)
+            elif self.style & self.MRGBA:
+                glUniform1i(prog.uniform('color_mode'), 2)
+            else:
+                glUniform1i(prog.uniform('color_mode'), 0)
+                if current is not None:
+                    send_material(self.shade) # not sent by the state
+            
+            for name, attr in (('positions', 'offset'),
+                               ('sizes', 'scale'),
+                               ('colors', 'color')):
+                loc = prog.attribute(attr)
+                buf = self.buffers.get(name)
+                if buf is None:
+                    if attr == 'scale':
+                        glVertexAttrib1f(loc, 1.0)
+                    continue
+                buf.bind()
+                glEnableVertexAttribArray(loc)
+                size = buf.data.shape[1] if buf.data.ndim > 1 else 1
+                glVertexAttribPointer(loc, size, GL_FLOAT, GL_FALSE, 0, None)
+                glVertexAttribDivisor(loc, 1)
+                attribs.append(loc)
+            glBindBuffer(GL_ARRAY_BUFFER, 0) # not restored by glPopClientAttrib
+            
+            proto = self.prototype
+            proto.bind()
+            try:
+                n = len(self)
+                if mode == self.MDOT:
+                    glDrawArraysInstanced(GL_POINTS, 0, len(proto.vertices), n)
+                else:
+                    if mode == self.MWIRE:
+                        glPolygonMode(GL_FRONT_AND_BACK, GL_LINE)
+                    faces = proto.buffers['faces']
+                    faces.bind()
+                    glDrawElementsInstanced(GL_TRIANGLES, faces.data.size,
+                                            GL_UNSIGNED_INT, None, n)
+            finally:
+                proto.unbind()
+        finally:
+            ## The attribute buffer left bound breaks client-array drawing
+            ## that follows (e.g. Sphere without GLUT).
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            for loc in attribs:
+                glVertexAttribDivisor(loc, 0)
+                glDisableVertexAttribArray(loc)
+            use_program(current)
+    
+    def draw_dots(self):
+        self.draw_instances(self.MDOT)
+    
+    def draw_line(self):
+        self.draw_instances(self.MWIRE)
+    
+    def draw_face(self):
+        self.draw_instances(self.MSOLID)
+
+
+class InstancedSpheres(InstanceBatch):
+    """Spheres drawn in one instanced call.
+    
+    Args:
+        positions : (N,3) sphere centers
+        sizes     : (N,) sphere radii (optional)
+        colors    : (N,3) or (N,4) sphere colors (optional)
+        size      : radius of the prototype sphere
+    """
+    def __init__(self, positions, sizes=None, colors=None,
+                       size=1, slices=36, stacks=18, **kwargs):
+        proto = MeshObject(*sphere_mesh(size, slices, stacks))
+        super().__init__(proto, positions, sizes, colors, **kwargs)
+
+
+## --------------------------------
+## Point clouds
+## --------------------------------
+
+def bit_reversed(n):
+    """Permutation of range(n) in bit-reversed order (coarse to fine)."""
+    bits = max(1, (n - 1).bit_length())
+    i = np.arange(1 << bits)
+    r = np.zeros_like(i)
+    for b in range(bits):
+        r |= ((i >> b) & 1) << (bits - 1 - b)
+    return r[r < n]
+
+
+class PointCloud(Object):
+    """Point cloud drawn in MDOT style.
+    
+    The points are uploaded in chunks from a loader thread, so that
+    arrays on disk (np.memmap) are not loaded into memory at once.
+    A chunk gathers blocks of rows spread over the array in bit-reversed
+    order; the first chunk is a coarse subsample of the whole cloud,
+    and the density fills in as the next chunks are uploaded.
+    
+    Args:
+        points     : (N,3) array or np.memmap
+        colors     : (N,3) or (N,4) colors, float or uint8 (optional)
+        sizes      : (N,) point sizes [pixel] (optional)
+        size       : point size [pixel] if sizes is None
+        chunk      : number of points in a chunk
+        block      : number of contiguous rows read at once
+        budget     : maximum bytes uploaded per frame
+        max_points : maximum number of points uploaded (None: all)
+    
+    Note:
+        The chunks are kept in separate buffer objects (one draw call each).
+        Without colors, the points have the color of the shade.
+    """
+    own_program = True
+    
+    def __init__(self, points, colors=None, sizes=None, size=1,
+                 chunk=1<<20, block=4096, budget=64<<20, max_points=None,
+                 **kwargs):
+        kwargs.setdefault('style', self.MDOT)
+        super().__init__(**kwargs)
+        self.points = points
+        self.colors = colors
+        self.sizes = sizes
+        self.size = size
+        self.budget = budget
+        self.block = block
+        
+        n = len(points)
+        nblk = -(-n // block)
+        m = max(1, chunk // block) # blocks in a chunk
+        order = bit_reversed(nblk)
+        if max_points is not None:
+            order = order[:max(1, -(-max_points // block))]
+        self._chunks = [np.sort(order[i:i+m]) for i in range(0, len(order), m)]
+        self._uploaded = [] # [(n, buffers:dict), ...]
+        self._thread = None
+        self._rmax = 0
+        self.error = None
+    
+    def __len__(self):
+        """Number of points uploaded."""
+        return sum(n for n, b in self._uploaded)
+    
+    @property
+    def loading(self):
+        return self.error is None and len(self._uploaded) < len(self._chunks)
+    
+    @property
+    def ready(self):
+        return self._thread is not None and not self._queue.empty()
+    
+    @property
+    def radius(self):
+        if self.loading:
+            return np.inf # not to be culled before it is loaded
+        return self._rmax
+    
+    def _start(self):
+        self._queue = queue.Queue(maxsize=4)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._load, daemon=True)
+        self._thread.start()
+    
+    def _load(self):
+        try:
+            self._read_chunks()
+        except Exception as e:
+            self.error = e
+    
+    def _read_chunks(self):
+        B = self.block
+        for blocks in self._chunks[len(self._uploaded):]:
+            def read(a):
+                return np.concatenate([a[b*B:(b+1)*B] for b in blocks])
+            data = {'points': np.ascontiguousarray(read(self.points), np.float32)}
+            if self.colors is not None:
+                c = read(self.colors)
+                data['colors'] = np.ascontiguousarray(c, np.uint8 if c.dtype == np.uint8 else np.float32)
+            if self.sizes is not None:
+                data['sizes'] = np.ascontiguousarray(read(self.sizes), np.float32)
+            while not self._stop.is_set():
+                try:
+                    self._queue.put(data, timeout=0.1)
+                    break
+                except queue.Full:
+                    pass
+            else:
+                return
+    
+    def upload(self):
+        """Upload the chunks loaded within the budget [bytes]."""
+        if self._thread is None:
+            self._start()
+        nbytes = 0
+        while self.loading and nbytes < self.budget:
+            try:
+                ## Wait for the first chunk to draw something.
+                data = self._queue.get(timeout=0.1) if not self._uploaded else self._queue.get_nowait()
+            except queue.Empty:
+                if self._uploaded or not self._thread.is_alive():
+                    break
+                continue
+            buffers = {}
+            for k, v in data.items():
+                buffers[k] = vbo = glGenBuffers(1)
+                glBindBuffer(GL_ARRAY_BUFFER, vbo)
+                glBufferData(GL_ARRAY_BUFFER, v.nbytes, v, GL_STATIC_DRAW)
+                nbytes += v.nbytes
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            p = data['points']
+            self._rmax = max(self._rmax, np.sqrt((p * p).sum(1).max()))
+            self._uploaded.append((len(p), buffers))
+    
+    def release(self):
+        """Stop loading and delete the buffer objects (GL context required).
+        The points are loaded again when drawn next time.
+        """
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._thread = None
+        for n, buffers in self._uploaded:
+            glDeleteBuffers(len(buffers), list(buffers.values()))
+        self._uploaded = []
+        self._rmax = 0
+    
+    def draw_dots(self):
+        if self.loading:
+            self.upload()
+        
+        current = Program.current
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT | GL_POINT_BIT | GL_DEPTH_BUFFER_BIT)
+        glDisable(GL_LIGHTING)
+        glDepthMask(GL_TRUE) # points occlude each other
+        if self.colors is None:
+            m = self.shade
+            glColor4fv(m.diffuse if isinstance(m, Material) else m)
+        else:
+            glEnableClientState(GL_COLOR_ARRAY)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        if self.sizes is not None:
+            prog = point_program
+            prog.use()
+            loc = prog.attribute('size')
+            glEnableVertexAttribArray(loc)
+            glEnable(GL_PROGRAM_POINT_SIZE)
+        else:
+            use_program(None) # unlit
+            glPointSize(self.size)
+        try:
+            for n, b in self._uploaded:
+                glBindBuffer(GL_ARRAY_BUFFER, b['points'])
+                glVertexPointer(3, GL_FLOAT, 0, None)
+                if 'colors' in b:
+                    glBindBuffer(GL_ARRAY_BUFFER, b['colors'])
+                    c = self.colors
+                    glColorPointer(c.shape[1], GL_UNSIGNED_BYTE if c.dtype == np.uint8 else GL_FLOAT, 0, None)
+                if 'sizes' in b:
+                    glBindBuffer(GL_ARRAY_BUFFER, b['sizes'])
+                    glVertexAttribPointer(loc, 1, GL_FLOAT, GL_FALSE, 0, None)
+                glDrawArrays(GL_POINTS, 0, n)
+        finally:
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            if self.sizes is not None:
+                glDisableVertexAttribArray(loc)
+            use_program(current)
+            glPopAttrib()
+            glPopClientAttrib()
+
+
+## --------------------------------
+## Streaming lines
+## --------------------------------
+
+class StreamingPolyline(Object):
+    """Polylines of live samples in a fixed-capacity ring buffer.
+    
+    The last `capacity` samples of each trace are drawn as a line strip.
+    Appended samples are written to the host ring and only the written rows
+    are sent with glBufferSubData on the next draw. The row `capacity` of
+    each trace mirrors the row 0, so the strip wrapping around the end is
+    drawn as two segments, and all traces in one glMultiDrawArrays call.
+    
+    Args:
+        capacity : number of samples kept in each trace
+        traces   : number of traces
+        colors   : (traces,3) or (traces,4) colors of the traces (optional)
+    
+    Note:
+        append can be called from another thread (e.g., data acquisition).
+    
+    >>> trail = StreamingPolyline(10000, traces=4)
+    >>> trail.append(samples, trace=0)
+    """
+    own_program = True
+    
+    def __init__(self, capacity, traces=1, colors=None, **kwargs):
+        kwargs.setdefault('style', self.MWIRE)
+        super().__init__(**kwargs)
+        self.capacity = capacity
+        self.traces = traces
+        n = capacity + 1
+        self.buffers = {
+            'vertices' : Buffer(np.zeros((traces * n, 3)), usage=GL_STREAM_DRAW),
+        }
+        if colors is not None:
+            c = np.asarray(colors, dtype=np.float32)
+            self.buffers['colors'] = Buffer(np.repeat(c, n, axis=0))
+        self.head = np.zeros(traces, int) # next row to write
+        self.count = np.zeros(traces, int) # number of samples
+        self._pending = [] # rows [start, stop) to be sent
+        self._lock = threading.Lock()
+    
+    def __len__(self):
+        return int(self.count.sum())
+    
+    def clear(self, trace=None):
+        with self._lock:
+            if trace is None:
+                self.head[:] = 0
+                self.count[:] = 0
+            else:
+                self.head[trace] = 0
+                self.count[trace] = 0
+    
+    def append(self, points, trace=0):
+        """Append samples (k,3) to the trace; O(k)."""
+        p = np.asarray(points, dtype=np.float32).reshape(-1, 3)
+        cap = self.capacity
+        if len(p) > cap:
+            p = p[-cap:]
+        k = len(p)
+        if not k:
+            return
+        data = self.buffers['vertices'].data
+        base = trace * (cap + 1)
+        with self._lock:
+            h = self.head[trace]
+            a = min(k, cap - h) # rows before the end
+            self._write(data, base + h, p[:a])
+            if a < k:
+                self._write(data, base, p[a:])
+            if h == 0 or a < k:
+                data[base + cap] = data[base] # mirror of the row 0
+                self._mark(base + cap, base + cap + 1)
+            self.head[trace] = (h + k) % cap
+            self.count[trace] = min(self.count[trace] + k, cap)
+    
+    def _write(self, data, start, rows):
+        data[start:start + len(rows)] = rows
+        self._mark(start, start + len(rows))
+    
+    def _mark(self, start, stop):
+        if self._pending and self._pending[-1][1] == start:
+            self._pending[-1] = (self._pending[-1][0], stop) # contiguous
+        else:
+            self._pending.append((start, stop))
+    
+    def segments(self):
+        """First rows and counts of the strip segments of all traces."""
+        cap = self.capacity
+        first = []
+        count = []
+        for t in range(self.traces):
+            n = self.count[t]
+            if n < 2:
+                continue
+            base = t * (cap + 1)
+            end = self.head[t] or cap # the last row written + 1
+            start = end - n
+            if start >= 0:
+                first.append(base + start)
+                count.append(n)
+            else:
+                first.append(base + start + cap) # to the mirror row
+                count.append(1 - start)
+                if end > 1:
+                    first.append(base)
+                    count.append(end)
+        return np.array(first, np.int32), np.array(count, np.int32)
+    
+    def upload(self):
+        buf = self.buffers['vertices']
+        with self._lock:
+            pending, self._pending = self._pending, []
+            if buf.id is None or not pending:
+                buf.bind()
+                return
+            glBindBuffer(buf.target, buf.id)
+            data = buf.data
+            n = data.strides[0]
+            for a, b in pending:
+                glBufferSubData(buf.target, a * n, (b - a) * n, data[a:b])
+    
+    def draw_polyline(self, mode):
+        self.upload()
+        with self._lock:
+            first, count = self.segments()
+        if not len(first):
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            return
+        current = Program.current
+        use_program(None) # unlit
+        glPushClientAttrib(GL_CLIENT_VERTEX_ARRAY_BIT)
+        glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT)
+        glDisable(GL_LIGHTING)
+        glEnableClientState(GL_VERTEX_ARRAY)
+        glVertexPointer(3, GL_FLOAT, 0, None)
+        if 'colors' in self.buffers:
+            c = self.buffers['colors']
+            c.bind()
+            glEnableClientState(GL_COLOR_ARRAY)
+            glColorPointer(c.data.shape[1], GL_FLOAT, 0, None)
+        else:
+            m = self.shade
+            glColor4fv(m.diffuse if isinstance(m, Material) else m)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        try:
+            glMultiDrawArrays(mode, first, count, len(first))
+        finally:
+            glPopAttrib()
+            glPopClientAttrib()
+            use_program(current)
+    
+    def draw_dots(self):
+        self.draw_polyline(GL_POINTS)
+    
+    def draw_line(self):
+        self.draw_polyline(GL_LINE_STRIP)
@@ -0,0 +1,348 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+
+from .globject import Object
+from .glscene import SceneGraph
+
+
+def morton_codes(points, bits=10):
+    """Morton codes of points [N,3] in their bounding box."""
+    lo = points.min(0)
+    span = points.max(0) - lo
+    span[span == 0] = 1
+    q = ((points - lo) / span * ((1 << bits) - 1)).astype(np.uint64)
+    code = np.zeros(len(points), np.uint64)
+    for b in range(bits):
+        for k in range(3):
+            code |= ((q[:,k] >> np.uint64(b)) & np.uint64(1)) << np.uint64(3 * b + 2 - k)
+    return code
+
+
+class BVH:
+    """Bounding volume hierarchy of spheres.
+    
+    The spheres are sorted in Morton order and grouped into leaves,
+    and the nodes form a complete binary tree stored in flat arrays
+    (node i has the children 2i+1 and 2i+2). The tree is built and
+    refit level by level, and traversed with all nodes of a level at once.
+    Spheres of negative radius (e.g. hidden objects) are not hit.
+    
+    Attributes:
+        leaf_size : number of spheres in a leaf
+        order     : sphere indices of the leaves (-1: empty)
+        lo, hi    : bounding boxes of the nodes [M,3]
+        depth     : number of levels below the root
+    """
+    def __init__(self, centers, radii, leaf_size=8):
+        self.leaf_size = leaf_size
+        self.build(centers, radii)
+    
+    def __len__(self):
+        return len(self.centers)
+    
+    def build(self, centers, radii):
+        """Sort the spheres and build the tree."""
+        centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        n = len(centers)
+        nleaf = max(1, -(-n // self.leaf_size))
+        self.depth = (nleaf - 1).bit_length()
+        nleaf = 1 << self.depth
+        order = np.full(nleaf * self.leaf_size, -1)
+        if n:
+            order[:n] = np.argsort(morton_codes(centers), kind='stable')
+        self.order = order
+        self.slot = np.empty(n, int) # position of the spheres in order
+        self.slot[order[:n]] = np.arange(n)
+        self.lo = np.empty((2 * nleaf - 1, 3))
+        self.hi = np.empty((2 * nleaf - 1, 3))
+        self.refit(centers, radii)
+        self._extent = self._leaf_extent()
+    
+    def refit(self, centers=None, radii=None, moved=None):
+        """Update the boxes of the nodes for the moved spheres.
+        
+        Args:
+            centers : centers [N,3] (None: the arrays modified in place)
+            radii   : radii [N] (None: the arrays modified in place)
+            moved   : indices of the moved spheres (None: all);
+                      only their leaves and ancestors are updated
+        """
+        if centers is not None:
+            self.centers = np.asarray(centers, dtype=float).reshape(-1, 3)
+        if radii is not None:
+            self.radii = np.broadcast_to(np.asarray(radii, dtype=float), len(self.centers))
+        if not len(self.centers):
+            self.lo[:] = np.inf
+            self.hi[:] = -np.inf
+            return
+        k = self.leaf_size
+        m = (1 << self.depth) - 1 # first leaf node
+        if moved is None:
+            leaves = np.arange(m + 1)
+        else:
+            leaves = np.unique(self.slot[moved] // k)
+            if not leaves.size:
+                return
+        idx = self.order.reshape(-1, k)[leaves] # [L,k]
+        c = self.centers[idx]
+        r = self.radii[idx]
+        valid = (idx >= 0) & (r >= 0)
+        self.lo[leaves + m] = np.where(valid[...,None], c - r[...,None], np.inf).min(1)
+        self.hi[leaves + m] = np.where(valid[...,None], c + r[...,None], -np.inf).max(1)
+        
+        ## the ancestors up to the root level by level
+        nodes = leaves + m
+        while nodes[0] > 0:
+            nodes = np.unique((nodes - 1) // 2)
+            a = 2 * nodes + 1
+            self.lo[nodes] = np.minimum(self.lo[a], self.lo[a+1])
+            self.hi[nodes] = np.maximum(self.hi[a], self.hi[a+1])
+    
+    def _leaf_extent(self):
+        m = (1 << self.depth) - 1
+        d = self.hi[m:] - self.lo[m:]
+        return d[np.isfinite(d).all(1)].sum()
+    
+    def degraded(self, rate=2.0):
+        """True if the leaves have grown by the rate since built."""
+        return self._leaf_extent() > rate * self._extent
+    
+    def _leaves(self, nodes):
+        """Sphere indices [K] in the leaf nodes."""
+        k = self.leaf_size
+        m = (1 << self.depth) - 1
+        idx = self.order[((nodes - m)[:,None] * k + np.arange(k)).ravel()]
+        return idx[idx >= 0]
+    
+    def _descend(self, test, step=2):
+        """Generate the nodes passing the test, skipping step-1 levels."""
+        nodes = np.zeros(1, int)
+        d = 0
+        while 1:
+            nodes = nodes[test(self.lo[nodes], self.hi[nodes])]
+            yield nodes
+            if d == self.depth or not nodes.size:
+                break
+            s = min(step, self.depth - d)
+            k = 1 << s
+            nodes = (nodes[:,None] * k + (k - 1) + np.arange(k)).ravel()
+            d += s
+    
+    @staticmethod
+    def _slab(lo, hi, o, inv):
+        t1 = (lo - o) * inv
+        t2 = (hi - o) * inv
+        tmin = np.fmax.reduce(np.fmin(t1, t2), axis=1)
+        tmax = np.fmin.reduce(np.fmax(t1, t2), axis=1)
+        return tmax >= np.maximum(tmin, 0)
+    
+    def raycast(self, origin, direction):
+        """The nearest sphere hit by the ray.
+        
+        Returns:
+            (index, t) of the sphere and the ray parameter, or (-1, inf).
+        """
+        o = np.asarray(origin, dtype=float)
+        v = np.asarray(direction, dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            inv = 1 / v
+            for nodes in self._descend(lambda lo, hi: self._slab(lo, hi, o, inv)):
+                if not nodes.size:
+                    return -1, np.inf
+        
+        idx = self._leaves(nodes)
+        p = self.centers[idx] - o
+        a = v @ v
+        b = p @ v
+        r = self.radii[idx]
+        c = (p * p).sum(1) - r ** 2
+        D = b * b - a * c
+        hit = (D >= 0) & (r >= 0)
+        s = np.sqrt(np.where(hit, D, 0))
+        t = np.where(b - s >= 0, b - s, b + s) / a # the first hit in front
+        hit &= t >= 0
+        if not hit.any():
+            return -1, np.inf
+        j = np.argmin(np.where(hit, t, np.inf))
+        return idx[j], t[j]
+    
+    def query(self, planes):
+        """Indices of the spheres whose centers are inside the planes [K,4].
+        The normals of the planes point inward.
+        """
+        n = planes[:,:3]
+        d = planes[:,3]
+        def test(lo, hi):
+            ## the farthest corner of the box along each normal
+            p = np.where(n > 0, hi[:,None], lo[:,None])
+            return ((p * n).sum(2) + d >= 0).all(1)
+        with np.errstate(invalid='ignore'): # empty boxes (inf * 0)
+            for nodes in self._descend(test):
+                if not nodes.size:
+                    return nodes
+        idx = self._leaves(nodes)
+        inside = (self.centers[idx] @ n.T + d >= 0).all(1) & (self.radii[idx] >= 0)
+        return np.sort(idx[inside])
+
+
+class Picker:
+    """Picking of objects with rays cast from the camera.
+    
+    The BVH is built over the bounding spheres (center, radius) of the
+    objects kept in arrays. On update, only the spheres of the moved
+    objects are refit, and the tree is built again when the list of
+    objects changes or the tree has degraded.
+    
+    The objects of scene graphs follow the world transforms of the graphs,
+    and other objects mark their rows moved when their pos or visible is
+    assigned (see Object.watchers), so that nothing is read per object
+    unless changed. Call moved(obj) after changing the pos in place
+    or the radius.
+    
+    The list of objects is compared by identity and version if it is
+    an <ObjectList> (the objects of the streams), or item by item otherwise.
+    
+    Note:
+        Hidden objects and objects with infinite radius
+        (the default of Object) are not picked.
+    """
+    def __init__(self, leaf_size=8):
+        self.leaf_size = leaf_size
+        self.items = []
+        self.centers = np.zeros((0, 3))
+        self.radii = np.zeros(0) # -1: not picked
+        self.bvh = None
+        self._objects = None # the list of objects the items are taken from
+        self._version = None # the version of the list (ObjectList)
+        self._graphs = []    # [(graph, objects, start), ...]
+        self._extents = []   # extent arrays of the graphs read
+        self._rows = {}      # id(obj) -> row
+        self._moved = set()  # rows marked by moved or by the objects
+    
+    def moved(self, *objects):
+        """Mark the objects moved (or resized) to be refit on the next update."""
+        for obj in objects:
+            i = self._rows.get(id(obj))
+            if i is not None:
+                self._moved.add(i)
+    
+    def _changed(self, objects):
+        if self._objects is None:
+            return True
+        version = getattr(objects, 'version', None)
+        if version is not None:
+            if objects is not self._objects or version != self._version:
+                return True
+        elif objects != self._objects:
+            return True
+        return any(g.objects is not lst for g, lst, _ in self._graphs)
+    
+    def update(self, objects):
+        """Update the spheres of the objects (before picking)."""
+        if self._changed(objects):
+            self._build(objects)
+            return
+        rows = [np.fromiter(self._moved, int, len(self._moved))]
+        self._moved.clear()
+        
+        ## Objects in the graphs moved or scaled with the nodes.
+        for k, (g, lst, a) in enumerate(self._graphs):
+            c = g.positions
+            changed = (c != self.centers[a:a+len(lst)]).any(1)
+            if g.extent is not self._extents[k]:
+                changed |= g.extent != self._extents[k]
+                self._extents[k] = g.extent
+            rows.append(np.flatnonzero(changed) + a)
+        
+        rows = np.unique(np.concatenate(rows))
+        if not rows.size:
+            return
+        self._read(rows)
+        self.bvh.refit(moved=rows)
+        if self.bvh.degraded():
+            self.bvh.build(self.centers, self.radii)
+    
+    def _read(self, rows):
+        ## Read the spheres of the objects at the rows.
+        items = self.items
+        c = np.array([items[i].center for i in rows], dtype=float).reshape(-1, 3)
+        r = np.array([items[i].radius * items[i].extent if items[i].visible else -1
+                      for i in rows], dtype=float)
+        self.centers[rows] = c
+        self.radii[rows] = np.where(np.isfinite(r), r, -1)
+    
+    def _build(self, objects):
+        items = []
+        graphs = []
+        for obj in objects:
+            if isinstance(obj, SceneGraph):
+                lst = obj.objects
+                graphs.append((obj, lst, len(items)))
+                items += lst
+            elif isinstance(obj, Object):
+                items.append(obj)
+        
+        ## Watch the objects at the new rows.
+        moved = self._moved
+        for obj in self.items:
+            obj.watchers = tuple(w for w in obj.watchers if w[0] is not moved)
+        for i, obj in enumerate(items):
+            obj.watchers += ((moved, i),)
+        
+        n = len(items)
+        self._version = getattr(objects, 'version', None)
+        self._objects = objects if self._version is not None else list(objects)
+        self._graphs = graphs
+        self._extents = [g.extent for g, lst, a in graphs]
+        self._rows = {id(obj): i for i, obj in enumerate(items)}
+        moved.clear()
+        self.items = items
+        self.centers = np.zeros((n, 3))
+        self.radii = np.zeros(n)
+        self._read(np.arange(n))
+        self.bvh = BVH(self.centers, self.radii, self.leaf_size)
+    
+    @staticmethod
+    def ray(camera, x, y):
+        """Ray (origin, direction) through the window position (x, y).
+        The position is from the top-left of the viewport.
+        """
+        h = camera.screen[1]
+        p = camera.unproject([[x, h - y], [x, h - y]], [0, 1])
+        return p[0], p[1] - p[0]
+    
+    def pick(self, camera, x, y):
+        """The nearest object at the window position (x, y), or None."""
+        if not self.items:
+            return None
+        i, t = self.bvh.raycast(*self.ray(camera, x, y))
+        return self.items[i] if i >= 0 else None
+    
+    def pick_rect(self, camera, x0, y0, x1, y1):
+        """Objects whose centers are inside the window rectangle."""
+        if not self.items:
+            return []
+        h = camera.screen[1]
+        x0, x1 = sorted((x0, x1))
+        y0, y1 = sorted((h - y0, h - y1))
+        xy = [[x0, y0], [x1, y0], [x1, y1], [x0, y1]]
+        near = camera.unproject(xy, 0)
+        far = camera.unproject(xy, 1)
+        center = (near + far).mean(0) / 2
+        planes = []
+        for i in range(4):
+            j = (i + 1) % 4
+            n = np.cross(far[i] - near[i], near[j] - near[i])
+            planes.append((n, near[i]))
+        n = np.cross(near[1] - near[0], near[3] - near[0])
+        planes.append((n, near[0]))
+        planes.append((-n, far[0]))
+        P = []
+        for n, p in planes:
+            n = n / np.linalg.norm(n)
+            if (center - p) @ n < 0:
+                n = -n
+            P.append([*n, -(n @ p)])
+        idx = self.bvh.query(np.array(P))
+        return [self.items[i] for i in idx]
@@ -0,0 +1,189 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+from OpenGL.GLUT import *
+from OpenGL.raw.GL.VERSION.GL_3_3 import glGetQueryObjectui64v
+
+import ctypes
+import time
+import numpy as np
+
+from .globject import glut_ready
+
+
+class FrameStats:
+    """Per-frame statistics of the stream.
+    
+    The records of the last `capacity` frames are kept in a ring buffer,
+    which can be read as NumPy arrays in chronological order.
+    
+    >>> view.stats = FrameStats()
+    >>> view.stats['objects'] # CPU time [s] of drawing objects
+    
+    Fields:
+        time    : start time of the frame [s]
+        view    : CPU time of camera.set_view [s]
+        objects : CPU time of drawing objects [s]
+        swap    : CPU time of swapping buffers [s]
+        frame   : CPU time of the frame [s]
+        gpu     : GPU time of the frame [s] (GL_TIME_ELAPSED; nan if n/a)
+        drawn   : number of objects drawn
+        culled  : number of objects culled
+        draws   : number of draw calls (object frame modes)
+        changes : number of GL state changes
+    
+    Attributes:
+        capacity : number of frames kept
+        overlay  : draw a summary on the screen
+        timing   : measure CPU time of each object
+        objects  : list of (object, CPU time [s]) of the last frame
+    """
+    fields = ('time', 'view', 'objects', 'swap', 'frame', 'gpu',
+              'drawn', 'culled', 'draws', 'changes')
+    
+    def __init__(self, capacity=600, overlay=False, timing=True):
+        self.capacity = capacity
+        self.overlay = overlay
+        self.timing = timing
+        self.data = np.full(capacity, np.nan, dtype=[(k, 'f8') for k in self.fields])
+        self.count = 0
+        self.objects = []
+        self._row = None
+        self._t = 0
+        self._queries = None # [(query, frame), ...] in flight
+        self._active = False
+        self._counts = (0, 0)
+    
+    def __len__(self):
+        return min(self.count, self.capacity)
+    
+    def __getitem__(self, name):
+        """Array of the field in chronological order."""
+        n = len(self)
+        i = self.count % self.capacity
+        a = self.data[name]
+        return np.concatenate([a[i:n], a[:i]]) if n == self.capacity else a[:n].copy()
+    
+    def clear(self):
+        self.data[:] = np.nan
+        self.count = 0
+        self.objects = []
+        if self._queries:
+            ## The results in flight belong to the frames cleared.
+            self._queries = [(q, None) for q, frame in self._queries]
+    
+    def summary(self, n=60):
+        """Mean values of the last n frames."""
+        def mean(a):
+            a = a[~np.isnan(a)]
+            return a.mean() if a.size else np.nan
+        res = {k: mean(self[k][-n:]) for k in self.fields[1:]}
+        t = self['time'][-n:]
+        res['fps'] = (len(t) - 1) / (t[-1] - t[0]) if len(t) > 1 and t[-1] > t[0] else np.nan
+        return res
+    
+    ## --------------------------------
+    ## Recording
+    ## --------------------------------
+    
+    def begin_frame(self, state):
+        i = self.count % self.capacity
+        self.data[i] = (np.nan,) * len(self.fields)
+        self._row = row = self.data[i] # structured scalar (view)
+        self._t = t = time.perf_counter()
+        row['time'] = t
+        self._counts = (state.draws, state.changes)
+        self.objects = []
+        self._begin_query()
+    
+    def lap(self, name):
+        """Record CPU time since the last lap in the field.
+        The laps of the same name in a frame are summed (e.g. viewports).
+        """
+        t = time.perf_counter()
+        v = self._row[name]
+        self._row[name] = t - self._t if np.isnan(v) else v + t - self._t
+        self._t = t
+    
+    def record_object(self, obj, dt):
+        self.objects.append((obj, dt))
+    
+    def end_frame(self, queue, drawn):
+        row = self._row
+        state = queue.state
+        row['frame'] = time.perf_counter() - row['time']
+        row['drawn'] = drawn
+        row['culled'] = queue.culled
+        row['draws'] = state.draws - self._counts[0]
+        row['changes'] = state.changes - self._counts[1]
+        self._end_query()
+        self.count += 1
+    
+    ## --------------------------------
+    ## GPU timer queries
+    ## --------------------------------
+    
+    def _begin_query(self):
+        if self._queries is None:
+            try:
+                self._pool = list(glGenQueries(4))
+                self._queries = []
+            except Exception:
+                self._queries = False # not available
+        if self._queries is False or not self._pool:
+            return # not available or all queries in flight
+        q = self._pool.pop()
+        glBeginQuery(GL_TIME_ELAPSED, q)
+        self._queries.append((q, self.count))
+        self._active = True
+    
+    def _end_query(self):
+        if self._queries is False:
+            return
+        if self._active:
+            glEndQuery(GL_TIME_ELAPSED)
+            self._active = False
+        
+        ## Collect the results available without stalling.
+        ## The result is read into a 64-bit integer by reference;
+        ## PyOpenGL does not convert a uint64 array for the raw function.
+        avail = np.zeros(1, np.int32)
+        result = ctypes.c_uint64()
+        while self._queries:
+            q, frame = self._queries[0]
+            glGetQueryObjectiv(q, GL_QUERY_RESULT_AVAILABLE, avail)
+            if not avail[0]:
+                break
+            glGetQueryObjectui64v(q, GL_QUERY_RESULT, ctypes.byref(result))
+            if frame is not None and frame > self.count - self.capacity:
+                self.data['gpu'][frame % self.capacity] = result.value * 1e-9
+            self._queries.pop(0)
+            self._pool.append(q)
+    
+    ## --------------------------------
+    ## Overlay
+    ## --------------------------------
+    
+    def draw_overlay(self, w, h):
+        """Draw the summary text at the top-left of the viewport."""
+        if not glut_ready():
+            return # bitmap fonts unavailable
+        s = self.summary()
+        lines = [
+            "{:.1f} fps".format(s['fps']),
+            "frame {:.2f} ms (gpu {:.2f} ms)".format(s['frame']*1e3, s['gpu']*1e3),
+            "view {:.2f}  objects {:.2f}  swap {:.2f} ms".format(
+                s['view']*1e3, s['objects']*1e3, s['swap']*1e3),
+            "drawn {:.0f}  culled {:.0f}  draws {:.0f}  changes {:.0f}".format(
+                s['drawn'], s['culled'], s['draws'], s['changes']),
+        ]
+        glPushAttrib(GL_ENABLE_BIT | GL_CURRENT_BIT)
+        glDisable(GL_LIGHTING)
+        glDisable(GL_DEPTH_TEST)
+        glColor3f(1, 1, 1)
+        x, y = glGetIntegerv(GL_VIEWPORT)[:2]
+        for j, text in enumerate(lines):
+            glWindowPos2i(x + 8, y + h - 16 * (j + 1))
+            for c in text:
+                glutBitmapCharacter(GLUT_BITMAP_8_BY_13, ord(c))
+        glPopAttrib()
@@ -0,0 +1,254 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+from collections import deque
+from concurrent.futures import Future
+import ctypes
+import os
+import queue
+import threading
+import numpy as np
+
+
+class PixelReader:
+    """Asynchronous readback of frames with pixel buffer objects.
+    
+    glReadPixels into a PBO returns without waiting for the frame,
+    and the pixels are mapped a few frames later when the copy is done.
+    
+    Attributes:
+        nbuf : number of PBOs in the ring (2:double, 3:triple-buffered)
+    """
+    def __init__(self, nbuf=3):
+        self.nbuf = nbuf
+        self.pbos = None
+        self.size = None
+        self._index = 0
+        self._pending = deque() # [(pbo, w, h, fence, tag), ...]
+    
+    def __len__(self):
+        return len(self._pending)
+    
+    def release(self):
+        for pbo, w, h, fence, tag in self._pending:
+            glDeleteSync(fence)
+        self._pending.clear()
+        if self.pbos is not None:
+            glDeleteBuffers(self.nbuf, self.pbos)
+            self.pbos = None
+            self.size = None
+    
+    def _resize(self, w, h):
+        done = self.flush()
+        self.release()
+        self.pbos = glGenBuffers(self.nbuf)
+        for pbo in self.pbos:
+            glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+            glBufferData(GL_PIXEL_PACK_BUFFER, w * h * 4, None, GL_STREAM_READ)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        self.size = (w, h)
+        return done
+    
+    def read(self, x, y, w, h, tag=None):
+        """Start reading the frame and return the frames completed.
+        
+        Returns:
+            list of (rgba[h,w,4] uint8 array (top row first), tag)
+        """
+        if self.size != (w, h):
+            done = self._resize(w, h)
+        else:
+            done = self.poll()
+        pbo = self.pbos[self._index]
+        if any(p == pbo for p, *_ in self._pending):
+            done += self._map(block=True) # the ring is full
+        self._index = (self._index + 1) % self.nbuf
+        
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        glPixelStorei(GL_PACK_ALIGNMENT, 1)
+        glReadPixels(x, y, w, h, GL_RGBA, GL_UNSIGNED_BYTE, 0) # offset in PBO
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        fence = glFenceSync(GL_SYNC_GPU_COMMANDS_COMPLETE, 0)
+        self._pending.append((pbo, w, h, fence, tag))
+        return done
+    
+    def poll(self):
+        """Return the frames completed without stalling."""
+        done = []
+        while self._pending:
+            frames = self._map(block=False)
+            if not frames:
+                break
+            done += frames
+        return done
+    
+    def flush(self):
+        """Return all the pending frames (waiting for them)."""
+        done = []
+        while self._pending:
+            done += self._map(block=True)
+        return done
+    
+    def _map(self, block):
+        pbo, w, h, fence, tag = self._pending[0]
+        flags = GL_SYNC_FLUSH_COMMANDS_BIT if block else 0
+        timeout = 1000000000 if block else 0 # [ns]
+        while glClientWaitSync(fence, flags, timeout) == GL_TIMEOUT_EXPIRED:
+            if not block:
+                return []
+        glDeleteSync(fence)
+        self._pending.popleft()
+        
+        frame = np.empty((h, w, 4), np.uint8)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, pbo)
+        ptr = glMapBufferRange(GL_PIXEL_PACK_BUFFER, 0, frame.nbytes, GL_MAP_READ_BIT)
+        if ptr:
+            ctypes.memmove(frame.ctypes.data, ptr, frame.nbytes)
+            glUnmapBuffer(GL_PIXEL_PACK_BUFFER)
+        glBindBuffer(GL_PIXEL_PACK_BUFFER, 0)
+        return [(frame[::-1], tag)]
+
+
+class Recorder:
+    """Writer of frames in a background thread.
+    
+    Frames are put in a bounded queue without blocking,
+    and are dropped when the writer falls behind.
+    
+    Args:
+        sink    : file name or function f(frame, index)
+                  '*.raw' - raw video (rgba frames in sequence)
+                  '*.npy' - NumPy array files (e.g. 'frame{:05d}.npy')
+                  others  - image files with PIL (e.g. 'frame{:05d}.png')
+        maxsize : maximum number of frames waiting in the queue
+    
+    Attributes:
+        frames  : number of frames written
+        dropped : number of frames dropped
+        error   : exception raised by the writer (None if no error)
+    """
+    def __init__(self, sink, maxsize=16):
+        self.sink = sink
+        self.frames = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize)
+        self._thread = None
+        self._file = None
+        self.error = None
+    
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+    
+    def stop(self):
+        """Stop after writing the frames in the queue."""
+        if self._thread is not None:
+            self._queue.put(None) # wait for a free slot
+            self._thread.join()
+            self._thread = None
+    
+    def push(self, frame):
+        """Put the frame in the queue; return False if dropped."""
+        try:
+            self._queue.put_nowait(frame)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+    
+    def _run(self):
+        try:
+            while 1:
+                frame = self._queue.get()
+                if frame is None:
+                    break
+                if self.error is None:
+                    try:
+                        self.write(frame, self.frames)
+                        self.frames += 1
+                    except Exception as e:
+                        self.error = e # keep draining the queue
+        finally:
+            if self._file:
+                self._file.close()
+                self._file = None
+    
+    def write(self, frame, index):
+        sink = self.sink
+        if callable(sink):
+            sink(frame, index)
+            return
+        ext = os.path.splitext(sink)[1].lower()
+        if ext == '.raw':
+            if self._file is None:
+                self._file = open(sink, 'wb')
+            self._file.write(np.ascontiguousarray(frame).data)
+        elif ext == '.npy':
+            np.save(sink.format(index), frame)
+        else:
+            from PIL import Image
+            Image.fromarray(np.ascontiguousarray(frame[...,:3])).save(sink.format(index))
+
+
+class FrameCapture:
+    """Recording and snapshots of the frames drawn by the stream.
+    
+    The stream calls this after drawing the frame (before swapping buffers)
+    while it is active, and calls poll() until no frames are pending.
+    
+    >>> view.record('frame{:05d}.png')
+    >>> view.snapshot().result() # <-- not in the GL thread
+    """
+    def __init__(self, nbuf=3):
+        self.reader = PixelReader(nbuf)
+        self.recorder = None
+        self._futures = []
+    
+    @property
+    def active(self):
+        return self.recorder is not None or bool(self._futures)
+    
+    @property
+    def pending(self):
+        return len(self.reader)
+    
+    def record(self, sink, maxsize=16):
+        """Start recording frames to the sink."""
+        self.stop()
+        self.recorder = Recorder(sink, maxsize).start()
+        return self.recorder
+    
+    def stop(self):
+        """Stop recording; the pending frames are written."""
+        recorder = self.recorder
+        if recorder is not None:
+            self._dispatch(self.reader.flush())
+            self.recorder = None
+            recorder.stop()
+        return recorder
+    
+    def snapshot(self):
+        """Future of the next frame rgba[h,w,4]."""
+        f = Future()
+        self._futures.append(f)
+        return f
+    
+    def __call__(self, w, h):
+        tag = (self.recorder, self._futures)
+        self._futures = []
+        self._dispatch(self.reader.read(0, 0, w, h, tag))
+    
+    def poll(self):
+        """Dispatch the frames completed; return the number of pending."""
+        self._dispatch(self.reader.poll())
+        return self.pending
+    
+    def _dispatch(self, frames):
+        for frame, (recorder, futures) in frames:
+            if recorder is not None:
+                recorder.push(frame)
+            for f in futures:
+                f.set_result(frame)
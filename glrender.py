@@ -0,0 +1,397 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+from bisect import bisect
+from time import perf_counter
+import numpy as np
+
+from .globject import Object, GLState
+from .glscene import SceneGraph
+from .glshader import Program, use_program, phong_program
+
+
+class RenderQueue:
+    """Render queue of objects.
+    
+    Objects are sorted by style and material so that the objects sharing
+    the same material are drawn in sequence, and the GL state is tracked
+    so that unchanged state is not sent again.
+    
+    Objects whose bounding spheres are outside the view frustum of the
+    camera are culled before drawing, and the levels of detail are chosen
+    from their projected sizes. Opaque objects are drawn first,
+    then transparent (MALPHA) objects are drawn back-to-front.
+    
+    Attributes:
+        state        : <GLState> tracker of the current GL state
+        culling      : cull objects outside the view frustum
+        culled       : number of objects culled in the last frame
+        loading      : list of objects drawn still loading data
+        lod          : select levels of detail of objects with `lod`
+        transparency : transparent pass {'sorted', 'oit'}
+                       'sorted' - back-to-front order by depth
+                       'oit'    - weighted blended order-independent
+        pipeline     : lighting of objects {'fixed', 'phong'}
+                       'fixed'  - fixed-function per-vertex lighting
+                       'phong'  - per-pixel lighting with the GLSL program
+    
+    Note:
+        Callables other than <Object> are drawn first in the list order.
+        The state is reset after each of them since it can be changed.
+        The objects of <SceneGraph> are drawn with the other objects.
+        In the 'phong' pipeline, the materials are kept in a uniform buffer
+        and selected by index. Callables are drawn with the fixed function.
+        In the 'oit' transparency, the objects of their own programs
+        (`own_program`, e.g. Volume) are drawn back-to-front after the others.
+    """
+    def __init__(self, transparency='sorted', pipeline='fixed'):
+        self.state = GLState()
+        self.transparency = transparency
+        self.pipeline = pipeline
+        self.culling = True
+        self.culled = 0
+        self.loading = []
+        self.lod = True
+        self.oit = WeightedBlendedOIT()
+    
+    @staticmethod
+    def sort_key(obj):
+        return (obj.style, id(obj.shade))
+    
+    def render(self, objects, camera=None, stats=None):
+        """Draw objects and return the number of objects drawn.
+        
+        Args:
+            objects : list of <Object> and callables
+            camera  : <Camera> for culling, LOD and depth sorting
+            stats   : <FrameStats> to record CPU time of each object
+        """
+        state = self.state
+        state.reset()
+        self.culled = 0
+        items = []
+        modelview = None
+        for obj in objects:
+            if isinstance(obj, Object):
+                if obj.visible:
+                    items.append(obj)
+            elif isinstance(obj, SceneGraph):
+                if modelview is None:
+                    modelview = glGetDoublev(GL_MODELVIEW_MATRIX).T
+                obj.update(modelview)
+                items += [o for o in obj.objects if o.visible]
+            else:
+                obj()
+                state.reset()
+        
+        if camera is not None and items:
+            c = np.array([obj.center for obj in items], dtype=float)
+            r = np.array([obj.radius * obj.extent for obj in items], dtype=float)
+            if self.culling:
+                visible = self.frustum_test(c, r, camera)
+                self.culled = len(items) - np.count_nonzero(visible)
+                if self.culled:
+                    idx = np.flatnonzero(visible)
+                    items = [items[i] for i in idx]
+                    c = c[idx]
+                    r = r[idx]
+            if self.lod:
+                px = camera.pixels(c, r)
+                for obj, p in zip(items, px.tolist()):
+                    if obj.lod:
+                        obj.level = bisect(obj.lod, p)
+        
+        opaque = []
+        alpha = []
+        loading = []
+        for obj in items:
+            if obj.loading:
+                loading.append(obj)
+            if obj.style & Object.MALPHA:
+                alpha.append(obj)
+            else:
+                opaque.append(obj)
+        self.loading = loading
+        
+        if stats is None or not stats.timing:
+            stats = None
+        
+        if self.pipeline == 'phong':
+            phong_program.materials.refresh()
+            state.use_program(phong_program)
+        
+        opaque.sort(key=self.sort_key)
+        self.draw(opaque, state, stats)
+        
+        if alpha:
+            if self.transparency == 'oit':
+                ## Objects of their own programs are drawn over the composite.
+                sorted_ = [obj for obj in alpha if obj.own_program]
+                if len(sorted_) < len(alpha):
+                    self.oit.render([obj for obj in alpha if not obj.own_program], state, stats)
+                alpha = sorted_
+            self.draw(self.depth_sorted(alpha, camera), state, stats)
+        
+        ## restore default state
+        state.use_program(None)
+        state.enable(GL_BLEND, False)
+        state.depth_mask(True)
+        return len(items)
+    
+    @staticmethod
+    def draw(objects, state, stats=None):
+        if stats is None:
+            for obj in objects:
+                obj(state)
+        else:
+            for obj in objects:
+                t = perf_counter()
+                obj(state)
+                stats.record_object(obj, perf_counter() - t)
+    
+    @staticmethod
+    def frustum_test(centers, radii, camera):
+        """Test bounding spheres [N] against the view frustum."""
+        planes = camera.frustum()
+        d = centers @ planes[:,:3].T + planes[:,3]
+        return (d >= -radii[:,None]).all(1)
+    
+    def render_views(self, objects, camera, viewports, size, stats=None):
+        """Draw objects in each viewport; return the number of objects drawn.
+        
+        The objects are drawn with the same queue (and compiled geometry)
+        from the camera of each viewport, or from the camera in the whole
+        frame if there are no viewports. The objects culled and loading
+        are summed over the viewports.
+        
+        Args:
+            objects   : list of <Object> and callables
+            camera    : <Camera> of the whole frame
+            viewports : list of <Viewport>
+            size      : frame size (w, h)
+            stats     : <FrameStats> to record the laps ('view', 'objects')
+        """
+        w, h = size
+        if not viewports:
+            camera.set_view(w, h)
+            if stats is not None:
+                stats.lap('view')
+            return self.render(objects, camera, stats)
+        n = 0
+        culled = 0
+        loading = []
+        glEnable(GL_SCISSOR_TEST)
+        try:
+            for vp in viewports:
+                x, y, vw, vh = vp.region((w, h))
+                if vw <= 0 or vh <= 0:
+                    continue
+                glViewport(x, y, vw, vh)
+                glScissor(x, y, vw, vh)
+                glClear(GL_DEPTH_BUFFER_BIT) # overlapping viewports
+                vp.camera.set_view(vw, vh)
+                if stats is not None:
+                    stats.lap('view')
+                n += self.render(objects, vp.camera, stats)
+                culled += self.culled
+                loading += self.loading
+                if stats is not None:
+                    stats.lap('objects')
+        finally:
+            glDisable(GL_SCISSOR_TEST)
+            glViewport(0, 0, w, h)
+        self.culled = culled
+        self.loading = loading
+        return n
+    
+    @staticmethod
+    def depth_sorted(objects, camera):
+        """Sort objects back-to-front along the view axis."""
+        if camera is None or len(objects) < 2:
+            return objects
+        p = np.array([obj.pos for obj in objects], dtype=float)
+        d = (p - camera.eye) @ camera.axes[2] # -distance from the eye
+        return [objects[i] for i in np.argsort(d, kind='stable')]
+
+
+## --------------------------------
+## Order-independent transparency
+## --------------------------------
+
+oit_accum_shader = """
+#version 120
+void main() {
+    vec4 c = gl_Color;
+    float z = gl_FragCoord.z;
+    float w = clamp(pow(min(1.0, c.a * 10.0) + 0.01, 3.0)
+                    * 1e8 * pow(1.0 - z * 0.9, 3.0), 1e-2, 3e3);
+    gl_FragData[0] = vec4(c.rgb * c.a, c.a) * w;
+    gl_FragData[1] = vec4(c.a);
+}
+"""
+
+oit_composite_shader = """
+#version 130
+uniform sampler2D accum;
+uniform sampler2D reveal;
+uniform vec2 origin;
+void main() {
+    ivec2 p = ivec2(gl_FragCoord.xy - origin);
+    float r = texelFetch(reveal, p, 0).r;
+    if (r >= 1.0)
+        discard;
+    vec4 a = texelFetch(accum, p, 0);
+    gl_FragColor = vec4(a.rgb / max(a.a, 1e-5), 1.0 - r);
+}
+"""
+
+
+class _OITState(GLState):
+    """GL state during the accumulation pass.
+    The blend functions and depth mask set by the pass are kept.
+    """
+    def enable(self, cap, flag=True):
+        if cap != GL_BLEND:
+            GLState.enable(self, cap, flag)
+    
+    def depth_mask(self, flag):
+        pass
+    
+    def blend(self, sfactor, dfactor):
+        pass
+
+
+class WeightedBlendedOIT:
+    """Weighted blended order-independent transparency.
+    
+    Transparent objects are accumulated in a single pass into offscreen
+    color and revealage buffers, then composited over the opaque scene.
+    The lighting is done by the fixed-function vertex stage
+    (also in the 'phong' pipeline).
+    
+    Note:
+        Objects that use their own GLSL program (e.g. InstanceBatch)
+        are not accumulated correctly; the render queue draws them
+        in the sorted pass instead.
+    """
+    def __init__(self):
+        self.accum = Program(fragment=oit_accum_shader)
+        self.composite = Program(fragment=oit_composite_shader)
+        self.fbo = None
+        self.textures = None
+        self.size = None
+    
+    def release(self):
+        if self.fbo is not None:
+            glDeleteFramebuffers(1, [self.fbo])
+            glDeleteTextures(self.textures)
+            self.fbo = None
+            self.size = None
+    
+    def _resize(self, w, h):
+        self.release()
+        self.textures = glGenTextures(3)
+        for tex, fmt, pix in zip(self.textures,
+                                 (GL_RGBA16F, GL_R16F, GL_DEPTH_COMPONENT24),
+                                 (GL_RGBA, GL_RED, GL_DEPTH_COMPONENT)):
+            glBindTexture(GL_TEXTURE_2D, tex)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_NEAREST)
+            glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_NEAREST)
+            glTexImage2D(GL_TEXTURE_2D, 0, fmt, w, h, 0, pix, GL_FLOAT, None)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        
+        target = glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING)
+        self.fbo = glGenFramebuffers(1)
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        accum, reveal, depth = self.textures
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT0, GL_TEXTURE_2D, accum, 0)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_COLOR_ATTACHMENT1, GL_TEXTURE_2D, reveal, 0)
+        glFramebufferTexture2D(GL_FRAMEBUFFER, GL_DEPTH_ATTACHMENT, GL_TEXTURE_2D, depth, 0)
+        status = glCheckFramebufferStatus(GL_FRAMEBUFFER)
+        glBindFramebuffer(GL_FRAMEBUFFER, target)
+        if status != GL_FRAMEBUFFER_COMPLETE:
+            self.release()
+            raise RuntimeError("OIT framebuffer incomplete: {:#x}".format(status))
+        self.size = (w, h)
+    
+    def render(self, objects, state, stats=None):
+        x, y, w, h = glGetIntegerv(GL_VIEWPORT)
+        if self.size != (w, h):
+            self._resize(w, h)
+        accum, reveal, depth = self.textures
+        target = glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING) # window or offscreen
+        current = Program.current
+        
+        ## copy the opaque depth of the current viewport
+        glBindTexture(GL_TEXTURE_2D, depth)
+        glCopyTexSubImage2D(GL_TEXTURE_2D, 0, 0, 0, x, y, w, h)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        
+        ## accumulation pass
+        glBindFramebuffer(GL_FRAMEBUFFER, self.fbo)
+        glViewport(0, 0, w, h)
+        glDrawBuffers(2, [GL_COLOR_ATTACHMENT0, GL_COLOR_ATTACHMENT1])
+        glClearBufferfv(GL_COLOR, 0, [0, 0, 0, 0])
+        glClearBufferfv(GL_COLOR, 1, [1, 1, 1, 1])
+        glEnable(GL_BLEND)
+        glBlendFunci(0, GL_ONE, GL_ONE)
+        glBlendFunci(1, GL_ZERO, GL_ONE_MINUS_SRC_COLOR)
+        glDepthMask(False)
+        self.accum.use()
+        
+        oit_state = _OITState()
+        try:
+            RenderQueue.draw(objects, oit_state, stats)
+        finally:
+            ## Rebind the target (not 0: it can be the offscreen FBO),
+            ## even if an object fails, not to draw the frame to the FBO.
+            state.draws += oit_state.draws
+            state.changes += oit_state.changes
+            state.reset()
+            use_program(None)
+            glDepthMask(True)
+            glBindFramebuffer(GL_FRAMEBUFFER, target)
+            glViewport(x, y, w, h)
+        
+        ## composite pass
+        glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_DEPTH_TEST)
+        glDisable(GL_LIGHTING)
+        self.composite.use()
+        glUniform1i(self.composite.uniform('accum'), 0)
+        glUniform1i(self.composite.uniform('reveal'), 1)
+        glUniform2f(self.composite.uniform('origin'), x, y)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D, reveal)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, accum)
+        draw_fullscreen_quad()
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        glActiveTexture(GL_TEXTURE0)
+        glBindTexture(GL_TEXTURE_2D, 0)
+        use_program(current)
+        glPopAttrib()
+        glDisable(GL_BLEND)
+
+
+def draw_fullscreen_quad():
+    """Draw a quad covering the viewport."""
+    glMatrixMode(GL_PROJECTION)
+    glPushMatrix()
+    glLoadIdentity()
+    glMatrixMode(GL_MODELVIEW)
+    glPushMatrix()
+    glLoadIdentity()
+    glBegin(GL_QUADS)
+    glVertex2f(-1, -1)
+    glVertex2f( 1, -1)
+    glVertex2f( 1,  1)
+    glVertex2f(-1,  1)
+    glEnd()
+    glPopMatrix()
+    glMatrixMode(GL_PROJECTION)
+    glPopMatrix()
+    glMatrixMode(GL_MODELVIEW)
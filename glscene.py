@@ -0,0 +1,289 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from numpy import linalg
+
+
+def rotation_matrix(axis, angle):
+    """Rotation matrix [3,3] about the axis by angle [rad]."""
+    x, y, z = np.asarray(axis, dtype=float) / linalg.norm(axis)
+    c, s = np.cos(angle), np.sin(angle)
+    C = 1 - c
+    return np.array([
+        [c + x*x*C,   x*y*C - z*s, x*z*C + y*s],
+        [y*x*C + z*s, c + y*y*C,   y*z*C - x*s],
+        [z*x*C - y*s, z*y*C + x*s, c + z*z*C  ],
+    ])
+
+
+class Node:
+    """Scene-graph node.
+    
+    The local transform is (translation @ rotation @ scale) to the parent.
+    The objects of the node are drawn in the node frame.
+    
+    Args:
+        pos      : position [3] in the parent frame
+        rotation : rotation matrix [3,3]
+        scale    : scale factor (scalar or [3])
+        objects  : list of <Object> drawn in the node frame
+        children : list of child <Node>
+    
+    Note:
+        The pos of the objects is bound to the world position of the node
+        when the graph is built (used for culling and depth sorting).
+        Do not assign pos of the objects; move the node instead.
+        The radius of the objects is scaled by the largest scale of the node
+        in the world (extent) for culling and picking.
+        The normals of scaled nodes are rescaled or normalized by GL.
+    """
+    def __init__(self, pos=None, rotation=None, scale=1,
+                 objects=None, children=None):
+        self._pos = np.zeros(3) if pos is None else np.array(pos, dtype=float)
+        self._rotation = np.identity(3) if rotation is None else np.array(rotation, dtype=float)
+        self._scale = np.broadcast_to(np.asarray(scale, dtype=float), 3).copy()
+        self.objects = list(objects or [])
+        self.children = []
+        self.graph = None
+        self.index = None
+        for node in children or []:
+            self.add(node)
+    
+    def __iter__(self):
+        """Iterate the subtree in depth-first order."""
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            yield node
+            stack.extend(reversed(node.children))
+    
+    @property
+    def local(self):
+        """Local matrix [4,4] to the parent frame."""
+        M = np.identity(4)
+        M[:3,:3] = self._rotation * self._scale
+        M[:3,3] = self._pos
+        return M
+    
+    @property
+    def world(self):
+        """World matrix [4,4] (computed by the last update of the graph)."""
+        return self.graph.world[self.index]
+    
+    pos = property(lambda self: self._pos,
+                   lambda self, v: self._set('_pos', np.array(v, dtype=float)))
+    
+    rotation = property(lambda self: self._rotation,
+                        lambda self, v: self._set('_rotation', np.array(v, dtype=float)))
+    
+    scale = property(lambda self: self._scale,
+                     lambda self, v: self._set('_scale',
+                         np.broadcast_to(np.asarray(v, dtype=float), 3).copy()))
+    
+    def _set(self, name, value):
+        setattr(self, name, value)
+        if self.graph is not None:
+            self.graph.invalidate(self)
+    
+    def rotate(self, axis, angle):
+        """Rotate about the axis [3] in the node frame by angle [rad]."""
+        self.rotation = self._rotation @ rotation_matrix(axis, angle)
+    
+    def add(self, *nodes):
+        for node in nodes:
+            self.children.append(node)
+        self._restructure()
+    
+    def remove(self, node):
+        self.children.remove(node)
+        self._restructure()
+    
+    def attach(self, *objects):
+        self.objects.extend(objects)
+        self._restructure()
+    
+    def detach(self, obj):
+        self.objects.remove(obj)
+        self._restructure()
+    
+    def _restructure(self):
+        if self.graph is not None:
+            self.graph.restructure()
+
+
+class SceneGraph:
+    """Scene graph with cached world transforms.
+    
+    The nodes are laid out in depth-first order in flat arrays,
+    so that the subtree of a node is a contiguous range. Changing a node
+    marks the node dirty, and the world matrices of the dirty subtrees
+    are computed level by level with batched NumPy matmul.
+    
+    The graph is drawn by the render queue (view.objects += [graph]).
+    The model-view matrix of each object is computed from the current one
+    at once, and loaded with one glLoadTransposeMatrixd per object.
+    
+    >>> stage = Node(children=[Node(pos=(1,0,0), objects=[glo.Sphere()])])
+    >>> view.objects += [SceneGraph(stage)]
+    >>> stage.pos = (0,0,1) # <-- moves the whole assembly
+    
+    Attributes:
+        roots  : list of the root <Node>
+        nodes  : list of all nodes in depth-first order
+        local  : local matrices [N,4,4]
+        world  : world matrices [N,4,4]
+        parent : parent indices [N] (-1: root)
+        end    : end of the subtree ranges [N]
+        scaling : scaling of the objects {0:none, 1:uniform, 2:non-uniform} [M]
+        extent  : largest scale of the objects (column norm of the world) [M]
+    """
+    def __init__(self, *roots):
+        self.roots = []
+        self.nodes = []
+        self._objects = []
+        self._built = False
+        self._mv = None
+        self.add(*roots)
+    
+    def add(self, *nodes):
+        self.roots.extend(nodes)
+        self.restructure()
+    
+    def remove(self, node):
+        self.roots.remove(node)
+        self.restructure()
+    
+    def restructure(self):
+        """Mark the graph to be built again (nodes added or removed)."""
+        self._built = False
+    
+    def invalidate(self, node):
+        """Mark the node dirty; its subtree is updated on the next frame."""
+        if self._built:
+            self.local[node.index] = node.local
+            self.dirty[node.index] = True
+    
+    @property
+    def objects(self):
+        """List of the objects in the graph."""
+        if not self._built:
+            self.build()
+        return self._objects
+    
+    @property
+    def positions(self):
+        """World positions of the objects [M,3] (computed by the last update)."""
+        if not self._built:
+            self.build()
+        return self.world[self._index,:3,3]
+    
+    def build(self):
+        nodes = []
+        parent = []
+        depth = []
+        stack = [(root, -1, 0) for root in reversed(self.roots)]
+        while stack:
+            node, p, d = stack.pop()
+            node.graph = self
+            node.index = len(nodes)
+            nodes.append(node)
+            parent.append(p)
+            depth.append(d)
+            stack.extend((child, node.index, d + 1) for child in reversed(node.children))
+        n = len(nodes)
+        self.parent = parent = np.array(parent, dtype=int)
+        self.depth = depth = np.array(depth, dtype=int)
+        
+        ## Subtree sizes are summed up from the deepest level.
+        size = np.ones(n, int)
+        for d in range(depth.max(initial=0), 0, -1):
+            sel = np.flatnonzero(depth == d)
+            np.add.at(size, parent[sel], size[sel])
+        self.end = np.arange(n) + size
+        
+        self.local = np.array([node.local for node in nodes]).reshape(-1, 4, 4)
+        self.world = np.empty_like(self.local)
+        self.dirty = np.zeros(n, bool)
+        self.dirty[depth == 0] = True
+        
+        ## Release the nodes and objects removed from the graph.
+        for node in set(self.nodes) - set(nodes):
+            if node.graph is self:
+                node.graph = None
+        for obj in set(self._objects) - {obj for node in nodes for obj in node.objects}:
+            obj.pos = np.array(obj.pos)
+            obj.modelview = None
+            obj.scaling = 0
+            obj.extent = 1
+        self.nodes = nodes
+        
+        ## Bind the objects to the arrays (views not to be copied per frame).
+        objects = []
+        index = []
+        for node in nodes:
+            objects += node.objects
+            index += [node.index] * len(node.objects)
+        self._objects = objects
+        self._index = np.array(index, dtype=int)
+        self.modelview = np.empty((len(objects), 4, 4))
+        self.scaling = np.full(len(objects), -1) # set by the first update
+        self.extent = np.full(len(objects), np.nan)
+        for k, obj in enumerate(objects):
+            obj.pos = self.world[index[k],:3,3]
+            obj.modelview = self.modelview[k]
+        self._mv = None
+        self._built = True
+    
+    def _update_scaling(self):
+        ## Normals are rescaled (GL_RESCALE_NORMAL) for uniform scale,
+        ## and normalized (GL_NORMALIZE) otherwise when drawn.
+        if not len(self._index):
+            return
+        s = linalg.norm(self.world[self._index,:3,:3], axis=1) # column norms
+        uniform = np.ptp(s, axis=1) <= 1e-6 * s.max(1)
+        unit = uniform & (np.abs(s[:,0] - 1) <= 1e-6)
+        scaling = np.where(unit, 0, np.where(uniform, 1, 2))
+        for k in np.flatnonzero(scaling != self.scaling):
+            self._objects[k].scaling = int(scaling[k])
+        self.scaling = scaling
+        
+        ## The bounding radius is scaled by the largest column norm.
+        extent = s.max(1)
+        for k in np.flatnonzero(extent != self.extent):
+            self._objects[k].extent = float(extent[k])
+        self.extent = extent
+    
+    def update(self, modelview=None):
+        """Compute the world matrices of the dirty subtrees,
+        and the model-view matrices of the objects.
+        
+        Args:
+            modelview : current model-view matrix [4,4] (row-major)
+        """
+        if not self._built:
+            self.build()
+        dirty = np.flatnonzero(self.dirty)
+        if dirty.size:
+            ## Mark the subtree ranges [i, end[i]) of the dirty nodes.
+            n = len(self.nodes)
+            delta = np.zeros(n + 1, int)
+            np.add.at(delta, dirty, 1)
+            np.add.at(delta, self.end[dirty], -1)
+            idx = np.flatnonzero(np.cumsum(delta[:n]))
+            
+            ## Parents are computed before children level by level.
+            idx = idx[np.argsort(self.depth[idx], kind='stable')]
+            levels = np.bincount(self.depth[idx])
+            for sel in np.split(idx, np.cumsum(levels)[:-1]):
+                p = self.parent[sel]
+                root = p < 0
+                self.world[sel[root]] = self.local[sel[root]]
+                sel, p = sel[~root], p[~root]
+                self.world[sel] = self.world[p] @ self.local[sel]
+            self.dirty[:] = False
+            self._update_scaling()
+        
+        if modelview is not None and len(self._index):
+            if dirty.size or self._mv is None or not np.array_equal(self._mv, modelview):
+                np.matmul(modelview, self.world[self._index], out=self.modelview)
+                self._mv = np.array(modelview)
@@ -0,0 +1,78 @@
+#! python3
+# -*- coding: utf8 -*-
+import time
+
+
+class Scheduler:
+    """Frame scheduler.
+    
+    The scene is redrawn at the next tick after it is marked dirty,
+    and the ticks are paced by the maximum frame rate.
+    The timer keeps ticking while there are update callbacks
+    or in continuous mode; otherwise it stops until the next draw().
+    
+    Args:
+        timer  : function to call tick() after ms milliseconds
+        redraw : function to request a repaint of the stream
+    
+    Attributes:
+        fps       : maximum frame rate
+        ondemand  : render only when dirty (otherwise every tick)
+        dirty     : the scene or camera has changed since the last frame
+        callbacks : list of per-frame update functions f(dt) [s]
+        frames    : number of rendered frames
+    """
+    def __init__(self, timer, redraw, fps=60):
+        self.timer = timer
+        self.redraw = redraw
+        self.fps = fps
+        self.ondemand = True
+        self.dirty = True
+        self.callbacks = []
+        self.frames = 0
+        self._armed = False
+        self._last = None
+        self._next = 0
+    
+    def add(self, f):
+        """Register per-frame update function f(dt)."""
+        if f not in self.callbacks:
+            self.callbacks.append(f)
+        self.wake()
+    
+    def remove(self, f):
+        if f in self.callbacks:
+            self.callbacks.remove(f)
+    
+    def draw(self):
+        """Mark the scene dirty and wake the timer."""
+        self.dirty = True
+        self.wake()
+    
+    def wake(self):
+        """Arm the timer if not armed."""
+        if not self._armed:
+            self._armed = True
+            wait = max(0, self._next - time.perf_counter())
+            self.timer(int(wait * 1000))
+    
+    def tick(self):
+        """Timer handler; update callbacks and redraw if needed."""
+        self._armed = False
+        now = time.perf_counter()
+        dt = now - self._last if self._last is not None else 0
+        self._next = now + 1 / self.fps
+        for f in self.callbacks[:]:
+            f(dt)
+        if self.dirty or not self.ondemand:
+            self.redraw()
+        if self.callbacks or not self.ondemand:
+            self._last = now
+            self.wake()
+        else:
+            self._last = None
+    
+    def rendered(self):
+        """Called by the stream after a frame is rendered."""
+        self.dirty = False
+        self.frames += 1
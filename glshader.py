@@ -0,0 +1,504 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+import numpy as np
+
+
+def compile_shader(source, shader_type):
+    shader = glCreateShader(shader_type)
+    glShaderSource(shader, source)
+    glCompileShader(shader)
+    if not glGetShaderiv(shader, GL_COMPILE_STATUS):
+        log = glGetShaderInfoLog(shader)
+        glDeleteShader(shader)
+        raise RuntimeError("Failed to compile shader:\n{}".format(log.decode()))
+    return shader
+
+
+class Program:
+    """GLSL program object.
+    
+    The shaders are compiled and linked when first used (GL context required).
+    
+    Attributes:
+        vertex     : vertex shader source
+        fragment   : fragment shader source
+        attributes : attribute locations bound before linking
+    
+    Note:
+        `Program.current` is the program in use (None: fixed-function).
+        Drawing with another program should restore it with use_program.
+    """
+    current = None
+    
+    def __init__(self, vertex=None, fragment=None, attributes=None):
+        self.vertex = vertex
+        self.fragment = fragment
+        self.attributes = attributes or {}
+        self.id = None
+        self._locations = {}
+    
+    def compile(self):
+        shaders = []
+        if self.vertex:
+            shaders.append(compile_shader(self.vertex, GL_VERTEX_SHADER))
+        if self.fragment:
+            shaders.append(compile_shader(self.fragment, GL_FRAGMENT_SHADER))
+        program = glCreateProgram()
+        for shader in shaders:
+            glAttachShader(program, shader)
+        for name, loc in self.attributes.items():
+            glBindAttribLocation(program, loc, name)
+        glLinkProgram(program)
+        for shader in shaders:
+            glDeleteShader(shader)
+        if not glGetProgramiv(program, GL_LINK_STATUS):
+            log = glGetProgramInfoLog(program)
+            glDeleteProgram(program)
+            raise RuntimeError("Failed to link program:\n{}".format(log.decode()))
+        self.id = program
+        self._locations = {}
+    
+    def use(self):
+        if self.id is None:
+            self.compile()
+        glUseProgram(self.id)
+        Program.current = self
+    
+    def release(self):
+        if self.id is not None:
+            if Program.current is self:
+                use_program(None)
+            glDeleteProgram(self.id)
+            self.id = None
+    
+    def uniform(self, name):
+        """Location of the uniform variable."""
+        try:
+            return self._locations[name]
+        except KeyError:
+            loc = self._locations[name] = glGetUniformLocation(self.id, name)
+            return loc
+    
+    def attribute(self, name):
+        """Location of the vertex attribute."""
+        try:
+            return self.attributes[name]
+        except KeyError:
+            loc = self.attributes[name] = glGetAttribLocation(self.id, name)
+            return loc
+
+
+def use_program(program):
+    """Use the program (None: fixed-function pipeline)."""
+    if program is None:
+        glUseProgram(0)
+        Program.current = None
+    else:
+        program.use()
+
+
+## --------------------------------
+## Instanced drawing
+## --------------------------------
+
+## Per-vertex lighting of GL_LIGHT0 equivalent to the fixed-function pipeline.
+## color_mode {0:material, 1:instance color, 2:glColor (MRGBA)}
+instance_vertex_shader = """
+#version 120
+attribute vec3 offset;
+attribute float scale;
+attribute vec4 color;
+uniform int color_mode;
+
+void main() {
+    vec4 p = gl_ModelViewMatrix * vec4(gl_Vertex.xyz * scale + offset, 1.0);
+    vec3 n = normalize(gl_NormalMatrix * gl_Normal);
+    vec4 a = gl_FrontMaterial.ambient;
+    vec4 d = gl_FrontMaterial.diffuse;
+    if (color_mode == 1) {
+        a = d = color;
+    } else if (color_mode == 2) {
+        a = d = gl_Color;
+    }
+    vec4 lp = gl_LightSource[0].position;
+    vec3 l = normalize(lp.xyz - p.xyz * lp.w);
+    vec3 h = normalize(l - normalize(p.xyz));
+    float nl = max(dot(n, l), 0.0);
+    float nh = nl > 0.0 ? pow(max(dot(n, h), 0.0), gl_FrontMaterial.shininess) : 0.0;
+    vec4 c = gl_FrontMaterial.emission
+           + gl_LightModel.ambient * a
+           + gl_LightSource[0].ambient * a
+           + gl_LightSource[0].diffuse * d * nl
+           + gl_LightSource[0].specular * gl_FrontMaterial.specular * nh;
+    gl_FrontColor = vec4(c.rgb, d.a);
+    gl_Position = gl_ProjectionMatrix * p;
+}
+"""
+
+instance_fragment_shader = """
+#version 120
+void main() {
+    gl_FragColor = gl_Color;
+}
+"""
+
+instance_program = Program(instance_vertex_shader,
+                           instance_fragment_shader,
+                           attributes={'offset': 1, 'scale': 2, 'color': 3})
+
+
+## --------------------------------
+## Point sprites
+## --------------------------------
+
+## Points of per-vertex size [pixel] (GL_PROGRAM_POINT_SIZE).
+point_vertex_shader = """
+#version 120
+attribute float size;
+
+void main() {
+    gl_Position = ftransform();
+    gl_FrontColor = gl_Color;
+    gl_PointSize = size;
+}
+"""
+
+point_fragment_shader = """
+#version 120
+void main() {
+    gl_FragColor = gl_Color;
+}
+"""
+
+point_program = Program(point_vertex_shader,
+                        point_fragment_shader,
+                        attributes={'size': 1})
+
+
+## --------------------------------
+## Per-pixel lighting
+## --------------------------------
+
+## The vertex stage passes the eye-space position and normal,
+## so that display lists and GLUT models are drawn as they are.
+phong_vertex_shader = """
+#version 130
+out vec3 position;
+out vec3 normal;
+out vec4 color;
+
+void main() {
+    vec4 p = gl_ModelViewMatrix * gl_Vertex;
+    position = p.xyz;
+    normal = gl_NormalMatrix * gl_Normal;
+    color = gl_Color;
+    gl_Position = gl_ProjectionMatrix * p;
+}
+"""
+
+## Blinn-Phong lighting of GL_LIGHT0 with the material of the draw.
+## color_material {false:material, true:glColor as ambient and diffuse}
+phong_fragment_shader = """
+#version 130
+#extension GL_ARB_uniform_buffer_object : require
+struct MaterialData {
+    vec4 ambient;
+    vec4 diffuse;
+    vec4 specular;
+    vec4 shininess;
+};
+layout(std140) uniform Materials {
+    MaterialData materials[%d];
+};
+uniform int material;
+uniform bool color_material;
+in vec3 position;
+in vec3 normal;
+in vec4 color;
+
+void main() {
+    MaterialData m = materials[material];
+    vec4 a = m.ambient;
+    vec4 d = m.diffuse;
+    if (color_material) {
+        a = d = color;
+    }
+    vec3 n = normalize(normal);
+    vec4 lp = gl_LightSource[0].position;
+    vec3 l = normalize(lp.xyz - position * lp.w);
+    vec3 h = normalize(l - normalize(position));
+    float nl = max(dot(n, l), 0.0);
+    float nh = nl > 0.0 ? pow(max(dot(n, h), 0.0), m.shininess.x) : 0.0;
+    vec4 c = gl_LightModel.ambient * a
+           + gl_LightSource[0].ambient * a
+           + gl_LightSource[0].diffuse * d * nl
+           + gl_LightSource[0].specular * m.specular * nh;
+    gl_FragColor = vec4(c.rgb, d.a);
+}
+"""
+
+
+class MaterialBuffer:
+    """Uniform buffer of materials.
+    
+    Materials are given indices when first used, and packed into
+    an std140 array of (ambient, diffuse, specular, shininess) vec4.
+    The rows of new materials are sent when they are added, and refresh()
+    packs only the materials whose version has changed, and sends the
+    range of their rows.
+    
+    Attributes:
+        capacity : maximum number of materials in the buffer
+        binding  : uniform buffer binding point
+        serial   : incremented when the indices are assigned again
+    """
+    def __init__(self, capacity=256, binding=0):
+        self.capacity = capacity
+        self.binding = binding
+        self.serial = 0
+        self.id = None
+        self.data = np.zeros((capacity, 4, 4), np.float32)
+        self.versions = np.zeros(capacity, int) # of the materials packed
+        self._materials = []
+        self._index = {} # id(material) -> index
+    
+    def __len__(self):
+        return len(self._materials)
+    
+    def release(self):
+        if self.id is not None:
+            glDeleteBuffers(1, [self.id])
+            self.id = None
+    
+    def clear(self):
+        self._materials = []
+        self._index = {}
+        self.serial += 1
+    
+    @staticmethod
+    def pack(m, row):
+        row[0] = m.ambient
+        row[1] = m.diffuse
+        row[2] = m.specular
+        row[3] = m.shininess
+    
+    def index(self, m):
+        """Index of the material in the buffer."""
+        try:
+            return self._index[id(m)]
+        except KeyError:
+            pass
+        if len(self._materials) == self.capacity:
+            self.clear()
+        i = self._index[id(m)] = len(self._materials)
+        self._materials.append(m) # keep the id alive
+        row = self.data[i]
+        self.pack(m, row)
+        self.versions[i] = m.version
+        if self.id is not None:
+            glBindBuffer(GL_UNIFORM_BUFFER, self.id)
+            glBufferSubData(GL_UNIFORM_BUFFER, row.nbytes * i, row.nbytes, row)
+            glBindBuffer(GL_UNIFORM_BUFFER, 0)
+        return i
+    
+    def refresh(self):
+        """Pack the materials changed and send their rows."""
+        if self.id is None:
+            self.id = glGenBuffers(1)
+            glBindBuffer(GL_UNIFORM_BUFFER, self.id)
+            glBufferData(GL_UNIFORM_BUFFER, self.data.nbytes, self.data, GL_DYNAMIC_DRAW)
+            glBindBuffer(GL_UNIFORM_BUFFER, 0)
+            return
+        n = len(self._materials)
+        versions = np.fromiter((m.version for m in self._materials), int, n)
+        dirty = np.flatnonzero(versions != self.versions[:n])
+        if not dirty.size:
+            return
+        for i in dirty:
+            self.pack(self._materials[i], self.data[i])
+        self.versions[:n] = versions
+        a, b = dirty[0], dirty[-1] + 1
+        data = self.data[a:b]
+        glBindBuffer(GL_UNIFORM_BUFFER, self.id)
+        glBufferSubData(GL_UNIFORM_BUFFER, data[0].nbytes * a, data.nbytes, data)
+        glBindBuffer(GL_UNIFORM_BUFFER, 0)
+    
+    def bind(self):
+        if self.id is None:
+            self.refresh()
+        glBindBufferBase(GL_UNIFORM_BUFFER, self.binding, self.id)
+
+
+class PhongProgram(Program):
+    """Program of per-pixel lighting with materials in a uniform buffer.
+    
+    The material of each draw is selected by the index uniform,
+    so that switching materials is a single glUniform1i.
+    The values of the uniforms are kept not to be sent again.
+    """
+    def __init__(self, capacity=256):
+        Program.__init__(self, phong_vertex_shader,
+                               phong_fragment_shader % capacity)
+        self.materials = MaterialBuffer(capacity)
+        self._material = None
+        self._color_material = None
+    
+    def compile(self):
+        Program.compile(self)
+        block = glGetUniformBlockIndex(self.id, 'Materials')
+        glUniformBlockBinding(self.id, block, self.materials.binding)
+        self._material = None
+        self._color_material = None
+    
+    def use(self):
+        Program.use(self)
+        self.materials.bind()
+    
+    def release(self):
+        Program.release(self)
+        self.materials.release()
+    
+    def set_material(self, m):
+        i = (self.materials.index(m), self.materials.serial)
+        if self._material != i:
+            glUniform1i(self.uniform('material'), i[0])
+            self._material = i
+    
+    @property
+    def color_material(self):
+        return bool(self._color_material)
+    
+    @color_material.setter
+    def color_material(self, flag):
+        flag = bool(flag)
+        if self._color_material is not flag:
+            glUniform1i(self.uniform('color_material'), flag)
+            self._color_material = flag
+
+
+phong_program = PhongProgram()
+
+
+## --------------------------------
+## Volume rendering
+## --------------------------------
+
+## Positions are in the voxel coordinates of the volume [0, size].
+volume_vertex_shader = """
+#version 130
+out vec3 position;
+out vec3 eye;
+out vec3 view;
+
+void main() {
+    position = gl_Vertex.xyz;
+    eye = (gl_ModelViewMatrixInverse * vec4(0.0, 0.0, 0.0, 1.0)).xyz;
+    view = (gl_ModelViewMatrixInverse * vec4(0.0, 0.0, -1.0, 0.0)).xyz;
+    gl_Position = ftransform();
+}
+"""
+
+## Ray-marching of a brick drawn with its back faces (the exit points),
+## composited front to back. The value v is mapped to [0, 1] by the window
+## (width) and level (center), and looked up in the transfer function.
+volume_fragment_shader = """
+#version 130
+uniform sampler3D volume;
+uniform sampler1D lut;
+uniform vec3 box_lo;
+uniform vec3 box_hi;
+uniform vec3 tex_origin;
+uniform vec3 tex_size;
+uniform float scale;
+uniform float window;
+uniform float level;
+uniform float opacity;
+uniform float step;
+uniform int max_steps;
+in vec3 position;
+in vec3 eye;
+in vec3 view;
+
+void main() {
+    vec3 d;
+    vec3 o;
+    if (gl_ProjectionMatrix[3][3] == 0.0) {
+        o = eye; // perspective
+        d = position - eye;
+    } else {
+        d = view * length(box_hi - box_lo) * 2.0 / length(view);
+        o = position - d;
+    }
+    vec3 inv = 1.0 / d;
+    vec3 t1 = (box_lo - o) * inv;
+    vec3 t2 = (box_hi - o) * inv;
+    vec3 tn = min(t1, t2);
+    float t0 = max(max(max(tn.x, tn.y), tn.z), 0.0);
+    float dt = step / length(d);
+    
+    vec4 acc = vec4(0.0);
+    for (int i = 0; i < max_steps; i++) {
+        float t = t0 + (float(i) + 0.5) * dt;
+        if (t > 1.0)
+            break;
+        vec3 x = o + d * t;
+        float v = texture(volume, (x - tex_origin) / tex_size).r * scale;
+        vec4 c = texture(lut, clamp((v - level) / window + 0.5, 0.0, 1.0));
+        float a = 1.0 - pow(1.0 - clamp(c.a * opacity, 0.0, 1.0), step);
+        acc.rgb += (1.0 - acc.a) * a * c.rgb;
+        acc.a += (1.0 - acc.a) * a;
+        if (acc.a > 0.995)
+            break;
+    }
+    if (acc.a <= 0.0)
+        discard;
+    gl_FragColor = vec4(acc.rgb / acc.a, acc.a);
+}
+"""
+
+volume_program = Program(volume_vertex_shader,
+                         volume_fragment_shader)
+
+
+## --------------------------------
+## Image plane
+## --------------------------------
+
+image_vertex_shader = """
+#version 130
+out vec2 uv;
+
+void main() {
+    uv = gl_MultiTexCoord0.st;
+    gl_Position = ftransform();
+}
+"""
+
+## The value v is mapped to [0, 1] by the window (width) and level (center).
+## Gray images are looked up in the colormap; color images are shown as is.
+image_fragment_shader = """
+#version 130
+uniform sampler2D image;
+uniform sampler1D lut;
+uniform float scale;
+uniform float window;
+uniform float level;
+uniform float opacity;
+uniform bool gray;
+in vec2 uv;
+
+void main() {
+    vec4 c = texture(image, uv);
+    vec3 v = clamp((c.rgb * scale - level) / window + 0.5, 0.0, 1.0);
+    if (gray)
+        c = texture(lut, v.r);
+    else
+        c.rgb = v;
+    gl_FragColor = vec4(c.rgb, c.a * opacity);
+}
+"""
+
+image_program = Program(image_vertex_shader,
+                        image_fragment_shader)
@@ -6,6 +6,12 @@ from OpenGL.GLUT import *
 
 from mwx import FSM
 from .glcamera import Camera
+from .glrender import RenderQueue
+from .glloader import Loader
+from .glrecord import FrameCapture
+from .glpick import Picker
+from .glscheduler import Scheduler
+from .glview import ViewMixin
 
 
 speckeys = dict(enumerate('abcdefghijklmnopqrstuvwxyz', 1)) # C-[a-z]
@@ -94,26 +100,41 @@ class Event:
         self.y = y
 
 
-class basic_stream:
+class basic_stream(ViewMixin):
     """The basic stream
     
     Attributes:
-        name    : window title
-        camera  : singlet camera model
-        objects : list <Object> to draw
+        name      : window title
+        camera    : camera model (of the active viewport)
+        viewports : list <Viewport> in the window (empty: the whole window)
+        viewport  : active <Viewport> under the cursor (None: the whole window)
+        objects   : list <Object> to draw
+        queue     : render queue of objects
+        scheduler : frame scheduler (fps, ondemand, callbacks)
+        stats     : <FrameStats> per-frame statistics (None: disabled)
+        capture   : <FrameCapture> recording and snapshots of frames
+        picker    : <Picker> of objects under the cursor
+        picked    : object picked by the last click (None: nothing)
+        loader    : <Loader> of objects in the background
     """
-    @property
-    def dpu(self):
-        """Dots per unit:logical length."""
-        return self._size[1] / 2 / self.camera.h2_
-    
     def __init__(self, name):
         glutInit(sys.argv)
         glutInitDisplayMode(GLUT_RGBA | GLUT_DOUBLE | GLUT_DEPTH)
         
         self.name = name.encode()
         self.camera = Camera(self)
+        self.viewports = []
+        self.viewport = None
         self.objects = []
+        self.queue = RenderQueue()
+        self.stats = None
+        self.capture = FrameCapture()
+        self.picker = Picker()
+        self.picked = None
+        self._picker_frame = None
+        self.loader = Loader()
+        self._motion = None
+        self.scheduler = Scheduler(self._set_timer, glutPostRedisplay)
         
         self.__key = ''
         self.__button = ''
@@ -121,7 +142,7 @@ class basic_stream:
         self.handler = FSM({ # DNA<basic_stream>
                 0 : {
                  'home pressed' : (0, self.OnHomePosition),
-             '*Lbutton pressed' : (1, self.OnDragBegin),
+             '*Lbutton pressed' : (1, self.OnDragBegin, self.OnPick),
              '*Rbutton pressed' : (2, self.OnDragBegin),
             'C-wheelup pressed' : (0, self.OnScrollZoomUp),
           'C-wheeldown pressed' : (0, self.OnScrollZoomDown),
@@ -188,10 +209,11 @@ class basic_stream:
         glutMainLoop()
     
     def close(self):
+        self.loader.shutdown()
         glutLeaveMainLoop()
     
-    def draw(self):
-        glutPostRedisplay()
+    def _set_timer(self, ms):
+        glutTimerFunc(ms, self.on_timer, 0)
     
     ## --------------------------------
     ## GLUT event handlers
@@ -202,35 +224,40 @@ class basic_stream:
         glViewport(0, 0, w, h) # --> single viewport region
     
     def on_display(self):
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        w, h = self._size
-        if w and h:
-            self.camera.set_view(w, h)
-            for obj in self.objects: # draw objects
-                obj()
-            glutSwapBuffers()
+        self.render_frame(glutSwapBuffers)
     
     def on_key_press(self, key, x, y):
+        self.flush_motion()
+        if not self.__button:
+            self.route(x, y)
         key = get_hotkey(key)
         self.__key = regulate_key(key + '+')
         self.handler('{} pressed'.format(key), Event(x, y))
     
     def on_key_release(self, key, x, y):
+        self.flush_motion()
         key = get_hotkey(key)
         self.__key = ''
         self.handler('{} released'.format(key), Event(x, y))
     
     def on_speckey_press(self, code, x, y):
+        self.flush_motion()
+        if not self.__button:
+            self.route(x, y)
         key = get_speckey(code)
         self.__key = regulate_key(key + '+')
         self.handler('{} pressed'.format(key), Event(x, y))
     
     def on_speckey_release(self, code, x, y):
+        self.flush_motion()
         key = get_speckey(code)
         self.__key = ''
         self.handler('{} released'.format(key), Event(x, y))
     
     def on_mouse(self, button, state, x, y):
+        self.flush_motion()
+        if not self.__button:
+            self.route(x, y)
         if button >= 3: # wheel
             if state == GLUT_DOWN:
                 p = 'up' if button == 3 else 'down'
@@ -246,86 +273,17 @@ class basic_stream:
             self.handler('{}button released'.format(btn), Event(x, y))
     
     def on_motion(self, x, y):
+        if self._motion is not None:
+            self._motion[1].append((x, y)) # coalesced until the next tick
+            return
         if self.__button:
             self.handler('{}drag move'.format(self.__button), Event(x, y))
     
+    def on_timer(self, value):
+        self.scheduler.tick()
+    
     def on_visible(self, state):
         if state:
             self.handler('window_shown')
         else:
             self.handler('window_hidden')
-    
-    ## --------------------------------
-    ## Mouse / Keyboard interface
-    ## --------------------------------
-    
-    def OnHomePosition(self, evt):
-        self.camera.set_axes()
-        self.draw()
-    
-    def OnDragBegin(self, evt):
-        x, y = evt.x, evt.y
-        self._lx = x
-        self._ly = y
-        self.lcx = self._size[0] / 2
-        self.lcy = self._size[1] / 2
-        self.lvx = x - self.lcx
-        self.lvy = self.lcy - y
-    
-    def OnDragMove(self, evt):
-        x, y = evt.x, evt.y
-        d = self.dpu / 4
-        self.camera.rotate(-(x-self._lx)/d, (y-self._ly)/d)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnDragEnd(self, evt):
-        self.draw()
-    
-    def OnShiftMove(self, evt):
-        x, y = evt.x, evt.y
-        d = self.dpu
-        self.camera.shift(-(x-self._lx)/d, (y-self._ly)/d)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnTiltMove(self, evt):
-        x, y = evt.x, evt.y
-        vx = x - self.lcx
-        vy = self.lcy - y
-        vv = vx*vx + vy*vy
-        if vv < 10:
-            return # prevent zero-division
-        
-        self.camera.tilt((vx * self.lvy - vy * self.lvx) / vv)
-        self._lx = x
-        self._ly = y
-        self.lvx = vx
-        self.lvy = vy
-        self.draw()
-    
-    def OnZoomView(self, evt):
-        x, y = evt.x, evt.y
-        ds = (x-self._lx + self._ly-y) / 100 # zoom
-        self.camera.zoom(1 + ds)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnZoomFovy(self, evt):
-        x, y = evt.x, evt.y
-        ds = (x-self._lx + self._ly-y) / 100 # angle
-        self.camera.magnify(ds)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnScrollZoomUp(self, evt):
-        self.camera.zoom(1.25)
-        self.draw()
-    
-    def OnScrollZoomDown(self, evt):
-        self.camera.zoom(1/1.25)
-        self.draw()
@@ -0,0 +1,304 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+from .globject import ObjectList
+
+
+class ViewMixin:
+    """Viewports, picking, deferred motions, background loading,
+    recording, and the mouse interface shared by the streams.
+    
+    The stream sets the following attributes, and the window size `_size`,
+    and calls render_frame in its paint handler.
+    
+    Attributes:
+        camera    : camera model (of the active viewport)
+        viewports : list <Viewport> in the window (empty: the whole window)
+        viewport  : active <Viewport> under the cursor (None: the whole window)
+        objects   : list <Object> to draw (kept in an <ObjectList>)
+        queue     : render queue of objects
+        stats     : <FrameStats> per-frame statistics (None: disabled)
+        scheduler : frame scheduler (fps, ondemand, callbacks)
+        capture   : <FrameCapture> recording and snapshots of frames
+        picker    : <Picker> of objects under the cursor
+        picked    : object picked by the last click (None: nothing)
+        loader    : <Loader> of objects in the background
+    """
+    @property
+    def dpu(self):
+        """Dots per unit:logical length."""
+        return self._region()[3] / 2 / self.camera.h2_
+    
+    objects = property(lambda self: self._objects,
+                       lambda self, v: setattr(self, '_objects',
+                           v if isinstance(v, ObjectList) else ObjectList(v)))
+    
+    def _make_current(self):
+        """Make the GL context current (before GL calls out of drawing)."""
+        pass
+    
+    def draw(self):
+        self.scheduler.draw()
+    
+    def render_frame(self, swap):
+        """Render objects in the window and swap the buffers.
+        Called by the paint handler of the stream with the context current.
+        """
+        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
+        w, h = self._size
+        if w and h:
+            stats = self.stats
+            if stats is not None:
+                stats.begin_frame(self.queue.state)
+            n = self.queue.render_views(self.objects, self.camera, self.viewports, (w, h), stats)
+            if stats is not None:
+                stats.lap('objects')
+                if stats.overlay:
+                    stats.draw_overlay(w, h)
+            if self.capture.active:
+                self.capture(w, h) # read back asynchronously
+                self.scheduler.add(self._poll_capture)
+            swap()
+            if stats is not None:
+                stats.lap('swap')
+                stats.end_frame(self.queue, n)
+            self.scheduler.rendered()
+            if self.queue.loading:
+                self.scheduler.add(self._poll_loader) # redraw when ready
+    
+    def record(self, sink=None, **kwargs):
+        """Start recording frames to the sink (None: stop recording).
+        Returns the <Recorder> (frames, dropped) of the recording.
+        """
+        self._make_current()
+        if sink is None:
+            return self.capture.stop()
+        recorder = self.capture.record(sink, **kwargs)
+        self.draw()
+        return recorder
+    
+    def snapshot(self):
+        """Future of the next frame rgba[h,w,4] (top row first)."""
+        f = self.capture.snapshot()
+        self.draw()
+        return f
+    
+    def layout(self, *viewports):
+        """Set the viewports in the window (none: the whole window).
+        
+        >>> top = Camera(view); top.mode = 0; top.set_axes(z=Y, y=-Z)
+        >>> view.layout(Viewport(top, (0, 0, 0.5, 1)),
+        ...             Viewport(view.camera, (0.5, 0, 0.5, 1)))
+        """
+        self.viewports = list(viewports)
+        self.viewport = None
+        if viewports:
+            self.activate(viewports[0])
+        self.draw()
+    
+    def activate(self, viewport):
+        """Make the viewport active to handle the input events."""
+        self.viewport = viewport
+        self.camera = viewport.camera
+    
+    def viewport_at(self, x, y):
+        """The viewport at the window position (x, y), or None."""
+        for vp in reversed(self.viewports): # the last drawn is on top
+            if vp.contains(self._size, x, y):
+                return vp
+    
+    def route(self, x, y):
+        """Route the input events to the viewport under the cursor."""
+        vp = self.viewport_at(x, y)
+        if vp is not None and vp is not self.viewport:
+            self.activate(vp)
+    
+    def _region(self):
+        if self.viewport is None:
+            return (0, 0) + tuple(self._size)
+        return self.viewport.region(self._size)
+    
+    def _locate(self, x, y):
+        ## camera and position in the viewport at the window position
+        if not self.viewports:
+            return self.camera, x, y
+        vp = self.viewport_at(x, y) or self.viewport
+        if vp is None:
+            return None, x, y
+        return (vp.camera,) + vp.local(self._size, x, y)
+    
+    def pick(self, x, y):
+        """The nearest object at the window position (x, y), or None."""
+        self._update_picker()
+        camera, x, y = self._locate(x, y)
+        if camera is None:
+            return None
+        return self.picker.pick(camera, x, y)
+    
+    def pick_rect(self, x0, y0, x1, y1):
+        """Objects whose centers are inside the window rectangle.
+        The rectangle is in the viewport of the first corner.
+        """
+        self._update_picker()
+        camera, u0, v0 = self._locate(x0, y0)
+        if camera is None:
+            return []
+        return self.picker.pick_rect(camera, u0, v0, x1 - x0 + u0, y1 - y0 + v0)
+    
+    def _update_picker(self):
+        ## Objects are picked as drawn in the last frame.
+        if self._picker_frame != self.scheduler.frames:
+            self.picker.update(self.objects)
+            self._picker_frame = self.scheduler.frames
+    
+    def defer_motion(self, f, evt):
+        """Defer the motion handler f(points) to the next frame.
+        
+        The motions until the next tick are not dispatched but appended
+        to the pending points, and f is called with all of them at once,
+        then redrawn once. f returns True if the view has changed.
+        """
+        if self._motion is not None and self._motion[0] != f:
+            self.flush_motion()
+        if self._motion is None:
+            self._motion = (f, [])
+            self.scheduler.add(self.flush_motion)
+        self._motion[1].append((evt.x, evt.y))
+    
+    def flush_motion(self, dt=0):
+        """Apply the pending motions."""
+        self.scheduler.remove(self.flush_motion)
+        if self._motion is not None:
+            f, points = self._motion
+            self._motion = None
+            if f(points):
+                self.draw()
+    
+    def load(self, func, *args, **kwargs):
+        """Load an object in the background (see Loader.submit).
+        Returns the <Proxy> added to the objects, drawn as a placeholder
+        until the object is made in the GL thread.
+        
+        >>> proxy = view.load(make_mesh, *args, placeholder=WireBox(2))
+        """
+        proxy = self.loader.submit(func, *args, **kwargs)
+        self.objects.append(proxy)
+        self.scheduler.add(self._poll_loader)
+        self.draw()
+        return proxy
+    
+    def _poll_loader(self, dt):
+        ## Redraw once when objects are made or the next data are ready.
+        self._make_current()
+        if self.loader.poll() or any(obj.ready for obj in self.queue.loading):
+            self.draw()
+        if not self.loader.pending and not self.queue.loading:
+            self.scheduler.remove(self._poll_loader)
+    
+    def _poll_capture(self, dt):
+        self._make_current()
+        if not self.capture.poll():
+            self.scheduler.remove(self._poll_capture)
+    
+    ## --------------------------------
+    ## Mouse / Keyboard interface
+    ## --------------------------------
+    
+    def OnHomePosition(self, evt):
+        self.camera.set_axes()
+        self.draw()
+    
+    def OnDragBegin(self, evt):
+        x, y = evt.x, evt.y
+        self._lx = x
+        self._ly = y
+        x0, y0, w, h = self._region()
+        self.lcx = x0 + w / 2
+        self.lcy = self._size[1] - y0 - h / 2
+        self.lvx = x - self.lcx
+        self.lvy = self.lcy - y
+    
+    def OnPick(self, evt):
+        self.picked = self.pick(evt.x, evt.y)
+    
+    def OnDragMove(self, evt):
+        self.defer_motion(self._drag_move, evt)
+    
+    def _drag_move(self, points):
+        ## Rotations do not commute; replayed in order.
+        d = self.dpu / 4
+        for x, y in points:
+            self.camera.rotate(-(x-self._lx)/d, (y-self._ly)/d)
+            self._lx = x
+            self._ly = y
+        return True
+    
+    def OnDragEnd(self, evt):
+        self.draw()
+    
+    def OnShiftMove(self, evt):
+        self.defer_motion(self._shift_move, evt)
+    
+    def _shift_move(self, points):
+        ## The deltas are summed, and the camera is shifted once.
+        x, y = points[-1]
+        d = self.dpu
+        self.camera.shift(-(x-self._lx)/d, (y-self._ly)/d)
+        self._lx = x
+        self._ly = y
+        return True
+    
+    def OnTiltMove(self, evt):
+        self.defer_motion(self._tilt_move, evt)
+    
+    def _tilt_move(self, points):
+        ## Replayed in order (the angles depend on the points).
+        changed = False
+        for x, y in points:
+            vx = x - self.lcx
+            vy = self.lcy - y
+            vv = vx*vx + vy*vy
+            if vv < 10:
+                continue # prevent zero-division
+            
+            self.camera.tilt((vx * self.lvy - vy * self.lvx) / vv)
+            self._lx = x
+            self._ly = y
+            self.lvx = vx
+            self.lvy = vy
+            changed = True
+        return changed
+    
+    def OnZoomView(self, evt):
+        self.defer_motion(self._zoom_view, evt)
+    
+    def _zoom_view(self, points):
+        ## The rates are multiplied, and the camera is zoomed once.
+        rate = 1
+        for x, y in points:
+            ds = (x-self._lx + self._ly-y) / 100 # zoom
+            rate *= 1 + ds
+            self._lx = x
+            self._ly = y
+        return self.camera.zoom(rate)
+    
+    def OnZoomFovy(self, evt):
+        self.defer_motion(self._zoom_fovy, evt)
+    
+    def _zoom_fovy(self, points):
+        ## The angles are summed, and the camera is magnified once.
+        x, y = points[-1]
+        ds = (x-self._lx + self._ly-y) / 100 # angle
+        ret = self.camera.magnify(ds)
+        self._lx = x
+        self._ly = y
+        return ret
+    
+    def OnScrollZoomUp(self, evt):
+        if self.camera.zoom(1.25):
+            self.draw()
+    
+    def OnScrollZoomDown(self, evt):
+        if self.camera.zoom(1/1.25):
+            self.draw()
@@ -0,0 +1,521 @@
+#! python3
+# -*- coding: utf8 -*-
+from OpenGL.GL import *
+
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+
+from .globject import Object, MeshObject
+from .glshader import Program, use_program, volume_program
+
+
+## (internal format, format, type, scale to the data value)
+texture_formats = {
+    np.dtype(np.uint8)   : (GL_R8,    GL_RED, GL_UNSIGNED_BYTE,  0xff),
+    np.dtype(np.uint16)  : (GL_R16,   GL_RED, GL_UNSIGNED_SHORT, 0xffff),
+    np.dtype(np.float32) : (GL_R32F,  GL_RED, GL_FLOAT,          1),
+}
+
+
+def gray_lut(n=256):
+    """Gray ramp with the alpha of the intensity [n,4]."""
+    t = np.linspace(0, 1, n, dtype=np.float32)
+    return np.stack([t, t, t, t], axis=1)
+
+
+def rgba_lut(lut):
+    """Transfer function [n,4] of rgba (or rgb with a ramp alpha) [n,3]."""
+    lut = np.asarray(lut, dtype=np.float32)
+    if lut.shape[1] == 3:
+        a = np.linspace(0, 1, len(lut), dtype=np.float32)
+        lut = np.hstack([lut, a[:,None]])
+    return np.ascontiguousarray(lut)
+
+
+def upload_lut(lut, tex=None):
+    """Upload the lut [n,4] to the 1D texture (None: new); returns the texture."""
+    if tex is None:
+        tex = glGenTextures(1)
+    glBindTexture(GL_TEXTURE_1D, tex)
+    glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+    glTexParameteri(GL_TEXTURE_1D, GL_TEXTURE_WRAP_S, GL_CLAMP_TO_EDGE)
+    glTexImage1D(GL_TEXTURE_1D, 0, GL_RGBA32F, len(lut), 0, GL_RGBA, GL_FLOAT, lut)
+    glBindTexture(GL_TEXTURE_1D, 0)
+    return tex
+
+
+def bricks(shape, size):
+    """Split the shape (nx, ny, nz) into bricks of the size.
+    
+    Returns:
+        list of (lo, hi) voxel ranges [3] of the bricks
+    """
+    ranges = [[(i, min(i + size, n)) for i in range(0, n, size)] for n in shape]
+    return [(np.array([x[0], y[0], z[0]]), np.array([x[1], y[1], z[1]]))
+            for z in ranges[2] for y in ranges[1] for x in ranges[0]]
+
+
+class Volume(Object):
+    """Volume of a 3D array rendered with ray-marching.
+    
+    The array is uploaded as 3D textures of bricks (with one voxel overlap
+    for seamless interpolation) not to exceed the maximum texture size.
+    The bricks are ray-marched in the fragment shader from back to front
+    and blended in the MALPHA style (the default) as transparent objects.
+    The voxel values are mapped through the window/level and the transfer
+    function (lut), which are changed without sending the data again.
+    
+    >>> vol = Volume(data, spacing=(0.1, 0.1, 0.2), lut=lut)
+    >>> vol.window, vol.level = 1000, 500
+    
+    Args:
+        data    : 3D array [nz,ny,nx] (uint8, uint16, or float)
+        spacing : voxel size (x, y, z) in the logical units
+        lut     : transfer function [n,4] rgba (or [n,3] rgb) in [0, 1]
+        brick   : maximum brick size (None: the maximum texture size)
+    
+    Attributes:
+        window  : width of the values mapped to the lut (default: range of data)
+        level   : center of the values mapped to the lut
+        opacity : opacity per voxel length
+        step    : sampling step in voxels
+    
+    Note:
+        The MWIRE style draws the bounding box of the volume.
+        The rays are not clipped by the depth of opaque objects inside the
+        volume; the bricks behind them are hidden by the depth test.
+    """
+    own_program = True
+    
+    def __init__(self, data, spacing=1, lut=None, brick=None, **kwargs):
+        kwargs.setdefault('style', self.MSOLID | self.MALPHA)
+        super().__init__(**kwargs)
+        self.spacing = np.broadcast_to(np.asarray(spacing, dtype=float), 3).copy()
+        self.brick = brick
+        self.opacity = 1.0
+        self.step = 1.0
+        self.textures = None
+        self._lut_texture = None
+        self.set_data(data)
+        self.set_lut(gray_lut() if lut is None else lut)
+    
+    @property
+    def size(self):
+        """Size (nx, ny, nz) in voxels."""
+        return np.array(self.data.shape[::-1])
+    
+    @property
+    def radius(self):
+        return np.linalg.norm(self.size * self.spacing) / 2
+    
+    def set_data(self, data):
+        """Replace the data (uploaded at the next draw)."""
+        data = np.asarray(data)
+        if data.dtype not in texture_formats:
+            data = data.astype(np.float32)
+        self.data = data
+        lo, hi = float(data.min()), float(data.max())
+        self.window = (hi - lo) or 1.0
+        self.level = (hi + lo) / 2
+        self._dirty = True
+    
+    def set_lut(self, lut):
+        """Replace the transfer function [n,4] (or [n,3] with a ramp alpha)."""
+        self.lut = rgba_lut(lut)
+        self._lut_dirty = True
+    
+    def release(self):
+        """Delete the textures (GL context required)."""
+        if self.textures is not None:
+            glDeleteTextures([tex for tex, *_ in self.textures])
+            self.textures = None
+        if self._lut_texture is not None:
+            glDeleteTextures([self._lut_texture])
+            self._lut_texture = None
+        self._dirty = self._lut_dirty = True
+    
+    def upload(self):
+        if self._dirty:
+            if self.textures is not None:
+                glDeleteTextures([tex for tex, *_ in self.textures])
+            size = glGetIntegerv(GL_MAX_3D_TEXTURE_SIZE) - 2
+            if self.brick:
+                size = min(size, self.brick)
+            fmt, pix, typ, scale = texture_formats[self.data.dtype]
+            shape = self.size
+            glPixelStorei(GL_UNPACK_ALIGNMENT, 1)
+            self.textures = []
+            for lo, hi in bricks(shape, size):
+                t0 = np.maximum(lo - 1, 0)
+                t1 = np.minimum(hi + 1, shape)
+                a = np.ascontiguousarray(self.data[t0[2]:t1[2], t0[1]:t1[1], t0[0]:t1[0]])
+                tex = glGenTextures(1)
+                glBindTexture(GL_TEXTURE_3D, tex)
+                glTexParameteri(GL_TEXTURE_3D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+                glTexParameteri(GL_TEXTURE_3D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
+                for wrap in (GL_TEXTURE_WRAP_S, GL_TEXTURE_WRAP_T, GL_TEXTURE_WRAP_R):
+                    glTexParameteri(GL_TEXTURE_3D, wrap, GL_CLAMP_TO_EDGE)
+                glTexImage3D(GL_TEXTURE_3D, 0, fmt, *(t1 - t0), 0, pix, typ, a)
+                self.textures.append((tex, lo, hi, t0, t1 - t0))
+            glBindTexture(GL_TEXTURE_3D, 0)
+            self._scale = scale
+            self._dirty = False
+        
+        if self._lut_dirty:
+            self._lut_texture = upload_lut(self.lut, self._lut_texture)
+            self._lut_dirty = False
+    
+    def _transform(self):
+        ## voxel coordinates [0, size] centered at the position
+        glScaled(*self.spacing)
+        glTranslated(*(-self.size / 2))
+    
+    def draw_line(self):
+        glPushMatrix()
+        glPushAttrib(GL_ENABLE_BIT)
+        glDisable(GL_LIGHTING)
+        self._transform()
+        draw_box(np.zeros(3), self.size, GL_LINES)
+        glPopAttrib()
+        glPopMatrix()
+    
+    def draw_face(self):
+        self.upload()
+        current = Program.current
+        glPushMatrix()
+        glPushAttrib(GL_ENABLE_BIT | GL_POLYGON_BIT | GL_TEXTURE_BIT | GL_DEPTH_BUFFER_BIT)
+        glDepthMask(GL_FALSE)
+        self._transform()
+        
+        ## bricks from back to front
+        M = np.linalg.inv(glGetDoublev(GL_MODELVIEW_MATRIX).T)
+        P = glGetDoublev(GL_PROJECTION_MATRIX).T
+        items = self.textures
+        if len(items) > 1:
+            c = np.array([(lo + hi) / 2 for tex, lo, hi, *_ in items])
+            if P[3,3] == 0: # perspective
+                d = -np.linalg.norm(c - M[:3,3], axis=1)
+            else:
+                d = c @ M[:3,2]
+            items = [items[i] for i in np.argsort(d, kind='stable')]
+        
+        glEnable(GL_CULL_FACE)
+        glCullFace(GL_FRONT) # the exit points of the rays
+        prog = volume_program
+        prog.use()
+        glUniform1i(prog.uniform('volume'), 0)
+        glUniform1i(prog.uniform('lut'), 1)
+        glUniform1f(prog.uniform('scale'), self._scale)
+        glUniform1f(prog.uniform('window'), self.window)
+        glUniform1f(prog.uniform('level'), self.level)
+        glUniform1f(prog.uniform('opacity'), self.opacity)
+        glUniform1f(prog.uniform('step'), self.step)
+        glUniform1i(prog.uniform('max_steps'), int(np.linalg.norm(self.size) / self.step) + 2)
+        glActiveTexture(GL_TEXTURE1)
+        glBindTexture(GL_TEXTURE_1D, self._lut_texture)
+        glActiveTexture(GL_TEXTURE0)
+        try:
+            for tex, lo, hi, t0, tn in items:
+                glBindTexture(GL_TEXTURE_3D, tex)
+                glUniform3f(prog.uniform('box_lo'), *lo)
+                glUniform3f(prog.uniform('box_hi'), *hi)
+                glUniform3f(prog.uniform('tex_origin'), *t0)
+                glUniform3f(prog.uniform('tex_size'), *tn)
+                draw_box(lo, hi, GL_QUADS)
+        finally:
+            glBindTexture(GL_TEXTURE_3D, 0)
+            glActiveTexture(GL_TEXTURE1)
+            glBindTexture(GL_TEXTURE_1D, 0)
+            glActiveTexture(GL_TEXTURE0)
+            use_program(current)
+            glPopAttrib()
+            glPopMatrix()
+
+
+## Corners (bits x, y, z) of the faces in counter-clockwise order from outside.
+box_faces = [
+    (0, 4, 6, 2), (1, 3, 7, 5), # -x, +x
+    (0, 1, 5, 4), (2, 6, 7, 3), # -y, +y
+    (0, 2, 3, 1), (4, 5, 7, 6), # -z, +z
+]
+
+box_edges = [(i, i | b) for i in range(8) for b in (1, 2, 4) if not i & b]
+
+
+def draw_box(lo, hi, mode=GL_QUADS):
+    """Draw the box [lo, hi] with GL_QUADS or GL_LINES."""
+    c = [[(lo, hi)[i >> k & 1][k] for k in range(3)] for i in range(8)]
+    glBegin(mode)
+    for idx in (box_faces if mode == GL_QUADS else box_edges):
+        for i in idx:
+            glVertex3dv(c[i])
+    glEnd()
+
+
+## --------------------------------
+## Isosurface
+## --------------------------------
+
+## Kuhn decomposition of a cube into six tetrahedra along the diagonal 0-7;
+## the corners (bits x, y, z) of a tetrahedron for each order of the axes.
+tetrahedra = np.array([(0, 1 << a, 1 << a | 1 << b, 7)
+                       for a in range(3) for b in range(3) if a != b])
+
+cube_corners = np.array([(i & 1, i >> 1 & 1, i >> 2 & 1) for i in range(8)])
+
+
+def _tetra_table():
+    """Edges (i, j) of the triangles [16,2,3,2] for the cases of
+    the corners inside [16] (bits), and the number of triangles [16].
+    """
+    edges = np.zeros((16, 2, 3, 2), dtype=int)
+    ntri = np.zeros(16, dtype=int)
+    for case in range(16):
+        ins = [k for k in range(4) if case >> k & 1]
+        outs = [k for k in range(4) if not case >> k & 1]
+        if len(ins) in (1, 3):
+            p, qs = (ins[0], outs) if len(ins) == 1 else (outs[0], ins)
+            edges[case, 0] = [(p, q) for q in qs]
+            ntri[case] = 1
+        elif len(ins) == 2:
+            (a, b), (c, d) = ins, outs
+            edges[case, 0] = (a, c), (a, d), (b, d)
+            edges[case, 1] = (a, c), (b, d), (b, c)
+            ntri[case] = 2
+    return edges, ntri
+
+tetra_edges, tetra_ntri = _tetra_table()
+
+
+def marching_tetrahedra(data, level, gradient=None):
+    """Triangles of the isosurface of the 3D array data[z,y,x] at the level.
+    
+    Each cube of 8 voxels is split into 6 tetrahedra, which have no
+    ambiguous cases; the triangles are made for all the cubes at once.
+    
+    Args:
+        data     : 3D array [nz,ny,nx]
+        level    : threshold; the inside is where the value > level
+        gradient : gradient [nz,ny,nx,3] (x, y, z) for the normals
+    
+    Returns:
+        vertices [M,3,3] (x, y, z) in the voxel index units,
+        normals [M,3,3] pointing outward (None if gradient is None)
+    """
+    a = np.asarray(data, dtype=np.float32)
+    nz, ny, nx = (n - 1 for n in a.shape)
+    if min(nx, ny, nz) < 1:
+        return np.empty((0, 3, 3), np.float32), np.empty((0, 3, 3), np.float32)
+    
+    ## values at the corners of the cubes [nz,ny,nx,8] -> [n,8]
+    v = np.stack([a[z:z+nz, y:y+ny, x:x+nx] for x, y, z in cube_corners], axis=-1)
+    inside = v > level
+    n_in = inside.sum(-1)
+    cells = np.flatnonzero((n_in > 0) & (n_in < 8))
+    v = v.reshape(-1, 8)[cells]
+    inside = inside.reshape(-1, 8)[cells]
+    origin = np.stack(np.unravel_index(cells, (nz, ny, nx))[::-1], axis=-1)
+    
+    ## cases of the tetrahedra [n,6]
+    case = (inside[:, tetrahedra] * [1, 2, 4, 8]).sum(-1)
+    cell, tet = np.nonzero(tetra_ntri[case])
+    case = case[cell, tet]
+    corners = tetrahedra[tet]
+    
+    if gradient is not None:
+        g = np.asarray(gradient, dtype=np.float32)
+    
+    verts, norms = [], []
+    for s in range(2):
+        sel = tetra_ntri[case] > s
+        c, k = cell[sel], corners[sel]
+        e = tetra_edges[case[sel], s] # [m,3,2]
+        i = np.take_along_axis(k, e[..., 0], axis=1) # cube corners [m,3]
+        j = np.take_along_axis(k, e[..., 1], axis=1)
+        vi = v[c[:,None], i]
+        vj = v[c[:,None], j]
+        t = ((level - vi) / (vj - vi))[..., None]
+        pi = origin[c][:,None] + cube_corners[i]
+        pj = origin[c][:,None] + cube_corners[j]
+        verts.append(pi + t * (pj - pi))
+        if gradient is not None:
+            gi = g[pi[..., 2], pi[..., 1], pi[..., 0]]
+            gj = g[pj[..., 2], pj[..., 1], pj[..., 0]]
+            norms.append(-(gi + t * (gj - gi)))
+    vertices = np.concatenate(verts).astype(np.float32)
+    if gradient is None:
+        return vertices, None
+    return vertices, np.concatenate(norms).astype(np.float32)
+
+
+def _block_reduce(a, b, axis, func):
+    """Reduce the ranges [k*b, k*b + b] (overlapping by one) along the axis
+    with the ufunc, e.g. np.minimum. The last range is padded at the end.
+    """
+    a = np.moveaxis(a, axis, 0)
+    n = len(a)
+    k = max(-(-(n - 1) // b), 1) # = len(range(0, max(n - 1, 1), b))
+    a = np.concatenate([a, np.repeat(a[-1:], k * b + 1 - n, axis=0)])
+    core = func.reduce(a[:k*b].reshape((k, b) + a.shape[1:]), axis=1)
+    return np.moveaxis(func(core, a[b::b]), 0, axis)
+
+
+class Isosurface(MeshObject):
+    """Isosurface of a volume drawn as a mesh with the material shade.
+    
+    The volume is divided into blocks of cubes, and the min/max of the
+    blocks is indexed in advance. Only the blocks whose range straddles
+    the level are computed (in parallel in a thread pool), and when the
+    level is changed, only these blocks are computed again; the others
+    are empty at any level between their min and max. When the volume is
+    replaced by one of the same shape, the blocks of the same values
+    (and their neighbors) are kept.
+    
+    >>> iso = Isosurface(vol, 30000, shade=glo.gold)
+    >>> iso.level = 20000 # e.g. from a slider
+    
+    Args:
+        volume  : <Volume> or 3D array [nz,ny,nx]
+        level   : threshold of the surface
+        spacing : voxel size (x, y, z) if volume is an array
+        block   : block size in cubes
+        workers : number of threads (None: default of the pool)
+    
+    Note:
+        The mesh is centered at the position as the <Volume>, which
+        places the voxel centers in the middle of the voxel cells.
+        The triangles are not welded; the normals are the gradients
+        of the volume interpolated at the vertices.
+        Modify a copy of the volume to replace it; the array set
+        (modified in place) is computed again as a whole.
+    """
+    def __init__(self, volume, level, spacing=1, block=32, workers=None, **kwargs):
+        kwargs.setdefault('style', self.MSOLID | self.MSHADE)
+        if isinstance(volume, Volume):
+            spacing = volume.spacing
+            volume = volume.data
+        e = np.empty((0, 3), np.float32)
+        super().__init__(e, e, np.empty((0, 3), np.uint32), **kwargs)
+        self.spacing = np.broadcast_to(np.asarray(spacing, dtype=float), 3).copy()
+        self.block = block
+        self.workers = workers
+        self.data = None
+        self._pool = None
+        self._level = None
+        self._cache = {} # block index -> (vertices, normals) at the level
+        self.set_volume(volume, level)
+    
+    @property
+    def level(self):
+        return self._level
+    
+    @level.setter
+    def level(self, v):
+        self.set_level(v)
+    
+    def set_volume(self, data, level=None):
+        """Replace the volume data and index the min/max of the blocks."""
+        old = self.data
+        self.data = data = np.asarray(data)
+        b = self.block
+        ranges = [range(0, max(n - 1, 1), b) for n in data.shape]
+        self.blocks = np.stack(np.meshgrid(*ranges, indexing='ij'), axis=-1).reshape(-1, 3)
+        lo, hi = data, data
+        for axis in range(3):
+            lo = _block_reduce(lo, b, axis, np.minimum)
+            hi = _block_reduce(hi, b, axis, np.maximum)
+        self.block_min = lo.astype(float).ravel()
+        self.block_max = hi.astype(float).ravel()
+        
+        if level is None:
+            level = self._level
+        if old is None or old is data or old.shape != data.shape or level != self._level:
+            self._cache = {}
+        else:
+            ## Blocks are computed with one voxel more around them,
+            ## so the neighbors of the changed blocks are computed again.
+            changed = data != old
+            for axis in range(3):
+                changed = _block_reduce(changed, b, axis, np.logical_or)
+            grown = changed.copy()
+            for axis in range(3):
+                c = np.moveaxis(changed, axis, 0)
+                g = np.moveaxis(grown, axis, 0)
+                g[1:] |= c[:-1]
+                g[:-1] |= c[1:]
+            for i in np.flatnonzero(grown).tolist():
+                self._cache.pop(i, None)
+        self._level = level
+        self._update_blocks()
+    
+    def _compute(self, i, level):
+        b = self.block
+        z, y, x = self.blocks[i]
+        data = self.data
+        ## one voxel more around the block for the gradient
+        z0, y0, x0 = max(z - 1, 0), max(y - 1, 0), max(x - 1, 0)
+        a = data[z0:z+b+2, y0:y+b+2, x0:x+b+2].astype(np.float32)
+        g = np.stack(np.gradient(a)[::-1], axis=-1) if min(a.shape) > 1 else None
+        oz, oy, ox = z - z0, y - y0, x - x0
+        a = a[oz:oz+b+1, oy:oy+b+1, ox:ox+b+1]
+        if g is not None:
+            g = g[oz:oz+b+1, oy:oy+b+1, ox:ox+b+1] / self.spacing
+        v, n = marching_tetrahedra(a, level, g)
+        if n is None:
+            n = np.zeros_like(v)
+        size = np.array(data.shape[::-1])
+        v = (v + (x, y, z) + (0.5 - size / 2)) * self.spacing
+        v = v.astype(np.float32)
+        
+        ## wind the triangles counter-clockwise seen from the normals
+        fn = np.cross(v[:,1] - v[:,0], v[:,2] - v[:,0])
+        flip = (fn * n.sum(1)).sum(-1) < 0
+        v[flip] = v[flip][:, ::-1]
+        n[flip] = n[flip][:, ::-1]
+        
+        norm = np.sqrt((n * n).sum(-1, keepdims=True))
+        norm[norm == 0] = 1
+        return v, n / norm
+    
+    def set_level(self, level):
+        """Compute the surface at the level from the blocks straddling it."""
+        if level == self._level:
+            return
+        self._level = level
+        self._cache = {}
+        self._update_blocks()
+    
+    def _update_blocks(self):
+        ## Compute the blocks straddling the level not in the cache.
+        level = self._level
+        active = np.flatnonzero((self.block_min <= level) & (level < self.block_max))
+        todo = [i for i in active.tolist() if i not in self._cache]
+        if self._pool is None and len(todo) > 1:
+            self._pool = ThreadPoolExecutor(self.workers)
+        if len(todo) > 1:
+            results = list(self._pool.map(lambda i: self._compute(i, level), todo))
+        else:
+            results = [self._compute(i, level) for i in todo]
+        cache = self._cache
+        cache.update(zip(todo, results))
+        self._cache = {i: cache[i] for i in active.tolist()}
+        self._update_mesh()
+    
+    def _update_mesh(self):
+        blocks = list(self._cache.values())
+        if blocks:
+            v = np.concatenate([v for v, n in blocks])
+            n = np.concatenate([n for v, n in blocks])
+        else:
+            v = n = np.empty((0, 3, 3), np.float32)
+        m = len(v)
+        self.set_data(v.reshape(-1, 3),
+                      n.reshape(-1, 3),
+                      np.arange(3 * m, dtype=np.uint32).reshape(m, 3))
+    
+    def release(self):
+        super().release()
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+            self._pool = None
@@ -0,0 +1,251 @@
+#! python3
+# -*- coding: utf8 -*-
+"""Offscreen GL stream
+
+The platform of PyOpenGL (EGL or OSMesa) is fixed when OpenGL is first
+imported, and the stream selects it when opened. Open the stream before
+importing other GL modules, or set PYOPENGL_PLATFORM={egl, osmesa}
+in the environment.
+"""
+import ctypes
+import os
+import sys
+import numpy as np
+
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD
+
+
+def select_platform(platform=None):
+    """Select the PyOpenGL platform {'egl', 'osmesa'} and import GL.
+    
+    The platform is set in the environment only if OpenGL is not loaded yet;
+    otherwise, it must be the platform already loaded.
+    """
+    platform = platform or os.environ.get('PYOPENGL_PLATFORM') or 'egl'
+    if platform not in ('egl', 'osmesa'):
+        raise ValueError("unsupported offscreen platform: {!r}".format(platform))
+    if 'OpenGL.platform' not in sys.modules:
+        os.environ['PYOPENGL_PLATFORM'] = platform
+    from OpenGL import platform as gl_platform
+    loaded = type(gl_platform.PLATFORM).__name__.lower()
+    if not loaded.startswith(platform):
+        raise RuntimeError("OpenGL is already loaded with {}; open the offscreen "
+                           "stream first or set PYOPENGL_PLATFORM={}".format(
+                           type(gl_platform.PLATFORM).__name__, platform))
+    _import_gl()
+    return platform
+
+
+def _import_gl():
+    global GL, arrays, Camera, RenderQueue, Loader
+    from OpenGL import GL, arrays
+    from .glcamera import Camera
+    from .glrender import RenderQueue
+    from .glloader import Loader
+
+
+def create_egl_context():
+    from OpenGL import EGL
+    try:
+        display = EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+        EGL.eglInitialize(display, ctypes.c_long(), ctypes.c_long())
+    except EGL.EGLError:
+        ## no native display (e.g. a server without X)
+        display = EGL.eglGetPlatformDisplay(EGL_PLATFORM_SURFACELESS_MESA, None, None)
+        EGL.eglInitialize(display, ctypes.c_long(), ctypes.c_long())
+    
+    attribs = arrays.GLintArray.asArray([
+        EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT,
+        EGL.EGL_RED_SIZE, 8,
+        EGL.EGL_GREEN_SIZE, 8,
+        EGL.EGL_BLUE_SIZE, 8,
+        EGL.EGL_ALPHA_SIZE, 8,
+        EGL.EGL_DEPTH_SIZE, 24,
+        EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+        EGL.EGL_NONE,
+    ])
+    configs = (EGL.EGLConfig * 1)()
+    n = ctypes.c_long()
+    if not EGL.eglChooseConfig(display, attribs, configs, 1, n) or not n.value:
+        raise RuntimeError("No EGL config available")
+    EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+    context = EGL.eglCreateContext(display, configs[0], EGL.EGL_NO_CONTEXT, None)
+    EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, context)
+    
+    def destroy():
+        EGL.eglMakeCurrent(display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+        EGL.eglDestroyContext(display, context)
+        EGL.eglTerminate(display)
+    return destroy
+
+
+def create_osmesa_context():
+    from OpenGL import osmesa
+    context = osmesa.OSMesaCreateContextExt(osmesa.OSMESA_RGBA, 24, 0, 0, None)
+    if not context:
+        raise RuntimeError("Failed to create OSMesa context")
+    buffer = arrays.GLubyteArray.zeros((1, 1, 4)) # rendering goes to the FBO
+    osmesa.OSMesaMakeCurrent(context, buffer, GL.GL_UNSIGNED_BYTE, 1, 1)
+    
+    def destroy():
+        osmesa.OSMesaDestroyContext(context)
+    return destroy
+
+
+class offscreen_stream:
+    """The offscreen stream
+    
+    Renders objects into a framebuffer object without any window,
+    e.g., on a GPU-less server with Mesa llvmpipe.
+    
+    >>> view = offscreen_stream((640, 480))
+    >>> view.objects += [glo.Sphere(shade=glo.silver)]
+    >>> rgba = view.render()
+    
+    Attributes:
+        size    : frame size (w, h)
+        camera  : singlet camera model
+        viewports : list <Viewport> in the frame (empty: the whole frame)
+        objects : list <Object> to draw
+        queue   : render queue of objects
+        stats   : <FrameStats> per-frame statistics (None: disabled)
+        loader  : <Loader> of objects in the background
+        background : clear color (r, g, b, a)
+        platform : PyOpenGL platform {'egl', 'osmesa'}
+                   (None: PYOPENGL_PLATFORM or 'egl')
+    """
+    @property
+    def dpu(self):
+        """Dots per unit:logical length."""
+        return self.size[1] / 2 / self.camera.h2_
+    
+    def __init__(self, size=(300, 300), name=None, platform=None):
+        self.name = name
+        self.size = tuple(size)
+        self.platform = platform
+        self._destroy = None
+        self._fbo = None
+        self._rbo = None
+        self.open()
+        self.camera = Camera(self)
+        self.viewports = []
+        self.objects = []
+        self.queue = RenderQueue()
+        self.stats = None
+        self.loader = Loader()
+        self.background = (0, 0, 0, 0)
+    
+    def open(self):
+        """Open stream.
+        Select the platform, create the context and framebuffer,
+        and set GL states.
+        """
+        self.platform = select_platform(self.platform)
+        if self.platform == 'osmesa':
+            self._destroy = create_osmesa_context()
+        else:
+            self._destroy = create_egl_context()
+        
+        ## GLUT is not initialized without its window;
+        ## the models are drawn from NumPy meshes instead.
+        
+        self.resize(*self.size)
+        
+        ## culling
+        GL.glCullFace(GL.GL_BACK)
+        GL.glEnable(GL.GL_CULL_FACE)
+        
+        ## depth test
+        GL.glEnable(GL.GL_DEPTH_TEST)
+        
+        ## standard environ light
+        GL.glEnable(GL.GL_LIGHT0)
+        GL.glEnable(GL.GL_LIGHTING)
+        
+        ## initialize GL context
+        GL.glRenderMode(GL.GL_RENDER)
+        GL.glShadeModel(GL.GL_SMOOTH)
+        
+        ## hints
+        GL.glHint(GL.GL_POLYGON_SMOOTH_HINT, GL.GL_NICEST)
+        GL.glHint(GL.GL_PERSPECTIVE_CORRECTION_HINT, GL.GL_NICEST)
+        GL.glHint(GL.GL_FOG_HINT, GL.GL_NICEST)
+        GL.glHint(GL.GL_LINE_SMOOTH_HINT, GL.GL_NICEST)
+        GL.glHint(GL.GL_POINT_SMOOTH_HINT, GL.GL_NICEST)
+    
+    def close(self):
+        self.loader.shutdown()
+        if self._destroy:
+            if self._fbo is not None:
+                GL.glDeleteFramebuffers(1, [self._fbo])
+                GL.glDeleteRenderbuffers(2, self._rbo)
+                self._fbo = None
+            self._destroy()
+            self._destroy = None
+    
+    def resize(self, w, h):
+        """Resize the framebuffer."""
+        if self._fbo is not None:
+            GL.glDeleteFramebuffers(1, [self._fbo])
+            GL.glDeleteRenderbuffers(2, self._rbo)
+        self._rbo = color, depth = GL.glGenRenderbuffers(2)
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, color)
+        GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, GL.GL_RGBA8, w, h)
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, depth)
+        GL.glRenderbufferStorage(GL.GL_RENDERBUFFER, GL.GL_DEPTH_COMPONENT24, w, h)
+        GL.glBindRenderbuffer(GL.GL_RENDERBUFFER, 0)
+        
+        self._fbo = GL.glGenFramebuffers(1)
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
+        GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, GL.GL_COLOR_ATTACHMENT0, GL.GL_RENDERBUFFER, color)
+        GL.glFramebufferRenderbuffer(GL.GL_FRAMEBUFFER, GL.GL_DEPTH_ATTACHMENT, GL.GL_RENDERBUFFER, depth)
+        status = GL.glCheckFramebufferStatus(GL.GL_FRAMEBUFFER)
+        if status != GL.GL_FRAMEBUFFER_COMPLETE:
+            raise RuntimeError("Framebuffer incomplete: {:#x}".format(status))
+        self.size = (w, h)
+        GL.glViewport(0, 0, w, h) # --> single viewport region
+    
+    def draw(self):
+        pass
+    
+    def load(self, func, *args, **kwargs):
+        """Load an object in the background (see Loader.submit).
+        Returns the <Proxy> added to the objects.
+        """
+        proxy = self.loader.submit(func, *args, **kwargs)
+        self.objects.append(proxy)
+        return proxy
+    
+    def render(self, depth=False):
+        """Render objects and return the frame.
+        
+        Returns:
+            rgba[h,w,4] uint8 array (top row first),
+            and depth[h,w] float32 array if depth is True.
+        """
+        GL.glBindFramebuffer(GL.GL_FRAMEBUFFER, self._fbo)
+        self.loader.poll()
+        GL.glClearColor(*self.background)
+        GL.glClear(GL.GL_COLOR_BUFFER_BIT | GL.GL_DEPTH_BUFFER_BIT)
+        w, h = self.size
+        stats = self.stats
+        if stats is not None:
+            stats.begin_frame(self.queue.state)
+        n = self.queue.render_views(self.objects, self.camera, self.viewports, (w, h), stats)
+        if stats is not None:
+            stats.lap('objects')
+            if stats.overlay:
+                stats.draw_overlay(w, h)
+        rgba = np.empty((h, w, 4), np.uint8)
+        GL.glPixelStorei(GL.GL_PACK_ALIGNMENT, 1)
+        GL.glReadPixels(0, 0, w, h, GL.GL_RGBA, GL.GL_UNSIGNED_BYTE, rgba)
+        if depth:
+            z = np.empty((h, w), np.float32)
+            GL.glReadPixels(0, 0, w, h, GL.GL_DEPTH_COMPONENT, GL.GL_FLOAT, z)
+        if stats is not None:
+            stats.lap('swap') # readback
+            stats.end_frame(self.queue, n)
+        if depth:
+            return rgba[::-1], z[::-1]
+        return rgba[::-1]
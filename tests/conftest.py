@@ -0,0 +1,36 @@
+#! python3
+# -*- coding: utf8 -*-
+"""Test fixtures
+
+GL tests run headless in the offscreen stream (EGL, e.g. Mesa llvmpipe),
+and are skipped if no context can be created.
+"""
+import os
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl') # before importing OpenGL
+
+import pytest
+
+
+@pytest.fixture(scope='session')
+def stream():
+    from .. import offglstream as ogs
+    try:
+        view = ogs.offscreen_stream((64, 64))
+    except Exception as e:
+        pytest.skip("no offscreen GL context: {}".format(e))
+    yield view
+    view.close()
+
+
+@pytest.fixture
+def view(stream):
+    """The offscreen stream reset to the initial state."""
+    from ..glcamera import Camera
+    from ..glrender import RenderQueue
+    stream.camera = Camera(stream)
+    stream.viewports = []
+    stream.objects = []
+    stream.queue = RenderQueue()
+    stream.stats = None
+    stream.background = (0, 0, 0, 0)
+    return stream
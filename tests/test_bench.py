@@ -0,0 +1,27 @@
+#! python3
+# -*- coding: utf8 -*-
+from .. import globject as glo
+from .. import glbench
+
+
+def test_scene_sizes(view):
+    ## All different sizes by default, which must not thrash the cache.
+    objects = glbench.make_scene(1100, model='mixed')
+    assert len({o.size for o in objects}) == len(objects)
+    assert {type(o) for o in objects} == {glo.Sphere, glo.Teapot}
+    glo.geometry_cache.clear()
+    glbench.run(view, objects, frames=2, warmup=1)
+    assert len(glo.geometry_cache) < 32
+    
+    objects = glbench.make_scene(300, sizes=(0.25, 0.5))
+    assert {o.size for o in objects} == {0.25, 0.5}
+
+
+def test_drawable(view):
+    class Empty(glo.Object):
+        def draw_face(self):
+            pass
+    
+    assert glbench.drawable(view, glo.Sphere)
+    assert glbench.drawable(view, glo.Teapot)
+    assert not glbench.drawable(view, Empty)
@@ -0,0 +1,73 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+import pytest
+from OpenGL.GL import *
+
+from .. import globject as glo
+
+
+def read(buf):
+    """Contents of the buffer object as the host array."""
+    buf.bind()
+    raw = glGetBufferSubData(buf.target, 0, buf.data.nbytes)
+    buf.unbind()
+    return np.frombuffer(bytes(raw), buf.data.dtype).reshape(buf.data.shape)
+
+
+@pytest.mark.parametrize('index, rows', [
+    (3,                               (3, 4)),
+    (-2,                              (8, 9)),
+    (slice(2, 5),                     (2, 5)),
+    (slice(6, 1, -2),                 (2, 7)),
+    (np.array([7, 2, 4]),             (2, 8)),
+    (np.array([-1, 5]),               (5, 10)),
+    (np.arange(10) % 4 == 1,          (1, 10)),
+])
+def test_modify(view, index, rows):
+    data = np.arange(30, dtype=np.float32).reshape(10, 3)
+    buf = glo.Buffer(data.copy())
+    read(buf) # uploaded
+    
+    ## The host rows not marked are not sent.
+    values = -np.ones_like(data[index])
+    buf.data[:] += 100
+    buf.modify(values, index)
+    assert buf._range == rows
+    a, b = rows
+    expected = data.copy()
+    expected[a:b] = buf.data[a:b]
+    assert np.array_equal(read(buf), expected)
+    assert np.array_equal(buf.data[index], values)
+    assert buf._range is None
+    buf.release()
+
+
+def test_modify_in_place(view):
+    buf = glo.Buffer(np.zeros((6, 3)))
+    read(buf)
+    buf.data[1:3] = 5
+    buf.modify(None, slice(1, 3))
+    buf.modify(None, 4) # the range from the first to the last
+    assert buf._range == (1, 5)
+    assert np.array_equal(read(buf), buf.data)
+    
+    buf.modify(None, np.zeros(6, bool)) # nothing
+    assert buf._range is None
+    buf.release()
+
+
+def test_mesh_update(view):
+    v, n, f = glo.sphere_mesh(1, 8, 4)
+    mesh = glo.MeshObject(v.copy(), n, f)
+    r = mesh.radius
+    read(mesh.buffers['vertices'])
+    mesh.update(vertices=v[:5] * 2, slice=slice(0, 5))
+    assert mesh.radius == pytest.approx(2 * r)
+    assert np.array_equal(read(mesh.buffers['vertices'])[:5], v[:5] * 2)
+    
+    ## resized arrays are reallocated
+    mesh.set_data(v[:10], n[:10], f[:2])
+    assert np.array_equal(read(mesh.buffers['vertices']), v[:10])
+    mesh.release()
+    assert glGetError() == GL_NO_ERROR
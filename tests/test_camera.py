@@ -0,0 +1,112 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+import pytest
+from OpenGL.GL import *
+from OpenGL.GLU import *
+
+from ..glcamera import Camera, Viewport
+
+
+def make_camera(mode=True, size=(320, 200)):
+    camera = Camera(None)
+    camera.mode = mode
+    camera.screen = list(size)
+    camera.rotate(3.0, -2.0)
+    camera.shift(0.5, 0.25)
+    camera.tilt(0.3)
+    return camera
+
+
+def glu_matrices(camera):
+    """Projection and view matrices of the original GLU calls."""
+    w, h = camera.screen
+    d = camera.depth
+    r = w / h
+    glMatrixMode(GL_PROJECTION)
+    glLoadIdentity()
+    if camera.mode:
+        gluPerspective(np.degrees(camera.fovy_), r, d[0], d[1])
+    else:
+        h2 = camera.h2_
+        glOrtho(-h2 * r, h2 * r, -h2, h2, -d[1], d[1])
+    glMatrixMode(GL_MODELVIEW)
+    glLoadIdentity()
+    e, c, y = camera.eye, camera.lpc, camera.axes[1]
+    gluLookAt(*e, *c, *y)
+    P = glGetDoublev(GL_PROJECTION_MATRIX).T
+    V = glGetDoublev(GL_MODELVIEW_MATRIX).T
+    return P, V
+
+
+@pytest.mark.parametrize('mode', [True, False])
+def test_matrices_glu(view, mode):
+    camera = make_camera(mode)
+    P, V = glu_matrices(camera)
+    assert np.allclose(camera.projection, P, atol=1e-6)
+    assert np.allclose(camera.view, V, atol=1e-6)
+    
+    ## set_view loads the same matrices
+    camera.set_view(*camera.screen)
+    assert np.allclose(glGetDoublev(GL_PROJECTION_MATRIX).T, P, atol=1e-6)
+    assert np.allclose(glGetDoublev(GL_MODELVIEW_MATRIX).T, V, atol=1e-6)
+
+
+@pytest.mark.parametrize('mode', [True, False])
+def test_project_glu(view, mode):
+    camera = make_camera(mode)
+    P, V = glu_matrices(camera)
+    w, h = camera.screen
+    points = np.random.RandomState(0).uniform(-3, 3, (20, 3))
+    expected = [gluProject(*p, V.T, P.T, (0, 0, w, h)) for p in points]
+    assert np.allclose(camera.project(points), expected, atol=1e-6)
+
+
+@pytest.mark.parametrize('mode', [True, False])
+def test_unproject(mode):
+    camera = make_camera(mode)
+    points = np.random.RandomState(1).uniform(-3, 3, (50, 3))
+    q = camera.project(points)
+    assert np.allclose(camera.unproject(q[:,:2], q[:,2]), points, atol=1e-6)
+    ## a single point
+    assert np.allclose(camera.unproject(q[0,:2], q[0,2]), points[0], atol=1e-6)
+
+
+def test_cache():
+    camera = make_camera()
+    M = camera.matrix
+    assert camera.matrix is M # cached
+    camera.zoom(1.5)
+    assert camera.matrix is not M
+    M = camera.matrix
+    camera.depth[1] = 1000 # in place
+    assert camera.matrix is M
+    camera.invalidate()
+    assert camera.matrix is not M
+    assert np.allclose(camera.matrix, camera.projection @ camera.view)
+
+
+@pytest.mark.parametrize('mode', [True, False])
+def test_frustum(mode):
+    ## The points inside the frustum are projected into the screen.
+    camera = make_camera(mode)
+    points = np.random.RandomState(2).uniform(-20, 20, (2000, 3)) + camera.lpc
+    planes = camera.frustum()
+    inside = np.all(points @ planes[:,:3].T + planes[:,3] >= 0, axis=1)
+    q = camera.project(points)
+    w, h = camera.screen
+    visible = ((0 <= q[:,0]) & (q[:,0] <= w) &
+               (0 <= q[:,1]) & (q[:,1] <= h) &
+               (0 <= q[:,2]) & (q[:,2] <= 1))
+    assert inside.any() and not inside.all()
+    assert np.array_equal(inside, visible)
+
+
+def test_viewport():
+    vp = Viewport(None, (0.5, 0, 0.5, 0.5)) # top-right quarter
+    size = (200, 100)
+    assert vp.region(size) == (100, 50, 100, 50)
+    assert vp.contains(size, 150, 25)
+    assert not vp.contains(size, 50, 25)
+    assert not vp.contains(size, 150, 75)
+    assert vp.local(size, 150, 25) == (50, 25)
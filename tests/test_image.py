@@ -0,0 +1,68 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+from ..glimage import ImagePlane, TexturePool, image_lut
+
+
+def test_lut():
+    assert (image_lut()[:,3] == 1).all()
+    assert (image_lut([[0, 0, 0], [1, 0, 0]])[:,3] == 1).all()
+    lut = np.random.RandomState(0).uniform(size=(16, 4))
+    assert np.allclose(image_lut(lut), lut)
+
+
+def test_opaque_gray(view):
+    ## Dark pixels must not be see-through in the MALPHA style.
+    view.background = (1, 1, 1, 1)
+    plane = ImagePlane(size=2, style=glo.Object.MSOLID | glo.Object.MALPHA)
+    frame = np.zeros((8, 8), np.uint8)
+    frame[:, 4:] = 255
+    plane.feed(frame)
+    view.objects = [plane]
+    rgba = view.render()
+    h, w = rgba.shape[:2]
+    assert rgba[h//2, w//2 - 4, :3].max() < 8 # black, not the background
+    assert rgba[h//2, w//2 + 4, :3].min() > 248
+    plane.release()
+
+
+def test_auto_contrast(view):
+    plane = ImagePlane(size=2)
+    view.objects = [plane]
+    plane.feed(np.linspace(100, 200, 64, dtype=np.uint16).reshape(8, 8))
+    view.render()
+    assert plane.auto and (plane.window, plane.level) == (100, 150)
+    
+    ## kept for the frames of the same format
+    plane.feed(np.full((8, 8), 1000, np.uint16))
+    view.render()
+    assert (plane.window, plane.level) == (100, 150)
+    
+    ## fitted again when the format changes
+    plane.feed(np.linspace(0, 1, 64, dtype=np.float32).reshape(8, 8))
+    view.render()
+    assert np.allclose((plane.window, plane.level), (1, 0.5))
+    
+    ## fixed window/level
+    plane.auto = False
+    plane.window, plane.level = 10, 5
+    plane.feed(np.zeros((8, 8), np.uint16))
+    view.render()
+    assert (plane.window, plane.level) == (10, 5)
+    plane.release()
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_texture_pool(view):
+    pool = TexturePool(limit=2)
+    texs = [pool.acquire(4, 4, GL_R8, GL_RED, GL_UNSIGNED_BYTE) for i in range(3)]
+    for tex in texs:
+        pool.release(tex, 4, 4, GL_R8)
+    assert len(pool) == 2
+    assert not glIsTexture(texs[2]) # deleted
+    assert pool.acquire(4, 4, GL_R8, GL_RED, GL_UNSIGNED_BYTE) == texs[1]
+    pool.clear()
+    assert len(pool) == 0
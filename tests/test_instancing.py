@@ -0,0 +1,31 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+
+
+def test_instanced_spheres(view):
+    pos = np.array([[-1, 0, 0], [1, 0, 0]], np.float32)
+    batch = glo.InstancedSpheres(pos, size=0.5, shade=glo.silver)
+    view.objects = [batch]
+    rgba = view.render()
+    h, w = rgba.shape[:2]
+    assert rgba[h//2, w//2 - 10, :3].any()      # left instance
+    assert rgba[h//2, w//2 + 10, :3].any()      # right instance
+    assert not rgba[h//2, w//2, :3].any()       # gap between them
+    assert glGetIntegerv(GL_ARRAY_BUFFER_BINDING) == 0
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_client_arrays_after_instances(view):
+    ## The attribute buffer left bound made the client arrays that follow
+    ## read as offsets into it.
+    batch = glo.InstancedSpheres(np.zeros((1, 3), np.float32), size=0.5)
+    view.objects = [batch]
+    view.render()
+    view.objects = [glo.Sphere(size=0.5, shade=glo.silver)]
+    rgba = view.render()
+    assert rgba[..., :3].any()
+    assert glGetError() == GL_NO_ERROR
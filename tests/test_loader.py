@@ -0,0 +1,129 @@
+#! python3
+# -*- coding: utf8 -*-
+import threading
+import time
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+from ..glloader import Loader
+
+
+def wait(cond, timeout=5):
+    t = time.perf_counter() + timeout
+    while not cond():
+        assert time.perf_counter() < t, "timeout"
+        time.sleep(0.01)
+
+
+def test_loader(view):
+    event = threading.Event()
+    def make():
+        event.wait(5)
+        return glo.sphere_mesh(0.5, 8, 4)
+    
+    def fail():
+        event.wait(5)
+        return 1 / 0
+    
+    proxy = view.load(make)
+    failed = view.load(fail)
+    view.render()
+    assert proxy.loading and proxy in view.queue.loading
+    assert not proxy.ready # made by the loader poll
+    
+    event.set()
+    wait(lambda: view.loader._done.qsize() == 2)
+    assert view.loader.poll() == 2 # one redraw requested
+    assert proxy.status == 'ready' and isinstance(proxy.target, glo.MeshObject)
+    assert failed.status == 'failed' and isinstance(failed.error, ZeroDivisionError)
+    assert view.loader.pending == 0
+    assert view.loader.poll() == 0
+    rgba = view.render()
+    assert rgba[..., :3].any()
+    assert not view.queue.loading
+
+
+def test_cancel():
+    loader = Loader(workers=1)
+    event = threading.Event()
+    a = loader.submit(event.wait, 5)
+    b = loader.submit(event.wait, 5)
+    assert b.cancel() and not b.loading
+    event.set()
+    wait(lambda: a.future.done())
+    assert loader.poll() == 1
+    assert b.status == 'cancelled' and loader.pending == 0
+    loader.shutdown()
+
+
+def test_point_cloud_ready(view):
+    points = np.random.RandomState(0).uniform(-1, 1, (5000, 3))
+    cloud = glo.PointCloud(points, chunk=1024, block=256, budget=1024 * 12)
+    view.objects = [cloud]
+    assert cloud.loading and not cloud.ready # not started until drawn
+    n = 0
+    while cloud.loading:
+        view.render()
+        assert cloud in view.queue.loading or not cloud.loading
+        wait(lambda: cloud.ready or not cloud.loading)
+        n += 1
+    assert len(cloud) == 5000 and n > 1
+    view.render()
+    assert not view.queue.loading
+
+
+def test_point_cloud_memmap(view, tmp_path):
+    rs = np.random.RandomState(1)
+    points = np.lib.format.open_memmap(str(tmp_path / 'points.npy'), 'w+', np.float32, (10000, 3))
+    points[:] = rs.uniform(-1, 1, points.shape)
+    points.flush()
+    points = np.load(str(tmp_path / 'points.npy'), mmap_mode='r')
+    cloud = glo.PointCloud(points, chunk=1024, block=256, budget=1024 * 12)
+    
+    def load():
+        counts = []
+        while cloud.loading:
+            cloud.upload()
+            counts.append(len(cloud))
+            wait(lambda: cloud.ready or not cloud.loading)
+        return counts
+    
+    ## The count grows by a chunk (within the budget) per upload.
+    counts = load()
+    assert len(counts) > 2 and counts[-1] == 10000
+    assert all(a < b for a, b in zip(counts, counts[1:]))
+    assert counts[0] == 1024
+    view.objects = [cloud]
+    rgba = view.render()
+    assert rgba[..., :3].any()
+    
+    ## loaded again after released
+    vbos = [vbo for n, b in cloud._uploaded for vbo in b.values()]
+    cloud.release()
+    assert len(cloud) == 0 and cloud.loading
+    assert not any(glIsBuffer(vbo) for vbo in vbos)
+    counts = load()
+    assert len(counts) > 2 and counts[-1] == 10000
+    assert np.array_equal(view.render(), rgba)
+    cloud.release()
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_proxy_own_program(view):
+    ## Transparent objects of their own programs are not drawn by OIT.
+    points = np.random.RandomState(2).uniform(-1, 1, (500, 3))
+    style = glo.Object.MDOT | glo.Object.MALPHA
+    def make():
+        return glo.PointCloud(points, shade=(1, 1, 1, 0.5), style=style)
+    proxy = view.load(make)
+    assert not proxy.own_program # no placeholder
+    wait(lambda: view.loader._done.qsize() == 1)
+    view.loader.poll()
+    assert proxy.status == 'ready' and proxy.own_program
+    view.queue.transparency = 'oit'
+    while proxy.loading:
+        view.render()
+    assert view.render()[..., :3].any()
+    proxy.target.release()
+    assert glGetError() == GL_NO_ERROR
@@ -0,0 +1,177 @@
+#! python3
+# -*- coding: utf8 -*-
+import os
+import numpy as np
+import pytest
+
+from .. import glmeshio
+
+
+## A cube of 6 quads (outward CCW), and the triangles of its fans.
+cube_vertices = np.array([
+    [0,0,0], [1,0,0], [1,1,0], [0,1,0],
+    [0,0,1], [1,0,1], [1,1,1], [0,1,1],
+], np.float32)
+
+cube_quads = [
+    [0,3,2,1], [4,5,6,7], [0,1,5,4],
+    [2,3,7,6], [1,2,6,5], [0,4,7,3],
+]
+
+
+def fans(polygons):
+    return np.array([[p[0], p[k], p[k+1]] for p in polygons for k in range(1, len(p) - 1)])
+
+
+def write_ply(path, vertices, polygons, fmt='binary_little_endian', extra=False):
+    endian = '<' if fmt == 'binary_little_endian' else '>'
+    header = [
+        'ply', 'format {} 1.0'.format(fmt),
+        'element vertex {}'.format(len(vertices)),
+        'property float x', 'property float y', 'property float z',
+        'element face {}'.format(len(polygons)),
+        'property list uchar int vertex_indices',
+    ]
+    if extra:
+        header.append('property uchar flags')
+    header.append('end_header')
+    with open(path, 'wb') as o:
+        o.write(('\n'.join(header) + '\n').encode())
+        if fmt == 'ascii':
+            for v in vertices:
+                o.write('{} {} {}\n'.format(*v).encode())
+            for p in polygons:
+                o.write((' '.join(map(str, [len(p)] + list(p) + [7] * extra)) + '\n').encode())
+        else:
+            o.write(np.asarray(vertices, endian + 'f4').tobytes())
+            for p in polygons:
+                o.write(np.uint8(len(p)).tobytes())
+                o.write(np.asarray(p, endian + 'i4').tobytes())
+                if extra:
+                    o.write(np.uint8(7).tobytes())
+
+
+def test_obj(tmp_path):
+    path = str(tmp_path / 'cube.obj')
+    with open(path, 'w') as o:
+        o.write("# cube\n")
+        for v in cube_vertices:
+            o.write("v {} {} {}\n".format(*v))
+        for p in cube_quads:
+            o.write("f {}\n".format(' '.join("{}//1".format(i + 1) for i in p)))
+    mesh = glmeshio.read_obj(path)
+    assert np.array_equal(mesh['vertices'], cube_vertices)
+    assert np.array_equal(mesh['faces'], fans(cube_quads))
+    assert mesh['faces'].dtype == np.uint32
+    
+    ## outward normals of the corner (0,0,0)
+    assert np.allclose(mesh['normals'][0], -np.ones(3) / np.sqrt(3), atol=1e-6)
+
+
+def test_obj_relative(tmp_path):
+    ## Negative indices count back from the vertices read so far.
+    path = str(tmp_path / 'rel.obj')
+    with open(path, 'w') as o:
+        o.write("v 0 0 0\nv 1 0 0\nv 0 1 0\n")
+        o.write("f -3 -2 -1\n")
+        o.write("v 1 1 0\nv 2 1 0\n")
+        o.write("f -3 -2 -1\n")
+        o.write("f 1 2 -1\n")
+    mesh = glmeshio.read_obj(path)
+    assert np.array_equal(mesh['faces'], [[0,1,2], [2,3,4], [0,1,4]])
+
+
+@pytest.mark.parametrize('fmt', ['ascii', 'binary_little_endian', 'binary_big_endian'])
+@pytest.mark.parametrize('extra', [False, True])
+def test_ply(tmp_path, fmt, extra):
+    ## mixed triangles and quads
+    polygons = cube_quads[:2] + [[0,1,5], [0,5,4]] + cube_quads[3:]
+    path = str(tmp_path / 'cube.ply')
+    write_ply(path, cube_vertices, polygons, fmt, extra)
+    mesh = glmeshio.read_ply(path)
+    assert np.array_equal(mesh['vertices'], cube_vertices)
+    assert np.array_equal(mesh['faces'], fans(polygons))
+
+
+@pytest.mark.parametrize('extra', [False, True])
+def test_ply_triangles(tmp_path, monkeypatch, extra):
+    ## Triangles are read as records without scanning the lists.
+    path = str(tmp_path / 'tri.ply')
+    write_ply(path, cube_vertices, fans(cube_quads), extra=extra)
+    monkeypatch.setattr(glmeshio, '_ply_list_offsets', None)
+    monkeypatch.setattr(glmeshio, 'struct', None)
+    mesh = glmeshio.read_ply(path)
+    assert np.array_equal(mesh['faces'], fans(cube_quads))
+
+
+def test_ply_list_offsets():
+    rs = np.random.RandomState(0)
+    polygons = [rs.randint(100, size=rs.randint(3, 7)) for i in range(1000)]
+    buf = b'head' + b''.join(np.uint8(len(p)).tobytes() + p.astype('<i4').tobytes()
+                             for p in polygons)
+    starts, sizes = glmeshio._ply_list_offsets(buf, 4, len(polygons), '<u1', 'i4')
+    assert np.array_equal(sizes, [len(p) for p in polygons])
+    assert starts[0] == 5
+    assert np.array_equal(np.diff(starts), 1 + 4 * sizes[:-1])
+    with pytest.raises(ValueError):
+        glmeshio._ply_list_offsets(buf[:-1], 4, len(polygons), '<u1', 'i4')
+    
+    ## with other properties, in small windows of the data
+    buf = b'head' + b''.join(np.int16(-1).tobytes() + np.int8(len(p)).tobytes()
+                             + p.astype('<i4').tobytes() + np.float32(0).tobytes()
+                             for p in polygons) + b'tail'
+    for window in (64, 1000, 1<<18):
+        s, n = glmeshio._ply_list_offsets(buf, 4, len(polygons), '<i1', 'i4',
+                                          pre=2, post=4, step=4, window=window)
+        assert np.array_equal(n, sizes)
+        assert np.array_equal(s, starts + 6 * np.arange(len(polygons)) + 2)
+    buf = bytearray(buf)
+    buf[4 + 2] = 0xff # -1
+    with pytest.raises(ValueError):
+        glmeshio._ply_list_offsets(bytes(buf), 4, len(polygons), '<i1', 'i4', pre=2, post=4)
+
+
+def test_stl(tmp_path):
+    tri = cube_vertices[fans(cube_quads)]
+    path = str(tmp_path / 'cube.stl')
+    with open(path, 'wb') as o:
+        rec = np.zeros(len(tri), glmeshio.stl_dtype)
+        rec['vertices'] = tri
+        o.write(b'\0' * 80 + np.uint32(len(tri)).tobytes() + rec.tobytes())
+    mesh = glmeshio.read_stl(path)
+    assert np.array_equal(mesh['vertices'], tri.reshape(-1, 3))
+    assert len(mesh['faces']) == len(tri)
+    
+    path = str(tmp_path / 'cube-ascii.stl')
+    with open(path, 'w') as o:
+        o.write("solid cube\n")
+        for t in tri:
+            o.write("facet normal 0 0 0\nouter loop\n")
+            for v in t:
+                o.write("vertex {} {} {}\n".format(*v))
+            o.write("endloop\nendfacet\n")
+        o.write("endsolid cube\n")
+    ascii = glmeshio.read_stl(path)
+    assert np.array_equal(ascii['vertices'], mesh['vertices'])
+    assert np.allclose(ascii['normals'], mesh['normals'])
+
+
+def test_cache(tmp_path):
+    path = str(tmp_path / 'cube.ply')
+    write_ply(path, cube_vertices, cube_quads)
+    mesh = glmeshio.read_mesh(path)
+    assert os.path.isdir(glmeshio.cache_path(path))
+    cached = glmeshio.read_mesh(path)
+    assert isinstance(cached['vertices'], np.memmap)
+    for name in mesh:
+        assert np.array_equal(cached[name], mesh[name])
+    
+    ## stale after the source is changed
+    write_ply(path, cube_vertices + 1, cube_quads)
+    st = os.stat(path)
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns + 10**9))
+    assert glmeshio.read_cache(path) is None
+    assert np.array_equal(glmeshio.read_mesh(path)['vertices'], cube_vertices + 1)
+    
+    with pytest.raises(ValueError):
+        glmeshio.read_mesh(str(tmp_path / 'cube.xyz'))
@@ -0,0 +1,169 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+import pytest
+
+from .. import globject as glo
+from ..glpick import BVH, Picker
+from ..glscene import Node, SceneGraph
+
+
+def brute_raycast(centers, radii, o, v):
+    p = centers - o
+    a = v @ v
+    b = p @ v
+    c = (p * p).sum(1) - radii ** 2
+    D = b * b - a * c
+    hit = (D >= 0) & (radii >= 0)
+    s = np.sqrt(np.where(hit, D, 0))
+    t = np.where(b - s >= 0, b - s, b + s) / a
+    t = np.where(hit & (t >= 0), t, np.inf)
+    if not t.size:
+        return -1, np.inf
+    i = np.argmin(t)
+    return (i, t[i]) if np.isfinite(t[i]) else (-1, np.inf)
+
+
+def random_spheres(n, seed=0):
+    rs = np.random.RandomState(seed)
+    return rs.uniform(-10, 10, (n, 3)), rs.uniform(0.05, 0.5, n)
+
+
+def random_rays(n, seed=1):
+    rs = np.random.RandomState(seed)
+    o = rs.uniform(-15, 15, (n, 3))
+    v = rs.uniform(-10, 10, (n, 3)) - o
+    return o, v
+
+
+def check_rays(bvh, centers, radii, n=100):
+    for o, v in zip(*random_rays(n)):
+        i, t = bvh.raycast(o, v)
+        j, s = brute_raycast(centers, radii, o, v)
+        assert np.isclose(t, s) if np.isfinite(s) else not np.isfinite(t)
+        assert i == j or np.isclose(t, s)
+
+
+@pytest.mark.parametrize('n', [0, 1, 7, 100, 1000])
+def test_raycast(n):
+    c, r = random_spheres(n)
+    bvh = BVH(c, r, leaf_size=4)
+    check_rays(bvh, c, r)
+
+
+def test_query():
+    c, r = random_spheres(1000)
+    bvh = BVH(c, r)
+    rs = np.random.RandomState(2)
+    for k in range(20):
+        n = rs.normal(size=(4, 3))
+        n /= np.linalg.norm(n, axis=1)[:,None]
+        planes = np.hstack([n, rs.uniform(-2, 8, (4, 1))])
+        inside = np.flatnonzero((c @ n.T + planes[:,3] >= 0).all(1))
+        assert np.array_equal(bvh.query(planes), inside)
+
+
+def test_refit_moved():
+    ## Refitting the moved spheres gives the boxes of a full refit.
+    c, r = random_spheres(1000)
+    bvh = BVH(c, r)
+    moved = np.random.RandomState(3).choice(1000, 30, replace=False)
+    c[moved] += 5
+    r[moved[:10]] = -1 # hidden
+    bvh.refit(moved=moved)
+    lo, hi = bvh.lo.copy(), bvh.hi.copy()
+    bvh.refit(c, r)
+    assert np.array_equal(lo, bvh.lo) and np.array_equal(hi, bvh.hi)
+    check_rays(bvh, c, r)
+
+
+def sphere_state(picker):
+    return picker.centers.copy(), picker.radii.copy()
+
+
+def test_picker_update():
+    rs = np.random.RandomState(4)
+    free = [glo.Sphere(pos=p, size=0.3) for p in rs.uniform(-10, 10, (200, 3))]
+    nodes = [Node(pos=p, objects=[glo.Sphere(size=0.2)]) for p in rs.uniform(-10, 10, (50, 3))]
+    graph = SceneGraph(*nodes)
+    objects = free + [graph, glo.Object()] # infinite radius
+    graph.update()
+    
+    picker = Picker(leaf_size=4)
+    picker.update(objects)
+    bvh = picker.bvh
+    assert len(picker.items) == 251
+    
+    ## moved by assigning pos, by the node, in place, and hidden
+    free[0].pos = np.array([1, 2, 3.0])
+    nodes[0].pos = (4, 5, 6)
+    graph.update()
+    free[1].pos += 1
+    free[2].size = 2
+    free[3].visible = False
+    picker.moved(free[1], free[2])
+    picker.update(objects)
+    assert picker.bvh is bvh # refit, not built
+    
+    fresh = Picker(leaf_size=4)
+    fresh.update(objects)
+    c, r = sphere_state(fresh)
+    assert np.array_equal(picker.centers, c)
+    assert np.array_equal(picker.radii, r)
+    assert r[3] < 0 and r[-1] < 0
+    check_rays(picker.bvh, c, r)
+    
+    ## a new list of objects builds the tree again
+    objects = objects[1:]
+    picker.update(objects)
+    assert picker.bvh is not bvh
+    assert free[0] not in picker.items
+
+
+def test_pick(view):
+    a = glo.Sphere(pos=(0, 0, 0), size=0.5)
+    b = glo.Sphere(pos=(0, 0, 2), size=0.5) # in front of a
+    c = glo.Sphere(pos=(3, 0, 0), size=0.5)
+    picker = Picker()
+    picker.update([a, b, c])
+    camera = view.camera
+    camera.screen = [200, 200]
+    x, y, _ = camera.project([[0, 0, 0]])[0]
+    assert picker.pick(camera, x, 200 - y) is b
+    b.visible = False
+    picker.update([a, b, c])
+    assert picker.pick(camera, x, 200 - y) is a
+    assert picker.pick(camera, 0, 0) is None
+    assert picker.pick_rect(camera, 0, 0, 200, 200) == [a, c]
+
+
+def test_picker_watch(monkeypatch):
+    ## Nothing is read per object unless the objects are changed.
+    rs = np.random.RandomState(5)
+    objects = glo.ObjectList(glo.Sphere(pos=p, size=0.3) for p in rs.uniform(-10, 10, (100, 3)))
+    picker = Picker()
+    picker.update(objects)
+    bvh = picker.bvh
+    reads = []
+    read = picker._read
+    monkeypatch.setattr(picker, '_read', lambda rows: reads.append(rows) or read(rows))
+    picker.update(objects)
+    assert not reads
+    
+    objects[5].pos = (1, 2, 3)
+    objects[7].visible = False
+    picker.update(objects)
+    assert picker.bvh is bvh and len(reads) == 1
+    assert np.array_equal(reads[0], [5, 7])
+    assert np.array_equal(picker.centers[5], (1, 2, 3)) and picker.radii[7] < 0
+    
+    ## the list changed in place is built again
+    old = objects.pop(0)
+    picker.update(objects)
+    assert picker.bvh is not bvh and old not in picker.items
+    assert not old.watchers
+    assert [w[1] for w in objects[0].watchers] == [0]
+    fresh = Picker()
+    fresh.update(list(objects))
+    assert np.array_equal(picker.centers, fresh.centers)
+    assert np.array_equal(picker.radii, fresh.radii)
@@ -0,0 +1,45 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+from ..glrender import RenderQueue
+from ..glprofile import FrameStats
+
+
+def test_ring_buffer():
+    stats = FrameStats(capacity=4)
+    stats._queries = False # no GPU timer
+    queue = RenderQueue()
+    for n in range(6):
+        stats.begin_frame(queue.state)
+        stats.lap('view')
+        stats.end_frame(queue, n)
+    assert len(stats) == 4
+    assert list(stats['drawn']) == [2, 3, 4, 5]
+    assert np.all(stats['frame'] >= stats['view'])
+    assert np.all(np.diff(stats['time']) > 0)
+    stats.clear()
+    assert len(stats) == 0
+    assert stats['drawn'].size == 0
+
+
+def test_gpu_time(view):
+    view.objects = [glo.Sphere(shade=glo.silver)]
+    view.stats = stats = FrameStats(capacity=3, timing=False)
+    for i in range(8):
+        view.render()
+        glFinish()
+    assert glGetError() == GL_NO_ERROR
+    gpu = stats['gpu']
+    gpu = gpu[~np.isnan(gpu)]
+    assert gpu.size and np.all(gpu > 0) and np.all(gpu < 10)
+    
+    ## The results of the frames cleared are discarded.
+    stats.clear()
+    view.render()
+    glFinish()
+    view.render()
+    assert len(stats) == 2
+    assert glGetError() == GL_NO_ERROR
@@ -0,0 +1,80 @@
+#! python3
+# -*- coding: utf8 -*-
+import threading
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+from ..glrecord import FrameCapture, Recorder
+
+
+def test_snapshot(view):
+    capture = FrameCapture()
+    view.objects = [glo.Sphere(size=0.5, shade=glo.silver)]
+    rgba = view.render()
+    w, h = view.size
+    f = capture.snapshot()
+    assert capture.active and not f.done()
+    capture(w, h) # the frame drawn
+    assert not capture.active
+    while capture.poll():
+        pass
+    assert np.array_equal(f.result(timeout=1), rgba)
+
+    ## a snapshot taken after the frame waits for the next one
+    g = capture.snapshot()
+    view.background = (1, 0, 0, 1)
+    rgba2 = view.render()
+    assert not g.done()
+    capture(w, h)
+    while capture.poll():
+        pass
+    assert np.array_equal(g.result(timeout=1), rgba2)
+    assert not np.array_equal(rgba2, rgba)
+    capture.reader.release()
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_recorder_drops():
+    entered = threading.Event()
+    release = threading.Event()
+    written = []
+    def sink(frame, index):
+        entered.set()
+        release.wait(5)
+        written.append(index)
+
+    rec = Recorder(sink, maxsize=2).start()
+    frames = [np.full((2, 2, 4), i, np.uint8) for i in range(6)]
+    assert rec.push(frames[0])
+    assert entered.wait(5) # the writer is busy with the first frame
+    results = [rec.push(frame) for frame in frames[1:]]
+    assert results == [True, True, False, False, False]
+    assert rec.dropped == 3
+    release.set()
+    rec.stop()
+    assert rec.frames == 3 and written == [0, 1, 2]
+
+
+def test_record(view):
+    ## The frames drawn are pushed to the recorder without blocking.
+    release = threading.Event()
+    frames = []
+    def sink(frame, index):
+        release.wait(5)
+        frames.append(frame)
+
+    capture = FrameCapture()
+    recorder = capture.record(sink, maxsize=1)
+    w, h = view.size
+    for i in range(6):
+        view.background = (i / 8, 0, 0, 1)
+        view.render()
+        capture(w, h)
+        capture.poll()
+    release.set()
+    assert capture.stop() is recorder
+    assert recorder.frames + recorder.dropped == 6
+    assert recorder.dropped > 0
+    assert all(f.shape == (h, w, 4) for f in frames)
+    capture.reader.release()
@@ -0,0 +1,158 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+
+
+def transparent_scene():
+    style = glo.Object.MSOLID | glo.Object.MSHADE | glo.Object.MALPHA
+    return [
+        glo.Sphere(pos=(0, 0, -1), size=0.8, shade=glo.silver,
+                   style=glo.Object.MSOLID | glo.Object.MSHADE),
+        glo.Sphere(pos=(0, 0, 1), size=0.5, shade=glo.ruby.set_alpha(0.5), style=style),
+    ]
+
+
+def test_oit_offscreen(view):
+    ## The OIT pass must draw back to the offscreen FBO, not to 0.
+    view.objects = transparent_scene()
+    view.queue.transparency = 'sorted'
+    a = view.render().astype(int)
+    view.queue.transparency = 'oit'
+    b = view.render().astype(int)
+    assert glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING) == view._fbo
+    assert b[..., :3].any()
+    h, w = b.shape[:2]
+    assert np.abs(a[h//2, w//2, :3] - b[h//2, w//2, :3]).max() < 32
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_oit_failure(view):
+    class Broken(glo.Sphere):
+        def draw_face(self):
+            raise ValueError
+    
+    view.objects = [Broken(shade=glo.ruby.set_alpha(0.5),
+                           style=glo.Object.MSOLID | glo.Object.MSHADE | glo.Object.MALPHA)]
+    view.queue.transparency = 'oit'
+    try:
+        view.render()
+    except ValueError:
+        pass
+    assert glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING) == view._fbo
+    assert glGetBooleanv(GL_DEPTH_WRITEMASK)
+
+
+def test_viewports(view):
+    from ..glcamera import Camera, Viewport
+    from ..glprofile import FrameStats
+    objects = [glo.Sphere(pos=(x, 0, 0), size=0.3, shade=glo.silver) for x in (-1, 0, 1)]
+    away = Camera(view)
+    away.shift(0, 50) # nothing in the view
+    view.viewports = [Viewport(Camera(view), (0, 0, 0.5, 1)),
+                      Viewport(away, (0.5, 0, 0.5, 1))]
+    view.objects = objects
+    view.stats = stats = FrameStats(timing=False)
+    rgba = view.render()
+    w = rgba.shape[1]
+    assert rgba[:, :w//2, :3].any()
+    assert not rgba[:, w//2:, :3].any()
+    assert stats['drawn'][-1] == 3
+    assert stats['culled'][-1] == 3 # summed over the viewports
+    assert np.isfinite(stats['view'][-1]) and np.isfinite(stats['objects'][-1])
+    assert not glIsEnabled(GL_SCISSOR_TEST)
+    assert tuple(glGetIntegerv(GL_VIEWPORT)) == (0, 0) + view.size
+
+
+def test_oit_own_program(view):
+    ## Volumes are ray-marched by their own program, not accumulated by OIT.
+    from ..glvolume import Volume
+    data = np.zeros((16, 16, 16), np.uint8)
+    data[4:12, 4:12, 4:12] = 200
+    vol = Volume(data, spacing=2 / 16)
+    vol.opacity = 20
+    view.objects = [vol]
+    view.queue.transparency = 'sorted'
+    a = view.render().astype(int)
+    view.queue.transparency = 'oit'
+    b = view.render().astype(int)
+    assert a[..., :3].any()
+    assert np.abs(a - b).max() <= 1
+    assert glGetError() == GL_NO_ERROR
+    
+    ## with the objects accumulated by OIT
+    view.objects = transparent_scene() + [vol]
+    b = view.render()
+    assert glGetIntegerv(GL_DRAW_FRAMEBUFFER_BINDING) == view._fbo
+    assert glGetError() == GL_NO_ERROR
+
+
+def test_geometry_cache_sizes(view):
+    ## The geometry is compiled at the unit size, not per size.
+    rs = np.random.RandomState(0)
+    glo.geometry_cache.clear()
+    style = glo.Object.MSOLID | glo.Object.MWIRE | glo.Object.MSHADE
+    view.objects = [cls(pos=p, size=s, shade=glo.silver, style=style)
+                    for cls in (glo.Sphere, glo.Teapot)
+                    for p, s in zip(rs.uniform(-3, 3, (200, 3)), rs.uniform(0.05, 0.5, 200))]
+    view.render()
+    assert len(glo.geometry_cache) <= 2 * (len(glo.Sphere.levels) + 1)
+    
+    ## The normals are rescaled: the same shading as the mesh of the size.
+    style = glo.Object.MSOLID | glo.Object.MSHADE
+    for size in (0.4, 0.8):
+        obj = glo.Sphere(size=size, shade=glo.silver, style=style)
+        obj.lod = None
+        view.objects = [obj]
+        a = view.render().astype(int)
+        view.objects = [glo.MeshObject(*glo.sphere_mesh(size, 36, 18), shade=glo.silver, style=style)]
+        b = view.render().astype(int)
+        assert np.abs(a - b).max() <= 2
+
+
+def test_phong_materials(view, monkeypatch):
+    ## Shaded, colored, and transparent objects in the phong pipeline.
+    from ..glshader import phong_program
+    materials = phong_program.materials
+    packed = []
+    def pack(m, row):
+        packed.append(m)
+        row[:] = np.array([m.ambient, m.diffuse, m.specular, [m.shininess] * 4])
+    monkeypatch.setattr(materials, 'pack', pack)
+    
+    shaded = glo.Material([0.2, 0, 0, 1], [0.8, 0, 0, 1], [0, 0, 0, 1], 10)
+    view.objects = [
+        glo.Sphere(pos=(-1.2, 0, 0), size=0.5, shade=shaded,
+                   style=glo.Object.MSOLID | glo.Object.MSHADE),
+        glo.Sphere(pos=(0, 0, 0), size=0.5, shade=(0, 1, 0, 1),
+                   style=glo.Object.MSOLID | glo.Object.MSHADE | glo.Object.MRGBA),
+        glo.Sphere(pos=(1.2, 0, 0), size=0.5, shade=glo.blue.set_alpha(0.5),
+                   style=glo.Object.MSOLID | glo.Object.MSHADE | glo.Object.MALPHA),
+    ]
+    view.background = (1, 1, 1, 1)
+    view.queue.pipeline = 'phong'
+    rgba = view.render().astype(int)
+    camera = view.camera
+    h, w = rgba.shape[:2]
+    (x0, y0, _), (x1, y1, _), (x2, y2, _) = camera.project([[-1.2, 0, 0], [0, 0, 0], [1.2, 0, 0]])
+    pixel = lambda x, y: rgba[h - 1 - int(y), int(x), :3]
+    r, g, b = pixel(x0, y0)
+    assert r > 64 and g < 16 and b < 16
+    r, g, b = pixel(x1, y1)
+    assert g > 64 and r < 16 and b < 16
+    r, g, b = pixel(x2, y2) # blended with the white background
+    assert b > 200 and 64 < r < 224 and r == g
+    assert pixel(0, 0).min() == 255
+    
+    ## Only the materials changed are packed again.
+    del packed[:]
+    view.render()
+    assert not packed
+    shaded.diffuse = np.array([0, 0, 0.8, 1], np.float32)
+    rgba = view.render().astype(int)
+    assert packed == [shaded]
+    r, g, b = pixel(x0, y0)
+    assert b > 64 and r < 64
+    assert glGetError() == GL_NO_ERROR
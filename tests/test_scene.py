@@ -0,0 +1,96 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+
+from .. import globject as glo
+from ..glpick import Picker
+from ..glscene import Node, SceneGraph, rotation_matrix
+
+
+def test_world_matrices():
+    rs = np.random.RandomState(0)
+    leaf = Node(pos=(0, 1, 0), rotation=rotation_matrix((1, 1, 0), 0.3), scale=0.5,
+                objects=[glo.Sphere()])
+    mid = Node(pos=(1, 0, 0), rotation=rotation_matrix((0, 0, 1), 0.7), children=[leaf])
+    root = Node(pos=(0, 0, 2), scale=2, children=[mid])
+    graph = SceneGraph(root)
+    graph.update()
+    W = root.local @ mid.local @ leaf.local
+    assert np.allclose(leaf.world, W)
+    assert np.allclose(graph.positions, [W[:3,3]])
+    assert np.allclose(leaf.objects[0].pos, W[:3,3]) # bound to the world
+    
+    ## moving a node updates its subtree
+    mid.rotate((0, 1, 0), 0.5)
+    graph.update()
+    W = root.local @ mid.local @ leaf.local
+    assert np.allclose(leaf.world, W)
+    
+    mv = rs.normal(size=(4, 4))
+    graph.update(mv)
+    assert np.allclose(leaf.objects[0].modelview, mv @ W)
+
+
+def test_scaling():
+    objs = [glo.Sphere() for i in range(4)]
+    a = Node(objects=objs[:1])
+    b = Node(scale=2, objects=objs[1:2])
+    c = Node(scale=(1, 2, 1), objects=objs[2:3])
+    d = Node(scale=0.5, objects=objs[3:],
+             rotation=rotation_matrix((1, 2, 3), 1.0))
+    graph = SceneGraph(a, b, Node(scale=2, children=[d]), c)
+    graph.update()
+    assert [o.scaling for o in objs] == [0, 1, 2, 0]
+    assert [o.extent for o in objs] == [1, 2, 2, 1]
+    b.scale = 1
+    graph.update()
+    assert objs[1].scaling == 0
+    
+    ## released from the graph
+    graph.remove(c)
+    graph.update()
+    assert objs[2].scaling == 0 and objs[2].modelview is None
+    assert objs[2].extent == 1
+
+
+def test_scaled_normals(view):
+    ## The shading of a scaled sphere is the same as of the unscaled one.
+    def render(scale, size):
+        obj = glo.Sphere(size=size, shade=glo.silver)
+        obj.lod = None # the same tessellation
+        node = Node(scale=scale, objects=[obj])
+        view.objects = [SceneGraph(node)]
+        return view.render().astype(int)
+    
+    a = render(1, 1)
+    h, w = a.shape[:2]
+    for scale in (2, (2, 2, 2.01)): # uniform (rescaled) and not (normalized)
+        b = render(scale, 0.5)
+        assert np.abs(a[h//2, w//2] - b[h//2, w//2]).max() <= 2
+
+
+def test_scaled_bounds(view):
+    ## The bounding radius of a scaled node is scaled for culling and picking.
+    view.render()
+    planes = view.camera.frustum()
+    for x in np.linspace(0, 20, 2001):
+        d = planes[:,:3] @ (x, 0, 0) + planes[:,3]
+        if d.min() < -0.5:
+            break
+    obj = glo.Sphere(size=0.25, shade=glo.silver) # radius 1 scaled by 4
+    node = Node(pos=(x, 0, 0), scale=4, objects=[obj])
+    graph = SceneGraph(node)
+    view.objects = [graph]
+    assert view.render()[..., :3].any()
+    assert view.queue.culled == 0
+    node.scale = 1
+    view.render()
+    assert view.queue.culled == 1
+    
+    picker = Picker()
+    picker.update([graph])
+    assert picker.radii[0] == 0.25
+    node.scale = (1, 3, 2) # refit without moving
+    graph.update()
+    picker.update([graph])
+    assert picker.radii[0] == 0.75
@@ -0,0 +1,111 @@
+#! python3
+# -*- coding: utf8 -*-
+import pytest
+
+from .. import glscheduler
+from ..glscheduler import Scheduler
+
+
+class Clock:
+    """Fake time module of the scheduler."""
+    def __init__(self):
+        self.now = 0.0
+    
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(glscheduler, 'time', clock)
+    return clock
+
+
+class Stream:
+    """Fake stream recording the timer requests and redraws."""
+    def __init__(self, fps=60):
+        self.timers = []
+        self.redraws = 0
+        self.scheduler = Scheduler(self.timers.append, self.redraw, fps)
+    
+    def redraw(self):
+        self.redraws += 1
+        self.scheduler.rendered()
+    
+    def fire(self):
+        ## The timer fires once per request.
+        assert self.timers
+        self.timers.pop(0)
+        self.scheduler.tick()
+
+
+def test_ondemand(clock):
+    s = Stream()
+    sch = s.scheduler
+    sch.draw()
+    sch.draw() # the timer is armed once
+    assert s.timers == [0]
+    s.fire()
+    assert s.redraws == 1 and sch.frames == 1 and not sch.dirty
+    assert not s.timers # stopped: nothing to do
+    
+    ## not redrawn unless dirty
+    clock.now = 1.0
+    sch.wake()
+    s.fire()
+    assert s.redraws == 1 and not s.timers
+
+
+def test_fps_cap(clock):
+    s = Stream(fps=50)
+    sch = s.scheduler
+    sch.draw()
+    s.fire()
+    clock.now = 0.005
+    sch.draw() # 15 ms to the next frame
+    assert s.timers == [15]
+    clock.now = 0.1
+    s.fire()
+    sch.draw() # just after the frame
+    assert s.timers == [20]
+    clock.now = 0.5
+    s.fire()
+    clock.now = 0.6
+    sch.draw() # long after the frame: at once
+    assert s.timers == [0]
+
+
+def test_callbacks_dt(clock):
+    s = Stream()
+    sch = s.scheduler
+    dts = []
+    def update(dt):
+        dts.append(dt)
+        if len(dts) == 3:
+            sch.remove(update)
+    sch.add(update)
+    sch.add(update) # once
+    for t in (0.0, 0.02, 0.05):
+        clock.now = t
+        s.fire()
+    assert dts == pytest.approx([0, 0.02, 0.03])
+    assert not s.timers # stopped after the last callback
+    
+    ## dt starts from 0 again after the timer stopped
+    clock.now = 1.0
+    sch.add(dts.append)
+    s.fire()
+    assert dts[-1] == 0
+
+
+def test_continuous(clock):
+    s = Stream()
+    sch = s.scheduler
+    sch.ondemand = False
+    sch.wake()
+    for i in range(5):
+        clock.now += 0.1
+        s.fire()
+    assert s.redraws == 5
+    assert len(s.timers) == 1 # still ticking
@@ -0,0 +1,48 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+from OpenGL.GL import *
+
+from .. import globject as glo
+
+
+def diffuse():
+    return glGetMaterialfv(GL_FRONT, GL_DIFFUSE)
+
+
+def test_redundant_material(view):
+    state = glo.GLState()
+    a = glo.Sphere(shade=glo.silver, style=glo.Object.MSOLID | glo.Object.MSHADE)
+    b = glo.Sphere(shade=glo.silver, style=glo.Object.MSOLID | glo.Object.MSHADE)
+    a(state)
+    n = state.changes
+    b(state)
+    assert state.changes == n
+    assert np.allclose(diffuse(), glo.silver.diffuse)
+
+
+def test_material_after_vertex_colors(view):
+    ## Per-vertex colors under GL_COLOR_MATERIAL overwrite the material,
+    ## which must be sent again to the next object of the same shade.
+    v, n, f = glo.sphere_mesh(1, 8, 4)
+    colors = np.tile([1, 0, 0], (len(v), 1))
+    style = glo.Object.MSOLID | glo.Object.MSHADE
+    mesh = glo.MeshObject(v, n, f, colors, shade=glo.silver, style=style)
+    ball = glo.Sphere(shade=glo.silver, style=style)
+    state = glo.GLState()
+    ball(state)
+    mesh(state)
+    assert not np.allclose(diffuse(), glo.silver.diffuse)
+    ball(state)
+    assert np.allclose(diffuse(), glo.silver.diffuse)
+
+
+def test_material_after_rgba(view):
+    style = glo.Object.MSOLID
+    a = glo.Sphere(shade=glo.silver, style=style | glo.Object.MSHADE)
+    b = glo.Sphere(shade=(1, 0, 0, 1), style=style | glo.Object.MRGBA)
+    state = glo.GLState()
+    a(state)
+    b(state)
+    a(state)
+    assert np.allclose(diffuse(), glo.silver.diffuse)
@@ -0,0 +1,57 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+import pytest
+from OpenGL.GL import *
+
+from .. import globject as glo
+
+
+def strip(line, trace=0):
+    """Points of the trace drawn by the segments (the joint once)."""
+    data = line.buffers['vertices'].data
+    base = trace * (line.capacity + 1)
+    first, count = line.segments()
+    segs = [data[a:a+n] for a, n in zip(first, count) if base <= a <= base + line.capacity]
+    if not segs:
+        return np.zeros((0, 3), np.float32)
+    if len(segs) == 2:
+        assert np.array_equal(segs[0][-1], segs[1][0]) # mirror of the row 0
+        segs[1] = segs[1][1:]
+    return np.concatenate(segs)
+
+
+@pytest.mark.parametrize('capacity', [1, 2, 5, 16])
+def test_ring(capacity):
+    rs = np.random.RandomState(capacity)
+    line = glo.StreamingPolyline(capacity, traces=2)
+    samples = [[], []]
+    for i in range(40):
+        t = rs.randint(2)
+        p = rs.normal(size=(rs.randint(0, 2 * capacity + 2), 3)).astype(np.float32)
+        line.append(p, trace=t)
+        samples[t] += list(p)
+        for t in range(2):
+            expected = np.array(samples[t][-capacity:]).reshape(-1, 3)
+            assert line.count[t] == len(expected)
+            if len(expected) >= 2:
+                assert np.array_equal(strip(line, t), expected)
+    line.clear(0)
+    assert line.count[0] == 0 and len(strip(line, 0)) == 0
+
+
+def test_upload(view):
+    ## Only the rows written are sent, and the buffer matches the host.
+    line = glo.StreamingPolyline(8, traces=3, shade=glo.white)
+    view.objects = [line]
+    view.render()
+    buf = line.buffers['vertices']
+    rs = np.random.RandomState(0)
+    for i in range(10):
+        line.append(rs.normal(size=(rs.randint(1, 12), 3)), trace=i % 3)
+        view.render()
+        glBindBuffer(GL_ARRAY_BUFFER, buf.id)
+        gpu = glGetBufferSubData(GL_ARRAY_BUFFER, 0, buf.data.nbytes)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        assert np.array_equal(np.frombuffer(gpu, np.float32).reshape(-1, 3), buf.data)
+    assert glGetError() == GL_NO_ERROR
@@ -0,0 +1,123 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+import pytest
+
+from .. import globject as glo
+from ..glcamera import Camera, Viewport
+from ..glloader import Loader
+from ..glpick import Picker
+from ..glrecord import FrameCapture
+from ..glrender import RenderQueue
+from ..glscheduler import Scheduler
+from ..glview import ViewMixin
+
+
+class Stream(ViewMixin):
+    """Window-less stream drawn into the current framebuffer."""
+    def __init__(self, size=(64, 64)):
+        self._size = size
+        self.camera = Camera(self)
+        self.viewports = []
+        self.viewport = None
+        self.objects = []
+        self.queue = RenderQueue()
+        self.stats = None
+        self.capture = FrameCapture()
+        self.picker = Picker()
+        self.picked = None
+        self._picker_frame = None
+        self.loader = Loader()
+        self._motion = None
+        self.timers = []
+        self.scheduler = Scheduler(self.timers.append, self.paint)
+        self.swaps = 0
+    
+    def paint(self):
+        self.render_frame(self.swap)
+    
+    def swap(self):
+        self.swaps += 1
+
+
+@pytest.fixture
+def window(view):
+    glview = Stream(view.size)
+    yield glview
+    glview.loader.shutdown()
+
+
+def test_viewports(window):
+    left = Viewport(Camera(window), (0, 0, 0.5, 1))
+    right = Viewport(Camera(window), (0.5, 0, 0.5, 1))
+    window.layout(left, right)
+    assert window.camera is left.camera
+    window.route(50, 10)
+    assert window.viewport is right and window.camera is right.camera
+    assert window.viewport_at(10, 10) is left
+    assert window._region() == (32, 0, 32, 64)
+    
+    ## picked in the viewport under the cursor (as drawn)
+    obj = glo.Sphere(size=0.5)
+    window.objects = [obj]
+    assert isinstance(window.objects, glo.ObjectList)
+    window.paint()
+    assert window.pick(48, 32) is obj
+    assert window.pick(16, 32) is obj
+    assert window.pick(40, 4) is None
+    assert window.pick_rect(32, 0, 64, 64) == [obj]
+
+
+def test_render_frame(window, view):
+    view.objects = window.objects = [glo.Sphere(size=0.5, shade=glo.silver)]
+    f = window.snapshot()
+    assert window.timers == [0]
+    window.timers.pop()
+    window.scheduler.tick() # painted
+    assert window.swaps == 1 and window.scheduler.frames == 1
+    while window.capture.pending:
+        window.scheduler.tick()
+    rgba = f.result(timeout=1)
+    assert rgba[..., :3].any()
+    assert np.array_equal(rgba, view.render())
+    window.capture.reader.release()
+
+
+class Event:
+    def __init__(self, x, y):
+        self.x = x
+        self.y = y
+
+
+@pytest.mark.parametrize('handler, method, once, rtol', [
+    ('OnDragMove',  'rotate',  False, 1e-9),
+    ('OnShiftMove', 'shift',   True,  1e-2), # summed deltas (not rotated per step)
+    ('OnTiltMove',  'tilt',    False, 1e-9),
+    ('OnZoomView',  'zoom',    True,  1e-9),
+    ('OnZoomFovy',  'magnify', True,  1e-9),
+])
+def test_motion(handler, method, once, rtol):
+    ## The pending motions give the camera of the motions handled one by one.
+    def drag(batched):
+        window = Stream()
+        camera = window.camera
+        calls = []
+        f = getattr(camera, method)
+        setattr(camera, method, lambda *v: calls.append(v) or f(*v))
+        draws = []
+        window.draw = lambda: draws.append(1)
+        window.OnDragBegin(Event(40, 20))
+        for i in range(1, 21):
+            getattr(window, handler)(Event(40 + i, 20 + i // 2))
+            if not batched:
+                window.flush_motion()
+        window.flush_motion()
+        return camera, len(calls), len(draws)
+    
+    a, n, draws = drag(batched=False)
+    b, m, draw = drag(batched=True)
+    assert n == 20 and draws == 20
+    assert m == (1 if once else 20) and draw == 1
+    for k in ('eye', 'lpc', 'e2c_', 'fovy_'):
+        assert np.allclose(getattr(a, k), getattr(b, k), rtol=rtol), k
+    assert np.allclose(a.axes, b.axes, rtol=rtol, atol=rtol)
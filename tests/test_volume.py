@@ -0,0 +1,69 @@
+#! python3
+# -*- coding: utf8 -*-
+import numpy as np
+
+from ..glvolume import Isosurface, marching_tetrahedra
+
+
+def ball(n=40, r=12.0, center=None):
+    """Signed distance (inside > 0) of a sphere in the volume [n,n,n]."""
+    c = (n - 1) / 2 if center is None else np.asarray(center)[::-1]
+    z, y, x = np.indices((n, n, n), dtype=float)
+    return r - np.sqrt((z - c) ** 2 + (y - c) ** 2 + (x - c) ** 2)
+
+
+def area(tri):
+    return np.linalg.norm(np.cross(tri[:,1] - tri[:,0], tri[:,2] - tri[:,0]), axis=1).sum() / 2
+
+
+def test_marching_area():
+    r = 12.0
+    v, n = marching_tetrahedra(ball(r=r), 0)
+    assert n is None
+    assert abs(area(v) / (4 * np.pi * r ** 2) - 1) < 0.02
+    
+    ## all the vertices on the sphere
+    d = np.linalg.norm(v.reshape(-1, 3) - 39 / 2, axis=1)
+    assert np.abs(d - r).max() < 0.1
+
+
+def test_isosurface_winding():
+    iso = Isosurface(ball(), 0, spacing=0.5, block=8)
+    v = iso.vertices.reshape(-1, 3, 3)
+    assert len(v) and np.array_equal(iso.faces.ravel(), np.arange(v.size // 3))
+    
+    ## counter-clockwise seen from the outside, normals outward (unit)
+    fn = np.cross(v[:,1] - v[:,0], v[:,2] - v[:,0])
+    assert ((fn * v.mean(1)).sum(-1) > 0).all()
+    n = iso.normals
+    assert np.allclose(np.linalg.norm(n, axis=1), 1, atol=1e-5)
+    assert ((n * iso.vertices).sum(-1) > 0).all()
+    assert abs(area(v) / (4 * np.pi * 6 ** 2) - 1) < 0.02
+
+
+def test_isosurface_blocks():
+    data = ball(n=37, r=14)
+    iso = Isosurface(data, 0, block=8)
+    ranges = [range(0, n - 1, 8) for n in data.shape]
+    for k, (z, y, x) in enumerate((z, y, x) for z in ranges[0]
+                                            for y in ranges[1]
+                                            for x in ranges[2]):
+        a = data[z:z+9, y:y+9, x:x+9]
+        assert iso.block_min[k] == a.min() and iso.block_max[k] == a.max()
+    
+    ## Blocks of the same values are kept when the volume is replaced.
+    cache = dict(iso._cache)
+    data2 = data.copy()
+    data2[16:20, 16:20, 2:6] += 1 # on the surface
+    iso.set_volume(data2)
+    kept = [i for i in cache if iso._cache.get(i) is cache[i]]
+    assert kept and len(kept) < len(cache)
+    fresh = Isosurface(data2, 0, block=8)
+    assert np.array_equal(iso.vertices, fresh.vertices)
+    assert np.array_equal(iso.normals, fresh.normals)
+    
+    ## the level changes all the blocks
+    iso.level = 1
+    assert not any(iso._cache.get(i) is cache[i] for i in cache)
+    iso.release()
+    fresh.release()
@@ -9,21 +9,31 @@ from wx.glcanvas import GLCanvas, GLContext
 
 from mwx.framework import CtrlInterface
 from .glcamera import Camera
+from .glrender import RenderQueue
+from .glloader import Loader
+from .glrecord import FrameCapture
+from .glpick import Picker
+from .glscheduler import Scheduler
+from .glview import ViewMixin
 
 
-class basic_stream(GLCanvas, CtrlInterface):
+class basic_stream(ViewMixin, GLCanvas, CtrlInterface):
     """The basic stream
     
     Attributes:
-        name    : window title
-        camera  : singlet camera model
-        objects : list <Object> to draw
+        name      : window title
+        camera    : camera model (of the active viewport)
+        viewports : list <Viewport> in the window (empty: the whole window)
+        viewport  : active <Viewport> under the cursor (None: the whole window)
+        objects   : list <Object> to draw
+        queue     : render queue of objects
+        scheduler : frame scheduler (fps, ondemand, callbacks)
+        stats     : <FrameStats> per-frame statistics (None: disabled)
+        capture   : <FrameCapture> recording and snapshots of frames
+        picker    : <Picker> of objects under the cursor
+        picked    : object picked by the last click (None: nothing)
+        loader    : <Loader> of objects in the background
     """
-    @property
-    def dpu(self):
-        """Dots per unit:logical length."""
-        return self._size[1] / 2 / self.camera.h2_
-    
     def __init__(self, *args, **kwargs):
         self._size = kwargs.setdefault('size', (300, 300))
         GLCanvas.__init__(self, *args, **kwargs)
@@ -34,12 +44,25 @@ class basic_stream(GLCanvas, CtrlInterface):
         
         self.context = GLContext(self)
         self.camera = Camera(self)
+        self.viewports = []
+        self.viewport = None
         self.objects = []
+        self.queue = RenderQueue()
+        self.stats = None
+        self.capture = FrameCapture()
+        self.picker = Picker()
+        self.picked = None
+        self._picker_frame = None
+        self.loader = Loader()
+        self._motion = None
+        
+        self._timer = wx.Timer(self)
+        self.scheduler = Scheduler(self._set_timer, self.Refresh)
         
         self.handler.update({ # DNA<basic_stream>
                 0 : {
                  'home pressed' : (0, self.OnHomePosition),
-             '*Lbutton pressed' : (1, self.OnDragBegin),
+             '*Lbutton pressed' : (1, self.OnDragBegin, self.OnPick),
              '*Rbutton pressed' : (2, self.OnDragBegin),
             'C-wheelup pressed' : (0, self.OnScrollZoomUp),
           'C-wheeldown pressed' : (0, self.OnScrollZoomDown),
@@ -60,16 +83,38 @@ class basic_stream(GLCanvas, CtrlInterface):
         
         self.Bind(wx.EVT_SIZE, self.OnSize)
         self.Bind(wx.EVT_PAINT, self.OnPaint)
+        self.Bind(wx.EVT_TIMER, self.OnTimer, self._timer)
         
         def _release(evt):
+            self.flush_motion()
             if self.HasCapture():
                 self.ReleaseMouse()
             evt.Skip()
         self.Bind(wx.EVT_LEFT_UP, _release)
         self.Bind(wx.EVT_RIGHT_UP, _release)
         
+        def _route(evt):
+            if not self.HasCapture():
+                self.route(*evt.GetPosition())
+            evt.Skip()
+        self.Bind(wx.EVT_MOUSEWHEEL, _route)
+        
+        def _motion(evt):
+            if self._motion is not None and evt.Dragging():
+                self._motion[1].append((evt.x, evt.y)) # coalesced until the next tick
+                return
+            _route(evt)
+        self.Bind(wx.EVT_MOTION, _motion)
+        
+        def _flush(evt):
+            self.flush_motion()
+            evt.Skip()
+        self.Bind(wx.EVT_KEY_DOWN, _flush)
+        self.Bind(wx.EVT_KEY_UP, _flush)
+        
         def _capture(evt):
             _release(evt)
+            self.route(*evt.GetPosition())
             self.SetFocus() # required to get key events
             self.CaptureMouse()
             evt.Skip()
@@ -104,8 +149,11 @@ class basic_stream(GLCanvas, CtrlInterface):
         glHint(GL_LINE_SMOOTH_HINT, GL_NICEST)
         glHint(GL_POINT_SMOOTH_HINT, GL_NICEST)
     
-    def draw(self):
-        self.Refresh()
+    def _make_current(self):
+        self.SetCurrent(self.context)
+    
+    def _set_timer(self, ms):
+        self._timer.StartOnce(max(1, ms))
     
     def OnSize(self, evt):
         def reshape():
@@ -118,86 +166,8 @@ class basic_stream(GLCanvas, CtrlInterface):
     def OnPaint(self, evt):
         dc = wx.PaintDC(self)
         self.SetCurrent(self.context)
-        glClear(GL_COLOR_BUFFER_BIT | GL_DEPTH_BUFFER_BIT)
-        w, h = self._size
-        if w and h:
-            self.camera.set_view(w, h)
-            for obj in self.objects: # draw objects
-                obj()
-            self.SwapBuffers()
+        self.render_frame(self.SwapBuffers)
         evt.Skip()
     
-    ## --------------------------------
-    ## Mouse / Keyboard interface
-    ## --------------------------------
-    
-    def OnHomePosition(self, evt):
-        self.camera.set_axes()
-        self.draw()
-    
-    def OnDragBegin(self, evt):
-        x, y = evt.x, evt.y
-        self._lx = x
-        self._ly = y
-        self.lcx = self._size[0] / 2
-        self.lcy = self._size[1] / 2
-        self.lvx = x - self.lcx
-        self.lvy = self.lcy - y
-    
-    def OnDragMove(self, evt):
-        x, y = evt.x, evt.y
-        d = self.dpu / 4
-        self.camera.rotate(-(x-self._lx)/d, (y-self._ly)/d)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnDragEnd(self, evt):
-        self.draw()
-    
-    def OnShiftMove(self, evt):
-        x, y = evt.x, evt.y
-        d = self.dpu
-        self.camera.shift(-(x-self._lx)/d, (y-self._ly)/d)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnTiltMove(self, evt):
-        x, y = evt.x, evt.y
-        vx = x - self.lcx
-        vy = self.lcy - y
-        vv = vx*vx + vy*vy
-        if vv < 10:
-            return # prevent zero-division
-        
-        self.camera.tilt((vx * self.lvy - vy * self.lvx) / vv)
-        self._lx = x
-        self._ly = y
-        self.lvx = vx
-        self.lvy = vy
-        self.draw()
-    
-    def OnZoomView(self, evt):
-        x, y = evt.x, evt.y
-        ds = (x-self._lx + self._ly-y) / 100 # zoom
-        self.camera.zoom(1 + ds)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnZoomFovy(self, evt):
-        x, y = evt.x, evt.y
-        ds = (x-self._lx + self._ly-y) / 100 # angle
-        self.camera.magnify(ds)
-        self._lx = x
-        self._ly = y
-        self.draw()
-    
-    def OnScrollZoomUp(self, evt):
-        self.camera.zoom(1.25)
-        self.draw()
-    
-    def OnScrollZoomDown(self, evt):
-        self.camera.zoom(1/1.25)
-        self.draw()
+    def OnTimer(self, evt):
+        self.scheduler.tick()